@@ -0,0 +1,105 @@
+"""
+Загрузка исторических баров для офлайн-инструментов.
+
+Файлы ищутся как <SYMBOL>_<TF>.npy или <SYMBOL>_<TF>.csv (например EURUSDrfd_M5.csv),
+а также в раскладке хранилища store.bars (<SYMBOL>/<TF>[.<N>].bars, читается через mmap) —
+--data bars/ у backtest.run, backtest.optimize и sim.replay работает без терминала.
+.npy — структурированный массив в dtype copy_rates_* (utils.helpers.RATES_DTYPE),
+CSV — либо с теми же столбцами (time в секундах эпохи), либо экспорт терминала
+(<DATE> <TIME> <OPEN> ... <TICKVOL> <VOL> <SPREAD>). Если нужного таймфрейма нет,
+бары собираются из более мелкого.
+"""
+import os
+import numpy as np
+import pandas as pd
+from store.bars import BarStore
+from utils.helpers import RATES_DTYPE, timeframe_name, timeframe_seconds, parse_timeframe
+
+# из каких таймфреймов можно собрать более крупный — от мелкого к крупному
+_SOURCE_TIMEFRAMES = ("M1", "M5", "M15", "M30", "H1", "H4")
+
+_CSV_COLUMNS = {"tickvol": "tick_volume", "vol": "real_volume", "volume": "real_volume"}
+
+
+def load_rates(path):
+    """Бары из .bars, .npy или .csv в формате copy_rates_*."""
+    if path.endswith(".bars"):
+        if not os.path.getsize(path):
+            return np.zeros(0, dtype=RATES_DTYPE)
+        return np.memmap(path, dtype=RATES_DTYPE, mode="r").view(np.ndarray)
+    if path.endswith(".npy"):
+        data = np.load(path)
+        if data.dtype == RATES_DTYPE:
+            return data
+        rates = np.zeros(len(data), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            if name in data.dtype.names:
+                rates[name] = data[name]
+        return rates
+
+    with open(path) as file:
+        header = file.readline()
+    sep = "\t" if "\t" in header else ";" if ";" in header else ","
+    df = pd.read_csv(path, sep=sep)
+    df.columns = [_CSV_COLUMNS.get(col.strip("<>").lower(), col.strip("<>").lower()) for col in df.columns]
+    if "date" in df.columns:
+        stamp = df["date"].astype(str) + " " + (df["time"].astype(str) if "time" in df.columns else "00:00:00")
+        # 2024.01.02 00:05:00 (экспорт терминала) -> ISO, который pandas разбирает быстро
+        moments = pd.to_datetime(stamp.str.replace(".", "-", regex=False))
+        df["time"] = (moments - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    rates = np.zeros(len(df), dtype=RATES_DTYPE)
+    for name in RATES_DTYPE.names:
+        if name in df.columns:
+            rates[name] = df[name].to_numpy()
+    return rates
+
+
+def resample(rates, timeframe):
+    """Сборка баров крупного таймфрейма (границы — по времени сервера в данных)."""
+    period = timeframe_seconds(timeframe)
+    bucket = rates['time'] - rates['time'] % period
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    ends = np.append(starts[1:], len(rates)) - 1
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out['time'] = bucket[starts]
+    out['open'] = rates['open'][starts]
+    out['close'] = rates['close'][ends]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['tick_volume'] = np.add.reduceat(rates['tick_volume'], starts)
+    out['real_volume'] = np.add.reduceat(rates['real_volume'], starts)
+    out['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    return out
+
+
+def _find_file(data_dir, symbol, name):
+    candidates = [BarStore(data_dir).current(symbol, parse_timeframe(name))]
+    candidates += [os.path.join(data_dir, f"{symbol}_{name}{ext}") for ext in (".npy", ".csv")]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def find_rates(data_dir, symbol, timeframe):
+    """Бары символа на таймфрейме из data_dir или None, если подходящих файлов нет."""
+    name = timeframe_name(timeframe)
+    path = _find_file(data_dir, symbol, name)
+    if path:
+        return load_rates(path)
+    period = timeframe_seconds(timeframe)
+    for source in _SOURCE_TIMEFRAMES:
+        path = _find_file(data_dir, symbol, source)
+        if path and timeframe_seconds(parse_timeframe(source)) < period:
+            return resample(load_rates(path), timeframe)
+    return None
+
+
+def estimate_point(rates):
+    """Размер пункта по числу знаков цены (если его не передали явно)."""
+    close = rates['close'][-1000:]
+    for digits in range(0, 7):
+        scaled = close * 10 ** digits
+        if np.allclose(scaled, np.round(scaled), atol=1e-6):
+            return 10.0 ** -digits
+    return 1e-5
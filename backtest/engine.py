@@ -0,0 +1,155 @@
+"""
+Векторный бэктест стратегий по историческим барам.
+
+Сигналы считаются одним проходом по всей истории (StrategyBase.vector_signals),
+поэтому Python-цикл идёт только по сделкам, а не по барам. Модель исполнения:
+сигнал на закрытии бара i — вход по открытию бара i + 1 (buy — по ask = bid + spread);
+SL/TP от ATR сигнального бара с множителями ATR_SETTINGS и тем же минимальным
+расстоянием, что в send_order; внутри бара при касании обоих уровней считается SL;
+сигнал выхода на закрытии бара k — выход по открытию k + 1.
+Прибыль — в валюте котировки (price × contract_size × lot).
+"""
+from collections import namedtuple
+import numpy as np
+from config.settings import ATR_SETTINGS, MIN_ENTRY_INTERVAL_SEC, MIN_LOT, MAX_LOT
+from utils import indicators
+
+TRADE_DTYPE = np.dtype([
+    ('entry_time', '<i8'), ('exit_time', '<i8'), ('direction', 'i1'),
+    ('entry_price', '<f8'), ('exit_price', '<f8'), ('sl', '<f8'), ('tp', '<f8'),
+    ('lot', '<f8'), ('pnl', '<f8'), ('bars', '<i4'), ('reason', 'i1'),
+])
+EXIT_REASONS = ("sl", "tp", "signal", "end")
+
+BacktestResult = namedtuple("BacktestResult", "trades equity stats")
+
+
+def _first_hit(mask, start, n):
+    """Первый индекс >= start, где mask(a, b) истинна; окно растёт, чтобы не сканировать всю историю."""
+    size = 64
+    while start < n:
+        stop = min(start + size, n)
+        hits = mask(start, stop)
+        first = hits.argmax()
+        if hits[first]:
+            return start + first
+        start = stop
+        size *= 4
+    return n
+
+
+def simulate(rates, entries, exits, atr, sl_multiplier, tp_multiplier, point,
+             lot=MIN_LOT, risk=None, contract_size=100000.0, stops_level=0,
+             min_interval_sec=MIN_ENTRY_INTERVAL_SEC, balance=10000.0):
+    """
+    Прогон сделок по готовым массивам сигналов. risk — доля баланса на сделку
+    (лот от расстояния до SL, как calculate_raw_lot), иначе фиксированный lot.
+    """
+    n = len(rates)
+    t, o, h, l, c = rates['time'], rates['open'], rates['high'], rates['low'], rates['close']
+    spread = rates['spread'] * point
+    ask_h, ask_l = h + spread, l + spread
+    # минимальная дистанция стопов — как в send_order
+    min_distance = np.maximum(np.maximum(stops_level * point, 2 * spread), 20 * point) + 2 * point
+    exit_bars = np.flatnonzero(exits)
+
+    trades = []
+    realized = balance
+    free_from = 0
+    last_entry = None
+    for i in np.flatnonzero(entries[:-1]).tolist():
+        j = i + 1
+        if i < free_from or np.isnan(atr[i]):
+            continue
+        if last_entry is not None and t[j] - last_entry < min_interval_sec:
+            continue
+        direction = int(entries[i])
+        sl_dist = max(sl_multiplier * float(atr[i]), float(min_distance[j]))
+        tp_dist = max(tp_multiplier * float(atr[i]), float(min_distance[j]))
+        if direction > 0:
+            price = o[j] + spread[j]
+            sl, tp = price - sl_dist, price + tp_dist
+            stop_bar = _first_hit(lambda a, b: (l[a:b] <= sl) | (h[a:b] >= tp), j, n)
+        else:
+            price = o[j]
+            sl, tp = price + sl_dist, price - tp_dist
+            stop_bar = _first_hit(lambda a, b: (ask_h[a:b] >= sl) | (ask_l[a:b] <= tp), j, n)
+
+        k = np.searchsorted(exit_bars, j)
+        signal_bar = exit_bars[k] + 1 if k < len(exit_bars) else n
+        if signal_bar < n and signal_bar <= stop_bar:
+            exit_bar, reason = signal_bar, 2
+            exit_price = o[exit_bar] if direction > 0 else o[exit_bar] + spread[exit_bar]
+        elif stop_bar < n:
+            exit_bar = stop_bar
+            if direction > 0:
+                hit_sl = l[exit_bar] <= sl
+                exit_price = min(sl, o[exit_bar]) if hit_sl else max(tp, o[exit_bar])
+            else:
+                ask_open = o[exit_bar] + spread[exit_bar]
+                hit_sl = ask_h[exit_bar] >= sl
+                exit_price = max(sl, ask_open) if hit_sl else min(tp, ask_open)
+            reason = 0 if hit_sl else 1
+        else:
+            exit_bar, reason = n - 1, 3
+            exit_price = c[-1] if direction > 0 else c[-1] + spread[-1]
+
+        size = lot
+        if risk is not None:
+            size = np.floor(realized * risk / (sl_dist * contract_size) / MIN_LOT) * MIN_LOT
+            size = min(max(size, MIN_LOT), MAX_LOT)
+        pnl = direction * (exit_price - price) * contract_size * size
+        realized += pnl
+        trades.append((t[j], t[exit_bar], direction, price, exit_price, sl, tp, size, pnl, exit_bar - j, reason))
+        last_entry = t[j]
+        free_from = exit_bar
+
+    trades = np.array(trades, dtype=TRADE_DTYPE)
+    return trades, equity_curve(rates, trades, point, contract_size, balance)
+
+
+def equity_curve(rates, trades, point, contract_size, balance):
+    """Эквити на закрытии каждого бара: закрытые сделки + переоценка открытой позиции."""
+    t = rates['time']
+    equity = np.zeros(len(rates))
+    if len(trades):
+        exit_index = np.searchsorted(t, trades['exit_time'])
+        np.add.at(equity, exit_index, trades['pnl'])
+    equity = balance + np.cumsum(equity)
+    if len(trades):
+        # переоценка открытой позиции: бары сделок не пересекаются, поэтому индексы уникальны
+        entry_index = np.searchsorted(t, trades['entry_time'])
+        lengths = np.searchsorted(t, trades['exit_time']) - entry_index
+        owner = np.repeat(np.arange(len(trades)), lengths)
+        bars = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + entry_index[owner]
+        direction = trades['direction'][owner]
+        mark = np.where(direction > 0, rates['close'][bars], rates['close'][bars] + rates['spread'][bars] * point)
+        equity[bars] += direction * (mark - trades['entry_price'][owner]) * contract_size * trades['lot'][owner]
+    return np.rec.fromarrays([t, equity], names="time,equity")
+
+
+def summarize(trades, equity):
+    pnl = trades['pnl']
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+    curve = equity['equity']
+    drawdown = np.max(np.maximum.accumulate(curve) - curve) if len(curve) else 0.0
+    return {
+        "trades": len(trades),
+        "win_rate": len(wins) / len(trades) if len(trades) else 0.0,
+        "pnl": float(pnl.sum()),
+        "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) else float("inf") if len(wins) else 0.0,
+        "max_drawdown": float(drawdown),
+        "avg_bars": float(trades['bars'].mean()) if len(trades) else 0.0,
+    }
+
+
+def backtest_strategy(strategy, rates, point, **options):
+    """Бэктест экземпляра стратегии: векторные сигналы + SL/TP по ATR_SETTINGS стратегии."""
+    settings = ATR_SETTINGS.get(strategy.__class__.__name__, {})
+    entries, exits = strategy.vector_signals(rates)
+    atr = indicators.atr(rates, settings.get('period', 14))
+    trades, equity = simulate(rates, entries, exits, atr,
+                              settings.get('sl_multiplier', 1.5), settings.get('tp_multiplier', 3.0),
+                              point, **options)
+    return BacktestResult(trades, equity, summarize(trades, equity))
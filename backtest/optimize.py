@@ -0,0 +1,453 @@
+"""
+Параллельный подбор параметров стратегий на векторном бэктесте (backtest.engine).
+
+    python -m backtest.optimize --data data/ --strategy CCIDivergenceStrategy --symbols EURUSDrfd
+                                [--param period=10:30:2 --param divergence_bars=1,2,3 --param sl_multiplier=1,1.5,2]
+                                [--samples 20000] [--folds 5 --train-ratio 0.75] [--metric pnl]
+                                [--workers 8] [--out optimize_results]
+
+Параметры — аргументы конструктора стратегии (ema_fast, period, deviation_points, ...)
+и параметры SL/TP: atr_period, sl_multiplier, tp_multiplier (по умолчанию — ATR_SETTINGS).
+Сетка задаётся как name=from:to:step или name=v1,v2,...; без --param берётся DEFAULT_GRIDS.
+--samples N — случайная выборка N комбинаций из сетки вместо полного перебора.
+
+Бары каждого символа один раз пишутся в .npy и открываются процессами через mmap —
+страницы общие, в задачи передаются только параметры. Индикаторы кэшируются
+в каждом процессе (одинаковые ema/atr/cci для разных наборов не пересчитываются),
+сигналы — между наборами, отличающимися только параметрами SL/TP.
+
+Walk-forward (--folds N): история режется на N скользящих окон «обучение → проверка»;
+в каждом окне лучший набор по обучающей части проверяется на следующей. Каждый набор
+прогоняется один раз по всей истории, окну достаются сделки, открытые в нём.
+Результат: <out>/<strategy>_<symbol>_ranked.csv (все наборы по убыванию метрики,
+при walk-forward — по вне-выборочной части) и <out>/<strategy>_<symbol>_walkforward.csv.
+
+    python -m backtest.optimize --smoke [--strategy VWAPStrategy]
+
+--smoke — короткий прогон каждой стратегии (или одной --strategy) на синтетических M5-барах
+(benchmarks.indicators.make_rates) в spawn-процессах: проверяет, что цепочка импорта
+воркеров работает без MetaTrader5 и терминала. Код выхода 1, если какая-то стратегия упала.
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import numpy as np
+from config.settings import ATR_SETTINGS, MIN_LOT, SYMBOLS, OPTIMIZER_WORKERS, OPTIMIZER_INDICATOR_CACHE
+from backtest.data import find_rates, estimate_point
+from backtest.engine import simulate
+from utils import indicators
+
+ATR_PARAMS = ("atr_period", "sl_multiplier", "tp_multiplier")
+
+DEFAULT_GRIDS = {
+    "EMARSIVolumeStrategy": {"ema_fast": [5, 10, 15, 20], "ema_slow": [30, 50, 70, 100],
+                             "rsi_period": [10, 14, 21], "volume_threshold": [1.2, 1.5, 2.0]},
+    "PriceActionMAStrategy": {"ma_period": list(range(10, 55, 5))},
+    "VWAPStrategy": {"deviation_points": [0.0, 5.0, 10.0, 15.0, 20.0, 30.0]},
+    "CCIDivergenceStrategy": {"period": [10, 14, 20, 30], "divergence_bars": [1, 2, 3, 4, 5]},
+}
+DEFAULT_ATR_GRID = {"sl_multiplier": [1.0, 1.5, 2.0], "tp_multiplier": [2.0, 3.0, 4.0]}
+
+# заведомо бессмысленные сочетания не считаем
+CONSTRAINTS = {
+    "EMARSIVolumeStrategy": lambda p: p.get("ema_fast", 10) < p.get("ema_slow", 50),
+}
+
+METRICS = ("pnl", "profit_factor", "win_rate", "recovery", "trades")
+
+# индикаторы utils.indicators, которые кэшируются в процессах оптимизатора
+CACHED_INDICATORS = ("sma", "ema", "rsi", "atr", "adx", "cci", "vwap")
+
+
+def _strategies():
+    # стратегии импортируют MetaTrader5 — только при запуске, не при импорте модуля
+    from backtest.run import STRATEGIES
+    return STRATEGIES
+
+
+# ── сетка параметров ──────────────────────────────────────────────────
+def parse_param(spec):
+    """'name=from:to:step' (включительно) или 'name=v1,v2,...' -> (name, [значения])."""
+    name, _, values = spec.partition("=")
+    if not values:
+        raise ValueError(f"параметр без значений: {spec}")
+
+    def number(text):
+        return int(text) if text.lstrip("-").isdigit() else float(text)
+
+    if ":" in values:
+        start, stop, step = (number(part) for part in values.split(":"))
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        grid = [start + step * i for i in range(count)]
+        grid = [round(v, 10) if isinstance(v, float) else v for v in grid]
+    else:
+        grid = [number(part) for part in values.split(",")]
+    return name.strip(), grid
+
+
+def check_params(strategy_name, grid):
+    allowed = set(inspect.signature(_strategies()[strategy_name].__init__).parameters) - {"self", "symbol", "lot"}
+    unknown = set(grid) - allowed - set(ATR_PARAMS)
+    if unknown:
+        raise ValueError(f"{strategy_name}: неизвестные параметры {sorted(unknown)}, "
+                         f"доступны {sorted(allowed | set(ATR_PARAMS))}")
+
+
+def combinations(strategy_name, grid, samples=None, seed=0):
+    """
+    Наборы параметров сетки (полный перебор или `samples` случайных без повторов).
+    Параметры SL/TP меняются быстрее всего — соседние наборы делят сигналы и индикаторы.
+    """
+    names = sorted(grid, key=lambda name: (name in ATR_PARAMS, name))
+    sizes = [len(grid[name]) for name in names]
+    total = int(np.prod(sizes, dtype=np.int64))
+    if samples and samples < total:
+        picked = np.sort(np.random.default_rng(seed).choice(total, size=samples, replace=False))
+        indexes = np.stack(np.unravel_index(picked, sizes), axis=1).tolist()
+    else:
+        indexes = itertools.product(*(range(size) for size in sizes))
+    constraint = CONSTRAINTS.get(strategy_name, lambda p: True)
+    result = []
+    for index in indexes:
+        params = {name: grid[name][i] for name, i in zip(names, index)}
+        if constraint(params):
+            result.append(params)
+    return result
+
+
+def walk_forward_windows(n, folds, train_ratio):
+    """[(train_from, train_to, test_from, test_to)] — скользящие окна; folds=0 — без walk-forward."""
+    if not folds:
+        return []
+    test_len = int(n / (train_ratio / (1 - train_ratio) + folds))
+    train_len = n - folds * test_len
+    return [(i * test_len, i * test_len + train_len, i * test_len + train_len, (i + 1) * test_len + train_len)
+            for i in range(folds)]
+
+
+# ── процессы-воркеры ──────────────────────────────────────────────────
+class IndicatorCache:
+    """
+    Мемоизация функций utils.indicators для общих массивов баров: install() подменяет
+    функции модуля (как шлюз MT5 подменяет функции MetaTrader5), поэтому стратегии
+    получают кэш без изменений. Кэшируются только вызовы по зарегистрированным массивам.
+    """
+
+    def __init__(self, max_entries=OPTIMIZER_INDICATOR_CACHE):
+        self.max_entries = max_entries
+        self.sources = {}
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, array):
+        self.sources[id(array)] = array
+
+    def install(self, module=indicators):
+        for name in CACHED_INDICATORS:
+            setattr(module, name, self._wrap(name, getattr(module, name)))
+
+    def _wrap(self, name, func):
+        def cached(data, *args, **kwargs):
+            if id(data) not in self.sources:
+                return func(data, *args, **kwargs)
+            key = (name, id(data), args, tuple(sorted(kwargs.items())))
+            value = self.entries.get(key)
+            if value is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return value
+            self.misses += 1
+            value = func(data, *args, **kwargs)
+            # результат общий для всех наборов — запись в него была бы ошибкой
+            for array in value if isinstance(value, tuple) else (value,):
+                array.setflags(write=False)
+            self.entries[key] = value
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return value
+        return cached
+
+
+_BARS = {}
+_CACHE = None
+_OPTIONS = {}
+
+
+def _init_worker(paths, options, cache_size):
+    global _CACHE, _OPTIONS
+    _CACHE = IndicatorCache(cache_size)
+    _CACHE.install()
+    for key, path in paths.items():
+        # view без подкласса memmap: индексация memmap на горячем пути заметно дороже
+        _BARS[key] = np.load(path, mmap_mode="r").view(np.ndarray)
+        _CACHE.register(_BARS[key])
+    _OPTIONS = options
+
+
+def _window_stats(trades, curve):
+    pnl = trades['pnl']
+    return (len(trades), float(pnl.sum()), float(pnl[pnl > 0].sum()), float(-pnl[pnl < 0].sum()),
+            int((pnl > 0).sum()), float(np.max(np.maximum.accumulate(curve) - curve)) if len(curve) else 0.0)
+
+
+def evaluate(strategy_name, symbol, timeframe, point, windows, param_sets):
+    """
+    Статистика (trades, pnl, gross_profit, gross_loss, wins, max_dd) каждого набора:
+    за всю историю и по окнам walk-forward (обучение, проверка).
+    """
+    StrategyClass = _strategies()[strategy_name]
+    rates = _BARS[(symbol, timeframe)]
+    settings = ATR_SETTINGS.get(strategy_name, {})
+    hits, misses = _CACHE.hits, _CACHE.misses
+    results = []
+    signals_key, signals = None, None
+    for params in param_sets:
+        strategy_params = {k: v for k, v in params.items() if k not in ATR_PARAMS}
+        key = tuple(sorted(strategy_params.items()))
+        if key != signals_key:
+            strategy = StrategyClass(symbol, MIN_LOT, **strategy_params)
+            if hasattr(type(strategy), "point"):
+                strategy.point = point
+            signals_key, signals = key, strategy.vector_signals(rates)
+        entries, exits = signals
+        atr = indicators.atr(rates, params.get("atr_period", settings.get("period", 14)))
+        sl_multiplier = params.get("sl_multiplier", settings.get("sl_multiplier", 1.5))
+        tp_multiplier = params.get("tp_multiplier", settings.get("tp_multiplier", 3.0))
+        # один прогон по всей истории; окно получает сделки, открытые в нём, и свой участок эквити
+        trades, equity = simulate(rates, entries, exits, atr, sl_multiplier, tp_multiplier, point, **_OPTIONS)
+        opened = np.searchsorted(rates['time'], trades['entry_time'])
+        curve = equity['equity']
+        folds = []
+        for train_from, train_to, test_from, test_to in windows:
+            stats = []
+            for a, b in ((train_from, train_to), (test_from, test_to)):
+                if b - a < 2:
+                    stats.append(None)
+                    continue
+                first, last = np.searchsorted(opened, (a, b))
+                stats.append(_window_stats(trades[first:last], curve[a:b]))
+            folds.append(stats)
+        results.append((params, _window_stats(trades, curve), folds))
+    return results, _CACHE.hits - hits, _CACHE.misses - misses
+
+
+# ── сводка ────────────────────────────────────────────────────────────
+def combine(stats):
+    """Сумма статистик окон -> метрики."""
+    stats = [s for s in stats if s is not None]
+    trades = sum(s[0] for s in stats)
+    pnl = sum(s[1] for s in stats)
+    gross_profit = sum(s[2] for s in stats)
+    gross_loss = sum(s[3] for s in stats)
+    drawdown = max((s[5] for s in stats), default=0.0)
+    return {
+        "trades": trades,
+        "pnl": pnl,
+        "profit_factor": gross_profit / gross_loss if gross_loss else float("inf") if gross_profit else 0.0,
+        "win_rate": sum(s[4] for s in stats) / trades if trades else 0.0,
+        "max_drawdown": drawdown,
+        "recovery": pnl / drawdown if drawdown else 0.0,
+    }
+
+
+def _score(metrics, metric, min_trades):
+    # наборы с малым числом сделок — в конец списка
+    return (metrics["trades"] >= min_trades, metrics[metric])
+
+
+def _fmt(value):
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def write_ranked(path, rows, names, walk_forward):
+    prefixes = ("all", "oos") if walk_forward else ("all",)
+    fields = ["rank", *names] + [f"{prefix}_{key}" for prefix in prefixes
+                                 for key in ("trades", "pnl", "profit_factor", "win_rate", "max_drawdown", "recovery")]
+    with open(path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for rank, (params, full, out_of_sample) in enumerate(rows, 1):
+            row = [rank, *(params.get(name) for name in names)]
+            for metrics in (full, out_of_sample)[:len(prefixes)]:
+                row += [_fmt(metrics[key]) for key in ("trades", "pnl", "profit_factor", "win_rate",
+                                                       "max_drawdown", "recovery")]
+            writer.writerow(row)
+
+
+def optimize(data_dir, strategy_name, symbols, grid, out_dir, samples=None, folds=0, train_ratio=0.75,
+             metric="pnl", min_trades=10, workers=None, point=None, seed=0, **options):
+    os.makedirs(out_dir, exist_ok=True)
+    StrategyClass = _strategies()[strategy_name]
+    check_params(strategy_name, grid)
+    param_sets = combinations(strategy_name, grid, samples, seed)
+    names = sorted(grid, key=lambda name: (name in ATR_PARAMS, name))
+    timeframe = StrategyClass(symbols[0], MIN_LOT).get_timeframe()
+
+    # бары — в .npy рядом с результатами; воркеры открывают их через mmap
+    bars_dir = os.path.join(out_dir, ".bars")
+    os.makedirs(bars_dir, exist_ok=True)
+    paths, points, times = {}, {}, {}
+    for symbol in symbols:
+        rates = find_rates(data_dir, symbol, timeframe)
+        if rates is None or len(rates) < 2:
+            print(f"⚠️ {symbol}: нет данных")
+            continue
+        path = os.path.join(bars_dir, f"{symbol}_{timeframe}.npy")
+        np.save(path, rates)
+        paths[(symbol, timeframe)] = path
+        points[symbol] = point or estimate_point(rates)
+        times[symbol] = rates['time']
+
+    workers = workers or OPTIMIZER_WORKERS or os.cpu_count()
+    chunk = max(1, min(64, len(param_sets) // (workers * 8) or 1))
+    print(f"🧪 {strategy_name}: {len(param_sets)} наборов × {len(paths)} символов, "
+          f"окон {max(folds, 1)}, процессов {workers}")
+
+    started = time.perf_counter()
+    hits = misses = 0
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"), initializer=_init_worker,
+                             initargs=(paths, options, OPTIMIZER_INDICATOR_CACHE)) as pool:
+        futures = []
+        for symbol in points:
+            windows = walk_forward_windows(len(times[symbol]), folds, train_ratio)
+            results[symbol] = (windows, [])
+            for i in range(0, len(param_sets), chunk):
+                futures.append((symbol, pool.submit(evaluate, strategy_name, symbol, timeframe, points[symbol],
+                                                    windows, param_sets[i:i + chunk])))
+        done = 0
+        for symbol, future in futures:
+            rows, chunk_hits, chunk_misses = future.result()
+            results[symbol][1].extend(rows)
+            hits += chunk_hits
+            misses += chunk_misses
+            done += 1
+            if done % max(1, len(futures) // 10) == 0:
+                print(f"   … {done}/{len(futures)} задач, {time.perf_counter() - started:.1f} сек")
+    elapsed = time.perf_counter() - started
+    evaluated = len(param_sets) * len(points)
+    print(f"⏱ {evaluated} прогонов за {elapsed:.1f} сек ({evaluated / max(elapsed, 1e-9):,.1f}/сек), "
+          f"кэш индикаторов: {hits} попаданий / {misses} расчётов")
+
+    summary = {}
+    for symbol, (windows, rows) in results.items():
+        ranked = []
+        for params, full, fold_stats in rows:
+            # проверочные окна не пересекаются — их сумма и есть результат вне выборки
+            out_of_sample = combine([test for _, test in fold_stats]) if folds else None
+            ranked.append((params, combine([full]), out_of_sample))
+        key = 2 if folds else 1
+        ranked.sort(key=lambda row: _score(row[key], metric, min_trades), reverse=True)
+        write_ranked(os.path.join(out_dir, f"{strategy_name}_{symbol}_ranked.csv"), ranked, names, folds)
+        best = ranked[0] if ranked else None
+        if best:
+            print(f"🏆 {symbol}: {best[0]} → {metric}={best[key][metric]:.4f}, сделок {best[key]['trades']}")
+        if folds:
+            summary[symbol] = _walk_forward_report(os.path.join(out_dir, f"{strategy_name}_{symbol}_walkforward.csv"),
+                                                   windows, rows, names, metric, min_trades, times[symbol])
+    return summary
+
+
+def _day(times, index):
+    return np.datetime_as_string(np.datetime64(int(times[min(index, len(times) - 1)]), "s"), unit="D")
+
+
+def _walk_forward_report(path, windows, rows, names, metric, min_trades, times):
+    """Для каждого окна — лучший набор по обучающей части и его результат на проверочной."""
+    fields = ["fold", "train_from", "train_to", "test_from", "test_to", *names,
+              f"train_{metric}", "test_trades", "test_pnl", "test_profit_factor", "test_max_drawdown"]
+    chained = []
+    with open(path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for fold, (train_from, train_to, test_from, test_to) in enumerate(windows):
+            best = max(rows, key=lambda row: _score(combine([row[2][fold][0]]), metric, min_trades))
+            train = combine([best[2][fold][0]])
+            test = combine([best[2][fold][1]])
+            chained.append(test)
+            writer.writerow([fold, _day(times, train_from), _day(times, train_to - 1), _day(times, test_from),
+                             _day(times, test_to - 1),
+                             *(best[0].get(name) for name in names), _fmt(train[metric]), test["trades"],
+                             _fmt(test["pnl"]), _fmt(test["profit_factor"]), _fmt(test["max_drawdown"])])
+    total = sum(test["pnl"] for test in chained)
+    print(f"🔁 walk-forward: вне выборки {sum(t['trades'] for t in chained)} сделок, PnL {total:.2f}")
+    return chained
+
+
+def smoke(strategies=None, bars=20000, samples=4, workers=2):
+    """Короткий прогон оптимизатора на синтетических барах; True, если все стратегии отработали."""
+    import tempfile
+    import traceback
+    from benchmarks.indicators import make_rates
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        np.save(os.path.join(tmp, "SMOKE_M5.npy"), make_rates(bars))
+        for name in strategies or DEFAULT_GRIDS:
+            grid = {**DEFAULT_GRIDS[name], **DEFAULT_ATR_GRID}
+            try:
+                optimize(tmp, name, ["SMOKE"], grid, os.path.join(tmp, "out"), samples=samples, folds=2,
+                         min_trades=0, workers=workers, point=0.00001)
+                ranked = os.path.join(tmp, "out", f"{name}_SMOKE_ranked.csv")
+                with open(ranked) as file:
+                    rows = sum(1 for _ in file) - 1
+                if rows != samples:
+                    raise RuntimeError(f"в {os.path.basename(ranked)} {rows} наборов вместо {samples}")
+            except Exception:
+                traceback.print_exc()
+                failed.append(name)
+    print(f"❌ smoke: упали {', '.join(failed)}" if failed else "✅ smoke: все стратегии отработали")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", help="каталог с файлами <SYMBOL>_<TF>.npy/.csv")
+    parser.add_argument("--strategy", choices=list(DEFAULT_GRIDS))
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--param", action="append", default=[], help="name=from:to:step или name=v1,v2,...")
+    parser.add_argument("--samples", type=int, default=None, help="случайная выборка из сетки")
+    parser.add_argument("--folds", type=int, default=0, help="число окон walk-forward (0 — без него)")
+    parser.add_argument("--train-ratio", type=float, default=0.75, help="доля обучения в окне walk-forward")
+    parser.add_argument("--metric", default="pnl", choices=METRICS)
+    parser.add_argument("--min-trades", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="optimize_results")
+    parser.add_argument("--lot", type=float, default=MIN_LOT)
+    parser.add_argument("--risk", type=float, default=None)
+    parser.add_argument("--balance", type=float, default=10000.0)
+    parser.add_argument("--contract-size", type=float, default=100000.0)
+    parser.add_argument("--point", type=float, default=None)
+    parser.add_argument("--stops-level", type=int, default=0)
+    parser.add_argument("--smoke", action="store_true", help="прогон на синтетических барах без данных и терминала")
+    args = parser.parse_args()
+
+    if args.smoke:
+        raise SystemExit(0 if smoke([args.strategy] if args.strategy else None, workers=args.workers or 2) else 1)
+    if not args.data or not args.strategy:
+        parser.error("нужны --data и --strategy (или --smoke)")
+
+    if args.param:
+        grid = dict(parse_param(spec) for spec in args.param)
+    else:
+        grid = {**DEFAULT_GRIDS[args.strategy], **DEFAULT_ATR_GRID}
+    try:
+        check_params(args.strategy, grid)
+    except ValueError as error:
+        parser.error(str(error))
+    optimize(args.data, args.strategy, args.symbols, grid, args.out, samples=args.samples, folds=args.folds,
+             train_ratio=args.train_ratio, metric=args.metric, min_trades=args.min_trades, workers=args.workers,
+             point=args.point, seed=args.seed, lot=args.lot, risk=args.risk, balance=args.balance,
+             contract_size=args.contract_size, stops_level=args.stops_level)
+
+
+if __name__ == "__main__":
+    main()
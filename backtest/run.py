@@ -0,0 +1,101 @@
+"""
+Векторный бэктест стратегий по файлам баров (см. backtest.data).
+
+    python -m backtest.run --data data/ [--symbols EURUSDrfd ...] [--strategies VWAPStrategy ...]
+                           [--out backtest_results] [--lot 0.01 | --risk 0.02] [--point 0.00001]
+
+Для каждой пары (стратегия, символ) пишутся сделки (<out>/<strategy>_<symbol>_trades.csv)
+и эквити по барам (<out>/<strategy>_<symbol>_equity.npy), сводка — в <out>/summary.csv.
+"""
+import argparse
+import csv
+import os
+import time
+import numpy as np
+import pandas as pd
+from config.settings import SYMBOLS, MIN_LOT, STRATEGY_ALLOCATION
+from backtest.data import find_rates, estimate_point
+from backtest.engine import backtest_strategy, EXIT_REASONS
+from strategies.CCI import CCIDivergenceStrategy
+from strategies.VWAP import VWAPStrategy
+from strategies.ema_cross import EMARSIVolumeStrategy
+from strategies.price_action_ma import PriceActionMAStrategy
+
+STRATEGIES = {cls.__name__: cls for cls in (
+    EMARSIVolumeStrategy, PriceActionMAStrategy, VWAPStrategy, CCIDivergenceStrategy)}
+
+
+def write_trades(path, trades):
+    df = pd.DataFrame({
+        "entry_time": np.datetime_as_string(trades['entry_time'].astype("datetime64[s]"), unit="m"),
+        "exit_time": np.datetime_as_string(trades['exit_time'].astype("datetime64[s]"), unit="m"),
+        "side": np.where(trades['direction'] > 0, "buy", "sell"),
+        "entry_price": trades['entry_price'].round(5),
+        "exit_price": trades['exit_price'].round(5),
+        "sl": trades['sl'].round(5),
+        "tp": trades['tp'].round(5),
+        "lot": trades['lot'].round(2),
+        "pnl": trades['pnl'].round(2),
+        "bars": trades['bars'],
+        "reason": np.asarray(EXIT_REASONS)[trades['reason']],
+    })
+    df.to_csv(path, index=False)
+
+
+def run(data_dir, symbols, strategies, out_dir, point=None, **options):
+    os.makedirs(out_dir, exist_ok=True)
+    summary = []
+    total_bars = 0
+    started = time.perf_counter()
+    print(f"{'Стратегия':<24} {'Символ':<12} {'Баров':>8} {'Сделок':>7} {'Win%':>6} {'PnL':>12} "
+          f"{'PF':>6} {'MaxDD':>10} {'сек':>6}")
+    print("-" * 100)
+    for name in strategies:
+        StrategyClass = STRATEGIES[name]
+        for symbol in symbols:
+            strategy = StrategyClass(symbol, MIN_LOT)
+            rates = find_rates(data_dir, symbol, strategy.get_timeframe())
+            if rates is None or len(rates) < 2:
+                print(f"{name:<24} {symbol:<12} ⚠️ нет данных")
+                continue
+            symbol_point = point or estimate_point(rates)
+            if hasattr(type(strategy), "point"):
+                # VWAPStrategy берёт point из терминала при первой проверке — офлайн подставляем явно
+                strategy.point = symbol_point
+            pair_start = time.perf_counter()
+            result = backtest_strategy(strategy, rates, symbol_point, **options)
+            elapsed = time.perf_counter() - pair_start
+            total_bars += len(rates)
+
+            write_trades(os.path.join(out_dir, f"{name}_{symbol}_trades.csv"), result.trades)
+            np.save(os.path.join(out_dir, f"{name}_{symbol}_equity.npy"), result.equity)
+            s = result.stats
+            summary.append({"strategy": name, "symbol": symbol, "bars": len(rates), **s})
+            print(f"{name:<24} {symbol:<12} {len(rates):>8} {s['trades']:>7} {s['win_rate'] * 100:>5.1f}% "
+                  f"{s['pnl']:>12.2f} {s['profit_factor']:>6.2f} {s['max_drawdown']:>10.2f} {elapsed:>6.2f}")
+
+    if summary:
+        with open(os.path.join(out_dir, "summary.csv"), mode="w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(summary[0]))
+            writer.writeheader()
+            writer.writerows(summary)
+    elapsed = time.perf_counter() - started
+    print(f"\n⏱ {total_bars} баров за {elapsed:.2f} сек ({total_bars / max(elapsed, 1e-9):,.0f} баров/сек)")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="каталог с файлами <SYMBOL>_<TF>.npy/.csv")
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGY_ALLOCATION), choices=list(STRATEGIES))
+    parser.add_argument("--out", default="backtest_results")
+    parser.add_argument("--lot", type=float, default=MIN_LOT, help="фиксированный объём сделки")
+    parser.add_argument("--risk", type=float, default=None, help="доля баланса на сделку вместо фиксированного лота")
+    parser.add_argument("--balance", type=float, default=10000.0)
+    parser.add_argument("--contract-size", type=float, default=100000.0)
+    parser.add_argument("--point", type=float, default=None, help="размер пункта (по умолчанию — по знакам цены)")
+    parser.add_argument("--stops-level", type=int, default=0, help="trade_stops_level брокера, пунктов")
+    args = parser.parse_args()
+    run(args.data, args.symbols, args.strategies, args.out, point=args.point, lot=args.lot, risk=args.risk,
+        balance=args.balance, contract_size=args.contract_size, stops_level=args.stops_level)
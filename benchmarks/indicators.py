@@ -0,0 +1,148 @@
+"""
+Микробенчмарки ядер utils.indicators против прежних pandas-реализаций
+из стратегий и Trader. Терминал не нужен: бары синтетические, в dtype copy_rates_*.
+
+    python -m benchmarks.indicators [--bars 100 1000 10000] [--repeat 5]
+"""
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+from utils import indicators
+from utils.helpers import RATES_DTYPE
+
+
+def make_rates(n, seed=0, price=1.1, step=300):
+    """Случайное блуждание OHLCV в формате mt5.copy_rates_*."""
+    rng = np.random.default_rng(seed)
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates['time'] = 1_700_000_000 + step * np.arange(n)
+    close = price * np.exp(np.cumsum(rng.normal(0, 5e-4, n)))
+    open_ = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, 3e-4, n)) * price
+    rates['open'] = open_
+    rates['close'] = close
+    rates['high'] = np.maximum(open_, close) + spread
+    rates['low'] = np.minimum(open_, close) - spread
+    rates['tick_volume'] = rng.integers(1, 500, n)
+    rates['spread'] = rng.integers(1, 20, n)
+    return rates
+
+
+# ── Прежние pandas-реализации (эталон для сравнения) ──────────────────
+
+def legacy_true_range(df):
+    prev_close = df['close'].shift(1)
+    hl = df['high'] - df['low']
+    hc = (df['high'] - prev_close).abs()
+    lc = (df['low'] - prev_close).abs()
+    return pd.concat([hl, hc, lc], axis=1).max(axis=1)
+
+
+def legacy_atr(df, period=14):
+    return legacy_true_range(df).rolling(window=period).mean()
+
+
+def legacy_mean_deviation(df, period=14):
+    tp = (df['high'] + df['low'] + df['close']) / 3.0
+    return tp.rolling(window=period).apply(lambda x: np.mean(np.abs(x - x.mean())), raw=True)
+
+
+def legacy_cci(df, period=14):
+    tp = (df['high'] + df['low'] + df['close']) / 3.0
+    tp_ma = tp.rolling(window=period).mean()
+    mean_dev = tp.rolling(window=period).apply(lambda x: np.mean(np.abs(x - x.mean())), raw=True)
+    return (tp - tp_ma) / (0.015 * mean_dev)
+
+
+def legacy_adx(df, period=14):
+    high_diff = df['high'] - df['high'].shift(1)
+    low_diff = df['low'].shift(1) - df['low']
+    plus_dm = high_diff.where((high_diff > low_diff) & (high_diff > 0), 0)
+    minus_dm = low_diff.where((low_diff > high_diff) & (low_diff > 0), 0)
+    atr = legacy_true_range(df).rolling(window=period).mean()
+    plus_di = 100 * (plus_dm.rolling(window=period).sum() / atr)
+    minus_di = 100 * (minus_dm.rolling(window=period).sum() / atr)
+    dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
+    return dx.rolling(window=period).mean()
+
+
+def legacy_rsi(df, period=14):
+    delta = df['close'].diff()
+    gain = delta.where(delta > 0, 0.0)
+    loss = -delta.where(delta < 0, 0.0)
+    rs = gain.rolling(window=period).mean() / loss.rolling(window=period).mean()
+    return 100 - (100 / (1 + rs))
+
+
+def legacy_wilder_rsi(df, period=14):
+    delta = df['close'].diff()
+    gain = delta.clip(lower=0.0)
+    loss = -delta.clip(upper=0.0)
+    avg_gain = gain.copy()
+    avg_loss = loss.copy()
+    avg_gain[:period] = np.nan
+    avg_loss[:period] = np.nan
+    avg_gain.iloc[period] = gain.iloc[1:period + 1].mean()
+    avg_loss.iloc[period] = loss.iloc[1:period + 1].mean()
+    avg_gain = avg_gain.ewm(alpha=1.0 / period, adjust=False, ignore_na=True).mean()
+    avg_loss = avg_loss.ewm(alpha=1.0 / period, adjust=False, ignore_na=True).mean()
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def legacy_ema(df, span=50):
+    return df['close'].ewm(span=span, adjust=False).mean()
+
+
+def legacy_vwap(df):
+    tp = (df['high'] + df['low'] + df['close']) / 3.0
+    return (tp * df['tick_volume']).cumsum() / df['tick_volume'].cumsum()
+
+
+CASES = [
+    # имя, прежняя реализация (по DataFrame), ядро (по структурированному массиву)
+    ("true_range", legacy_true_range, lambda r: indicators.true_range(r)),
+    ("atr", legacy_atr, lambda r: indicators.atr(r, 14)),
+    ("mean_deviation", legacy_mean_deviation, lambda r: indicators.mean_deviation(indicators.typical_price(r), 14)[1]),
+    ("cci", legacy_cci, lambda r: indicators.cci(r, 14)),
+    ("adx", legacy_adx, lambda r: indicators.adx(r, 14)[2]),
+    ("rsi", legacy_rsi, lambda r: indicators.rsi(r, 14)),
+    ("wilder_rsi", legacy_wilder_rsi, lambda r: indicators.rsi(r, 14, method='wilder')),
+    ("ema", legacy_ema, lambda r: indicators.ema(r, 50)),
+    ("vwap", legacy_vwap, lambda r: indicators.vwap(r)),
+]
+
+
+def _best_us(func, repeat):
+    number = 1
+    # подбираем число повторов, чтобы замер длился ≥ 20 мс
+    while timeit.timeit(func, number=number) < 0.02 and number < 100000:
+        number *= 10
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def run(bar_counts, repeat):
+    print(f"{'Ядро':<16} {'Баров':>7} {'pandas, мкс':>12} {'numpy, мкс':>12} {'Ускорение':>10}  Совпадение")
+    print("-" * 72)
+    ok = True
+    for n in bar_counts:
+        rates = make_rates(n)
+        for name, legacy, kernel in CASES:
+            # прежний код начинал с pd.DataFrame(rates) — включаем это в замер
+            expected = np.asarray(legacy(pd.DataFrame(rates)), dtype=float)
+            got = kernel(rates)
+            same = np.allclose(got, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+            ok &= same
+            legacy_us = _best_us(lambda: legacy(pd.DataFrame(rates)), repeat)
+            kernel_us = _best_us(lambda: kernel(rates), repeat)
+            print(f"{name:<16} {n:>7} {legacy_us:>12.1f} {kernel_us:>12.1f} {legacy_us / kernel_us:>9.1f}x  "
+                  f"{'✅' if same else '❌'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.bars, args.repeat) else 1)
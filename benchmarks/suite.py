@@ -0,0 +1,366 @@
+"""
+Набор бенчмарков бота с эталонами: сигналы и индикаторы стратегий, план входа и Trader._try_open_order,
+utils.risk, общий проход стратегии по вселенной (universe_signals) и полный цикл трейдеров
+на 10/100/1000 символах. Терминал не нужен: вместо
+MetaTrader5 подставляется симулятор брокера (sim.broker) на синтетических барах в dtype copy_rates_*.
+
+    python -m benchmarks.suite [--symbols 10 100 1000] [--calls 200] [--cycles 5] [--only strategy universe]
+                               [--baseline benchmarks/baseline.json] [--save]
+                               [--threshold 0.25] [--alloc-threshold 0.10]
+
+Для каждого случая — медиана и p95 времени одного вызова и память, выделенная за вызов
+(пик tracemalloc, отдельным проходом — на время замера tracemalloc выключен). Стратегии
+получают окно баров, сдвигающееся на бар с каждым вызовом, — как в боевом цикле.
+Проход вселенной получает матрицу символы × бары того же окна; время на символ в нём
+сравнивается с check_entry_signal. Цикл — входы всех групп таймфреймов и сопровождение,
+между циклами брокер проходит бар.
+
+С --save результаты записываются в эталон (JSON); без него сравниваются с эталоном,
+и код выхода 1, если медиана выросла больше чем на --threshold или память —
+больше чем на --alloc-threshold. Эталон зависит от машины: снимайте его там же, где сравниваете.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.settings import STRATEGY_ALLOCATION
+from benchmarks.indicators import make_rates
+from sim.broker import SimBroker, install
+from utils.helpers import timeframe_seconds
+
+BASE_TIMEFRAME = 5
+HISTORY = 3000             # баров M5 у каждого символа до первого замера (H4 — 62 бара)
+DEPTH = 200                # окно баров для сигналов стратегий
+BENCH_SYMBOL = "XXXUSD"    # отдельный символ для микробенчмарков — не пересекается с циклами
+GROUPS = ("strategy", "trader", "risk", "universe", "cycle")
+# абсолютные допуски: для вызовов в доли микросекунды относительный порог — это шум таймера
+MIN_DELTA_US = 0.5
+MIN_DELTA_KB = 1.0
+
+
+def symbol_names(n):
+    letters = string.ascii_uppercase
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] + "USD" for i in range(n)]
+
+
+class Case:
+    """Случай бенчмарка: call(arg) замеряется, setup(i) готовит аргумент i-го вызова вне замера."""
+
+    def __init__(self, name, group, call, setup=None, calls=200, warmup=5, alloc_calls=5, per=1):
+        self.name = name
+        self.group = group
+        self.call = call
+        self.setup = setup or (lambda i: None)
+        self.calls = calls
+        self.warmup = warmup
+        self.alloc_calls = alloc_calls
+        self.per = per           # на сколько единиц делить (символов в цикле)
+
+    def run(self):
+        i = 0
+        for _ in range(self.warmup):
+            self.call(self.setup(i))
+            i += 1
+        times = []
+        for _ in range(self.calls):
+            arg = self.setup(i)
+            started = time.perf_counter()
+            self.call(arg)
+            times.append(time.perf_counter() - started)
+            i += 1
+        allocs = []
+        tracemalloc.start()
+        try:
+            for _ in range(self.alloc_calls):
+                arg = self.setup(i)
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                self.call(arg)
+                allocs.append(tracemalloc.get_traced_memory()[1] - before)
+                i += 1
+        finally:
+            tracemalloc.stop()
+        times = np.array(times) * 1e6
+        return {
+            "median_us": float(np.median(times)),
+            "p95_us": float(np.percentile(times, 95)),
+            "alloc_kb": float(np.median(allocs)) / 1024 if allocs else 0.0,
+            "calls": self.calls,
+            "per": self.per,
+        }
+
+
+def make_broker(names, bars):
+    # одинаковое начало у всех символов — общая шкала времени без пропусков
+    rates = {name: make_rates(bars, seed=i) for i, name in enumerate(names)}
+    # крупный счёт: на 1000 символов входы не упираются в маржу, нагрузка от запуска к запуску та же
+    return SimBroker(rates, timeframe=BASE_TIMEFRAME, balance=1_000_000.0)
+
+
+# ── случаи ───────────────────────────────────────────────────────────
+
+# случаи создаются по одному (генераторы): трейдеры следующего случая не мешают замеру текущего
+
+def strategy_cases(strategies, calls):
+    for StrategyClass in strategies.values():
+        strategy = StrategyClass(BENCH_SYMBOL, 0.01)
+        step = timeframe_seconds(strategy.get_timeframe())
+        # одни и те же бары для стратегий одного таймфрейма — потоковые индикаторы движка общие
+        rates = make_rates(DEPTH + calls + 20, seed=step, step=step)
+
+        def window(i, rates=rates):
+            return rates[i:i + DEPTH]
+
+        def frame(i, rates=rates):
+            # DataFrame строится вне замера — _calculate_indicators получает его готовым
+            return pd.DataFrame(rates[i:i + DEPTH])
+
+        yield Case(f"{StrategyClass.__name__}.check_entry_signal", "strategy", strategy.check_entry_signal,
+                   window, calls)
+        yield Case(f"{StrategyClass.__name__}.check_exit_signal", "strategy", strategy.check_exit_signal,
+                   window, calls)
+        yield Case(f"{StrategyClass.__name__}._calculate_indicators", "strategy", strategy._calculate_indicators,
+                   frame, calls)
+
+
+def trader_cases(strategies, broker, calls):
+    import MetaTrader5 as mt5
+    from core.trader import Trader
+    from core.bar_cache import bar_cache
+    from core.market_state import market_state
+    from core.position_book import position_book
+
+    # сторона сигнала — по тренду H4, иначе фильтр старшего таймфрейма отменит вход до order_send
+    closes = broker.copy_rates_from_pos(BENCH_SYMBOL, mt5.TIMEFRAME_H4, 0, 100)['close']
+    signal = "sell" if len(closes) >= 50 and closes[-10:].mean() < closes[-50:].mean() else "buy"
+    for StrategyClass in strategies.values():
+        trader = Trader(BENCH_SYMBOL, StrategyClass(BENCH_SYMBOL, 0.01), clock=broker)
+
+        def setup(i, trader=trader):
+            # как в цикле: новый цикл кэшей, _prepare уже прочитал бары и параметры символа
+            trader.last_entry_time = None
+            broker.positions.clear()
+            bar_cache.begin_cycle()
+            market_state.begin_cycle()
+            position_book.begin_cycle()
+            position_book.invalidate()
+            market_state.symbol_info(trader.symbol)
+            return trader.strategy.get_rates()
+
+        def setup_planned(i, trader=trader):
+            # план входа готов до сигнала (evaluate_entry) — замеряется путь от сигнала до order_send
+            rates = setup(i)
+            trader._plan = trader._plan_entry(rates)
+            return rates
+
+        yield Case(f"Trader._plan_entry[{StrategyClass.__name__}]", "trader", trader._plan_entry, setup, calls)
+        yield Case(f"Trader._try_open_order[{StrategyClass.__name__}]", "trader",
+                   lambda rates, trader=trader: trader._try_open_order(signal, rates), setup_planned, calls)
+
+
+def risk_cases(calls):
+    import MetaTrader5 as mt5
+    from core.market_state import market_state
+    from utils import risk
+
+    info = market_state.symbol_info(BENCH_SYMBOL)
+    price = info.ask
+    sl_price = price - 200 * info.point
+    margin_free = market_state.account().margin_free
+    raw = risk.calculate_raw_lot(100.0, sl_price, price, info.trade_contract_size, info.point)
+    yield from [
+        Case("risk.calculate_raw_lot", "risk",
+             lambda _: risk.calculate_raw_lot(100.0, sl_price, price, info.trade_contract_size, info.point),
+             calls=calls),
+        Case("risk.adjust_lot", "risk",
+             lambda _: risk.adjust_lot(raw, info.volume_step, info.volume_min, info.volume_max), calls=calls),
+        Case("risk.margin_cache.margin_per_lot", "risk",
+             lambda _: risk.margin_cache.margin_per_lot(BENCH_SYMBOL, mt5.ORDER_TYPE_BUY, price), calls=calls),
+        Case("risk.solve_affordable_lot", "risk",
+             lambda _: risk.solve_affordable_lot(BENCH_SYMBOL, mt5.ORDER_TYPE_BUY, price, margin_free,
+                                                 info.volume_step, 10.0), calls=calls),
+        Case("risk.size_position", "risk",
+             lambda _: risk.size_position(info, mt5.ORDER_TYPE_BUY, price, sl_price, 100.0, margin_free,
+                                          max_margin=margin_free * 0.1), calls=calls),
+    ]
+
+
+def universe_cases(strategies, symbol_counts, calls):
+    from core.market_state import market_state
+
+    point = np.array([[market_state.symbol_info(BENCH_SYMBOL).point]])
+    for StrategyClass in strategies.values():
+        strategy = StrategyClass(BENCH_SYMBOL, 0.01)
+        depth = len(strategy.get_rates())
+        step = timeframe_seconds(strategy.get_timeframe())
+        for n in symbol_counts:
+            # у символов свои блуждания, шкала времени общая — строки выровнены по последнему бару
+            rates = np.stack([make_rates(depth + calls + 20, seed=step + i, step=step) for i in range(n)])
+            points = np.repeat(point, n, axis=0)
+
+            def window(i, rates=rates):
+                return rates[:, i:i + depth]
+
+            yield Case(f"universe_signals[{StrategyClass.__name__}, {n} symbols]", "universe",
+                       lambda window, strategy=strategy, points=points: strategy.universe_signals(window, points),
+                       window, max(calls // n, 5), per=n)
+
+
+def cycle_cases(strategies, broker, symbol_counts, cycles):
+    from core.bot import Bot
+    from core.executor import TraderExecutor
+
+    names = symbol_names(max(symbol_counts))
+    for n in symbol_counts:
+        pairs = [(StrategyClass, symbol) for StrategyClass in strategies.values() for symbol in names[:n]]
+        bot = Bot(pairs, log_foreign=False, executor=TraderExecutor("sequential", 1), clock=broker)
+        bot.start_monitor(thread=False)
+        groups = bot.traders_by_timeframe()
+
+        def cycle(_, bot=bot, groups=groups):
+            # худший случай: бары всех таймфреймов закрылись одновременно
+            for timeframe, group in groups.items():
+                bot.run_entries(group, timeframe)
+            bot.run_management()
+            if bot.monitor:
+                bot.monitor.poll()
+
+        yield Case(f"cycle[{n} symbols x {len(strategies)} strategies]", "cycle", cycle,
+                   lambda i: broker.advance(), calls=cycles, warmup=1, alloc_calls=1, per=n)
+
+
+# ── эталон ───────────────────────────────────────────────────────────
+
+def compare(result, base, threshold, alloc_threshold):
+    if base is None:
+        return "new", False
+    slower = result["median_us"] > base["median_us"] * (1 + threshold) and \
+        result["median_us"] - base["median_us"] > MIN_DELTA_US
+    heavier = result["alloc_kb"] > base["alloc_kb"] * (1 + alloc_threshold) and \
+        result["alloc_kb"] - base["alloc_kb"] > MIN_DELTA_KB
+    if slower or heavier:
+        return " ".join(word for word, bad in (("медленнее", slower), ("больше памяти", heavier)) if bad), True
+    if result["median_us"] < base["median_us"] * (1 - threshold):
+        return "быстрее", False
+    return "ok", False
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args):
+    baseline_path = os.path.abspath(args.baseline)
+    baseline = {}
+    if os.path.isfile(baseline_path):
+        with open(baseline_path, encoding="utf-8") as file:
+            baseline = json.load(file).get("results", {})
+
+    symbol_counts = sorted(args.symbols) if "cycle" in args.only else []
+    steps = sum(args.cycles + 1 + 1 for _ in symbol_counts) + 10
+    broker = make_broker(symbol_names(max(symbol_counts, default=0)) + [BENCH_SYMBOL], HISTORY + steps)
+    broker.k = HISTORY - 1
+
+    # логгер, журнал сделок и метрики пишут в logs/ рабочего каталога — уводим их во временный
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    install(broker)
+    # модули бота импортируются только после подмены MetaTrader5
+    from backtest.run import STRATEGIES
+    from core.journal import journal
+    from utils.logger import set_level
+    set_level(logging.CRITICAL)
+    strategies = {name: STRATEGIES[name] for name in args.strategies}
+
+    out = sys.stdout
+    results, failed = {}, []
+    print(f"{'Случай':<52} {'медиана, мкс':>13} {'p95, мкс':>11} {'память, КБ':>11} {'эталон, мкс':>12}  Итог")
+    print("-" * 112)
+    try:
+        with open(os.devnull, "w") as sink:
+            for group in GROUPS:
+                if group not in args.only:
+                    continue
+                if group == "strategy":
+                    cases = strategy_cases(strategies, args.calls)
+                elif group == "trader":
+                    cases = trader_cases(strategies, broker, args.calls)
+                elif group == "risk":
+                    cases = risk_cases(args.calls)
+                elif group == "universe":
+                    cases = universe_cases(strategies, sorted(args.symbols), args.calls)
+                else:
+                    cases = cycle_cases(strategies, broker, symbol_counts, args.cycles)
+                while True:
+                    with redirect_stdout(sink):
+                        case = next(cases, None)
+                        if case is None:
+                            break
+                        result = case.run()
+                    results[case.name] = result
+                    base = None if args.save else baseline.get(case.name)
+                    verdict, bad = compare(result, base, args.threshold, args.alloc_threshold)
+                    if bad:
+                        failed.append(case.name)
+                    per = f" ({result['median_us'] / case.per:,.0f}/символ)" if case.per > 1 else ""
+                    print(f"{case.name:<52} {result['median_us']:>13,.1f} {result['p95_us']:>11,.1f} "
+                          f"{result['alloc_kb']:>11,.1f} "
+                          f"{base['median_us'] if base else float('nan'):>12,.1f}  {verdict}{per}", file=out)
+    finally:
+        journal.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(os.path.dirname(baseline_path) or ".", exist_ok=True)
+        # запуск с --only обновляет только свои случаи, остальные остаются из прежнего эталона
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump({"environment": environment(), "results": {**baseline, **results}}, file,
+                      ensure_ascii=False, indent=2)
+        print(f"💾 Эталон сохранён: {baseline_path}")
+    elif not baseline:
+        print(f"ℹ️ Эталона нет ({baseline_path}) — сохраните его флагом --save")
+    if failed:
+        print(f"❌ Регрессии ({len(failed)}): {', '.join(failed)}")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[10, 100, 1000],
+                        help="символов в полном цикле и в проходе вселенной")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGY_ALLOCATION))
+    parser.add_argument("--calls", type=int, default=200, help="замеряемых вызовов на случай")
+    parser.add_argument("--cycles", type=int, default=5, help="замеряемых циклов на размер")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "benchmarks", "baseline.json"))
+    parser.add_argument("--save", action="store_true", help="записать результаты как эталон")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимый рост медианы (доля)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.10, help="допустимый рост памяти (доля)")
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args) else 1)
@@ -0,0 +1,111 @@
+# check_indicators.py
+"""
+Сверка потокового движка индикаторов (core.indicator_engine) с пакетным расчётом
+стратегий (_calculate_indicators на ядрах utils.indicators) и с прежними pandas-реализациями
+(эталон из benchmarks.indicators). Терминал не нужен: бары синтетические, в dtype copy_rates_*
+(benchmarks.indicators.make_rates), и проигрываются скользящим окном по одному бару,
+как в живом цикле; на каждом шаге значения движка сравниваются с расчётом на том же окне.
+
+    python check_indicators.py [--steps 300] [--seeds 3]
+"""
+import argparse
+import math
+import sys
+import numpy as np
+import pandas as pd
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # сверка без терминала: только константы
+from config.settings import MIN_LOT
+from core.indicator_engine import IndicatorEngine
+from benchmarks import indicators as legacy
+from strategies.CCI import CCIDivergenceStrategy
+from strategies.VWAP import VWAPStrategy
+from strategies.ema_cross import EMARSIVolumeStrategy
+from strategies.price_action_ma import PriceActionMAStrategy
+
+WINDOW = 100      # глубина окна, как в get_rates стратегий M5
+STEPS = 300       # сколько баров проигрывать
+TOLERANCE = 1e-9
+
+
+def _same(a, b):
+    a, b = float(a), float(b)
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    if math.isinf(a) or math.isinf(b):
+        return a == b
+    return math.isclose(a, b, rel_tol=TOLERANCE, abs_tol=TOLERANCE)
+
+
+def check_symbol(symbol, rates, timeframe=mt5.TIMEFRAME_M5):
+    if len(rates) <= WINDOW:
+        print(f"{symbol:<12} ❌ Недостаточно баров")
+        return None
+
+    engine = IndicatorEngine()
+    ema = EMARSIVolumeStrategy(symbol, MIN_LOT)
+    pa = PriceActionMAStrategy(symbol, MIN_LOT)
+    cci = CCIDivergenceStrategy(symbol, MIN_LOT)
+    vwap = VWAPStrategy(symbol, MIN_LOT)
+    mismatches = {}
+
+    for end in range(WINDOW, len(rates) + 1):
+        window = rates[end - WINDOW:end]
+        df = pd.DataFrame(window)
+        pa._calculate_indicators(df)
+        cci._calculate_indicators(df)
+        vwap._calculate_indicators(df)
+        # EMA рекурсивна: движок помнит всю историю, поэтому сравниваем с расчётом от первого бара
+        full = pd.DataFrame(rates[:end])
+        history = ema._calculate_indicators(full.copy())
+
+        checks = {
+            "sma": (engine.get(symbol, timeframe, window, "sma", period=pa.ma_period), df['ma'], 2),
+            "atr": (engine.get(symbol, timeframe, window, "atr", period=14), df['tr'].rolling(window=14).mean(), 2),
+            "adx": (engine.get(symbol, timeframe, window, "adx", period=14), df['adx'], 2),
+            "rsi": (engine.get(symbol, timeframe, window, "rsi", period=ema.rsi_period),
+                    ema._calculate_rsi(df['close'], ema.rsi_period), 2),
+            "cci": (engine.get(symbol, timeframe, window, "cci", period=cci.period), df['cci'], cci.divergence_bars + 1),
+            # пакетный VWAP считается от начала окна, поэтому совпадает только на последнем баре
+            "vwap": (engine.get(symbol, timeframe, window, "vwap", window=WINDOW), df['vwap'], 1),
+            "ema": (engine.get(symbol, timeframe, window, "ema", span=ema.ema_fast), history['ema_fast'], 2),
+            # прежние pandas-реализации
+            "atr/эталон": (engine.get(symbol, timeframe, window, "atr", period=14), legacy.legacy_atr(df), 2),
+            "adx/эталон": (engine.get(symbol, timeframe, window, "adx", period=14), legacy.legacy_adx(df), 2),
+            "rsi/эталон": (engine.get(symbol, timeframe, window, "rsi", period=ema.rsi_period),
+                           legacy.legacy_rsi(df, ema.rsi_period), 2),
+            "cci/эталон": (engine.get(symbol, timeframe, window, "cci", period=cci.period),
+                           legacy.legacy_cci(df, cci.period), cci.divergence_bars + 1),
+            "vwap/эталон": (engine.get(symbol, timeframe, window, "vwap", window=WINDOW), legacy.legacy_vwap(df), 1),
+            "ema/эталон": (engine.get(symbol, timeframe, window, "ema", span=ema.ema_fast),
+                           legacy.legacy_ema(full, ema.ema_fast), 2),
+        }
+        for name, (stream, reference, depth) in checks.items():
+            reference = np.asarray(reference)
+            for i in range(1, depth + 1):
+                if not _same(stream[-i], reference[-i]):
+                    mismatches.setdefault(name, []).append((int(window['time'][-i]), stream[-i], reference[-i]))
+
+    if mismatches:
+        for name, items in mismatches.items():
+            bar_time, got, expected = items[0]
+            print(f"{symbol:<12} ❌ {name}: {len(items)} расхождений, первое t={bar_time}: {got} != {expected}")
+        return False
+    print(f"{symbol:<12} ✅ {len(rates) - WINDOW + 1} шагов, все индикаторы совпадают")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=STEPS, help="сколько баров проигрывать")
+    parser.add_argument("--seeds", type=int, default=3, help="сколько синтетических рядов проверить")
+    args = parser.parse_args()
+
+    # ряды с разным уровнем цены (пятизначные пары, JPY, металлы) — относительный допуск одинаков
+    prices = (1.1, 150.0, 2000.0)
+    results = [check_symbol(f"SYNTH{seed}", legacy.make_rates(WINDOW + args.steps, seed=seed,
+                                                                 price=prices[seed % len(prices)]))
+               for seed in range(args.seeds)]
+    sys.exit(0 if all(r is not False for r in results) else 1)
@@ -7,6 +7,22 @@
 • MIN_STOP_POINTS    — минимальные безопасные стопы
 • RUB_MARKET_HOURS   — торговые часы для рублёвых пар
 • BREAK_EVEN_ATR/...  — параметры безубытка и трейлинга
+• BAR_CACHE_*         — общий кэш баров
+• MARKET_SNAPSHOT_*   — снимок счёта, символов и тиков
+• SIZING_* / MAX_MARGIN_PER_TRADE — расчёт объёма и лимит маржи
+• MANAGE_INTERVAL_SEC / BAR_CLOSE_DELAY_SEC — расписание главного цикла
+• EXECUTION_*         — параллельное исполнение трейдеров и шлюз MT5
+• RUN_MODE / SUPERVISOR_* / WORKER_* — режим супервизора с процессами-воркерами
+• OPTIMIZER_*         — параллельный подбор параметров (backtest.optimize)
+• BAR_STORE_DIR / BACKFILL_* — локальное хранилище баров и его загрузка
+• TICK_*             — запись тиков в журнал (store.record_ticks)
+• LOG_*              — уровни по категориям, приёмники и прореживание логов
+• JOURNAL_*          — журнал сделок SQLite (core.journal)
+• METRICS_*          — гистограммы задержек и экспорт метрик Prometheus (core.metrics)
+• PROFILE_*          — профилирование по команде, медленные циклы, tracemalloc (core.profiling)
+• POSITION_MONITOR_* — безубыток и трейлинг на частоте тиков (core.position_monitor)
+• RISK_LEDGER_PATH   — курсор и счётчики книги риска по истории сделок (core.risk_ledger)
+• UNIVERSE_*         — проверка входов стратегии по всем символам одним проходом (core.universe)
 """
 from typing import Dict, List
 
@@ -123,4 +139,143 @@ MAGIC_NUMBERS = {
     "EMARSIVolumeStrategy": 102,
     "VWAPStrategy":         103,
     "CCIDivergenceStrategy":104,
-}
\ No newline at end of file
+}
+# ┌─── БЛОК 6: Кэш баров ───────────────────────────────────────────
+# сколько секунд бары считаются свежими внутри одного цикла
+BAR_CACHE_MAX_AGE_SEC = 5
+
+# ┌─── БЛОК 7: Снимок рынка (account/symbol/tick) ─────────────────────
+# TTL пакетного снимка в секундах (дополнительно он обновляется раз в цикл)
+MARKET_SNAPSHOT_TTL_SEC = 2
+
+# ┌─── БЛОК 8: Расчёт объёма ───────────────────────────────────────────
+# маржа на 1 лот пересчитывается через терминал, если цена ушла дальше чем на эту долю
+SIZING_REPRICE_THRESHOLD = 0.005   # 0.5%
+# лимит маржи на одну сделку — доля выделенного стратегии капитала
+MAX_MARGIN_PER_TRADE = 0.10
+# план входа (core.order_plan) считает лот до сигнала: проверять ли лот через order_calc_margin
+# (по вызову на сторону на каждом цикле) или доверять линейной марже на 1 лот из кэша
+SIZING_VERIFY_PLANNED_LOT = False
+
+# ┌─── БЛОК 9: Планировщик ─────────────────────────────────────────────
+# период сопровождения открытых позиций (безубыток, трейлинг, выход), сек
+MANAGE_INTERVAL_SEC = 10
+# задержка после закрытия бара перед проверкой входа, сек
+BAR_CLOSE_DELAY_SEC = 2
+# как часто печатать статистику кэшей и планировщика, сек
+STATS_INTERVAL_SEC = 60
+# сдвиг времени сервера MT5 относительно локальных часов, сек (None — определить по тику)
+SERVER_TIME_OFFSET_SEC = None
+
+# ┌─── БЛОК 10: Параллельное исполнение ────────────────────────────────
+# "sequential" — трейдеры по очереди (по умолчанию); "threads" — пул потоков, шарды по символу,
+# все вызовы MetaTrader5 идут через один поток-шлюз (включается явно)
+EXECUTION_MODE = "sequential"
+# число потоков пула (1 — то же, что sequential)
+EXECUTION_WORKERS = 4
+
+# ┌─── БЛОК 11: Супервизор и процессы-воркеры ──────────────────────────
+# "single" — один процесс; "supervisor" — пары (стратегия, символ) делятся по воркерам
+RUN_MODE = "single"
+# число процессов-воркеров (0 — по числу ядер)
+SUPERVISOR_WORKERS = 0
+# как часто воркер сообщает о себе и своей нагрузке, сек
+WORKER_HEARTBEAT_SEC = 5
+# воркер без heartbeat дольше этого считается зависшим и перезапускается, сек
+WORKER_HEARTBEAT_TIMEOUT_SEC = 180
+# пауза перед перезапуском упавшего воркера (удваивается при повторных падениях), сек
+WORKER_RESTART_BACKOFF_SEC = 5
+
+# ┌─── БЛОК 12: Подбор параметров ─────────────────────────────────────
+# число процессов оптимизатора (0 — по числу ядер)
+OPTIMIZER_WORKERS = 0
+# сколько массивов индикаторов держит кэш каждого процесса (~8 байт × баров на массив)
+OPTIMIZER_INDICATOR_CACHE = 128
+
+# ┌─── БЛОК 13: Хранилище баров ───────────────────────────────────────
+# каталог файлов <SYMBOL>/<TF>.bars (store.bars)
+BAR_STORE_DIR = "bars"
+# процессов загрузки истории (каждый со своим подключением к терминалу)
+BACKFILL_WORKERS = 4
+# баров в одном запросе copy_rates_range при загрузке истории
+BACKFILL_CHUNK_BARS = 50000
+
+# ┌─── БЛОК 14: Запись тиков ──────────────────────────────────────────
+# каталог журналов <SYMBOL>/<YYYYMMDD>.ticks (store.ticks)
+TICK_STORE_DIR = "ticks"
+# как часто опрашивать терминал о новых тиках, сек
+TICK_POLL_SEC = 1.0
+# как часто сбрасывать накопленные тики блоком на диск, сек
+TICK_FLUSH_SEC = 5.0
+# блок индекса — после стольких блоков данных
+TICK_INDEX_EVERY = 256
+
+# ┌─── БЛОК 15: Логирование ───────────────────────────────────────────
+# общий уровень: "DEBUG" включает подробный вывод трейдеров (последние бары, сигналы)
+LOG_LEVEL = "INFO"
+# уровни по категориям (utils.logger.get_logger), не указанные — как LOG_LEVEL:
+# trader — цикл трейдера, signal — проверка сигналов, orders — ордера и сопровождение
+# пример: {"signal": "DEBUG", "trader": "WARNING"}
+LOG_LEVELS: Dict[str, str] = {}
+# вывод в консоль и структурированный журнал logs/trading_bot.jsonl
+LOG_CONSOLE = True
+LOG_JSON = True
+# записей в очереди к фоновому потоку записи; при переполнении новые записи отбрасываются
+LOG_QUEUE_SIZE = 10000
+# повторяющиеся сообщения («нет сигнала») — не чаще одного на ключ за столько секунд
+LOG_SAMPLE_SEC = 60
+
+# ┌─── БЛОК 16: Журнал сделок ─────────────────────────────────────────
+# база SQLite (WAL) со всеми входами и выходами трейдеров
+JOURNAL_PATH = "logs/journal.db"
+# строк в одной транзакции записи
+JOURNAL_BATCH = 100
+# не дольше стольких секунд строка ждёт записи, сек
+JOURNAL_FLUSH_SEC = 1.0
+
+# ┌─── БЛОК 17: Метрики ───────────────────────────────────────────────
+# замер вызовов MT5 и экспорт метрик (этапы трейдеров замеряются всегда)
+METRICS_ENABLED = True
+# HTTP-эндпоинт /metrics (0 — не поднимать); воркеры супервизора — на следующих портах
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+# файл в формате Prometheus (для node_exporter textfile или ручного просмотра)
+METRICS_FILE = "logs/metrics.prom"
+# как часто перезаписывать файл, сек
+METRICS_FLUSH_SEC = 15
+
+# ┌─── БЛОК 18: Профилирование ────────────────────────────────────────
+# каталог профилей и файл команд управления (см. core.profiling)
+PROFILE_DIR = "profiles"
+PROFILE_CONTROL_FILE = "profile.ctl"
+# сколько профилей самых медленных циклов хранить (0 — не записывать; включается и командой "slow N")
+PROFILE_SLOW_CYCLES = 0
+# шаг сэмплирующего профайлера, сек
+PROFILE_SAMPLE_INTERVAL_SEC = 0.005
+# снимок tracemalloc раз в столько циклов (0 — выключено; tracemalloc замедляет аллокации)
+PROFILE_TRACEMALLOC_EVERY = 0
+# сколько последних снимков tracemalloc (пары .snap + .txt) хранить, старые удаляются
+PROFILE_TRACEMALLOC_KEEP = 5
+# глубина стека, запоминаемая tracemalloc для каждой аллокации
+PROFILE_TRACEMALLOC_FRAMES = 10
+
+# ┌─── БЛОК 19: Монитор позиций ───────────────────────────────────────
+# период опроса тиков по символам с открытыми позициями, сек
+# (0 — безубыток и трейлинг, как раньше, в цикле сопровождения раз в MANAGE_INTERVAL_SEC)
+POSITION_MONITOR_INTERVAL_SEC = 0.25
+# не больше стольких модификаций SL в секунду на весь процесс (остальные — на следующих проходах)
+POSITION_MONITOR_MAX_MODIFY_PER_SEC = 5
+# не чаще одной модификации SL позиции за столько секунд
+POSITION_MONITOR_MIN_MODIFY_INTERVAL_SEC = 1.0
+
+# ┌─── БЛОК 20: Книга риска ───────────────────────────────────────────
+# курсор истории сделок, дневной PnL и серии убытков (DAILY_RISK_LIMIT, MAX_CONSECUTIVE_LOSSES);
+# воркеры супервизора пишут каждый свой файл risk_ledger_worker<N>.json рядом
+RISK_LEDGER_PATH = "logs/risk_ledger.json"
+
+# ┌─── БЛОК 21: Режим вселенной ───────────────────────────────────────
+# True — сигналы входа стратегии считаются одним векторным проходом по всем символам
+# (матрица символы × бары); False — check_entry_signal по каждому трейдеру (по умолчанию)
+UNIVERSE_MODE = False
+# сколько лучших сигналов стратегии за проход идут во вход (0 — все, по убыванию силы сигнала)
+UNIVERSE_TOP_K = 0
@@ -0,0 +1,127 @@
+import threading
+import time
+import numpy as np
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
+from config.settings import BAR_CACHE_MAX_AGE_SEC
+
+
+class BarCache:
+    """
+    Общий кэш баров по ключу (symbol, timeframe) для всех стратегий и трейдеров.
+
+    В пределах одного цикла повторные запросы отдаются из памяти. После прогрева
+    из терминала догружаются только бары новее последнего закэшированного
+    (плюс сам последний бар — он мог ещё формироваться). Кэш потокобезопасен:
+    загрузка одного ключа идёт под его собственной блокировкой.
+    """
+
+    def __init__(self, max_age_sec=BAR_CACHE_MAX_AGE_SEC):
+        self.max_age_sec = max_age_sec
+        self._bars = {}      # (symbol, timeframe) -> structured array copy_rates_*
+        self._depth = {}     # (symbol, timeframe) -> максимальная запрошенная глубина
+        self._cycle = {}     # (symbol, timeframe) -> (номер цикла, monotonic-время загрузки)
+        self._locks = {}     # (symbol, timeframe) -> Lock
+        self._stats_lock = threading.Lock()
+        self.cycle_id = 0
+        # счётчики
+        self.hits = 0
+        self.misses = 0
+        self.incremental = 0
+        self.bars_copied = 0
+
+    def begin_cycle(self):
+        """Отмечает начало нового цикла: данные прошлого цикла считаются устаревшими."""
+        self.cycle_id += 1
+
+    def get_rates(self, symbol, timeframe, count):
+        """
+        Возвращает последние `count` баров (как mt5.copy_rates_from_pos(symbol, timeframe, 0, count))
+        или None, если терминал не отдал данные.
+        """
+        key = (symbol, timeframe)
+        lock = self._locks.get(key) or self._locks.setdefault(key, threading.Lock())
+        with lock:
+            return self._get_rates(key, symbol, timeframe, count)
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _get_rates(self, key, symbol, timeframe, count):
+        cached = self._bars.get(key)
+
+        if cached is not None and self._depth[key] >= count:
+            cycle_id, loaded_at = self._cycle[key]
+            if cycle_id == self.cycle_id and time.monotonic() - loaded_at < self.max_age_sec:
+                self._count("hits")
+                return cached[-count:]
+
+            merged = self._fetch_tail(symbol, timeframe, cached)
+            if merged is not None:
+                self._count("incremental")
+                self._store(key, merged, self._depth[key])
+                return self._bars[key][-count:]
+
+        # холодный старт, недостаточная глубина или разрыв в истории — полная загрузка
+        self._count("misses")
+        depth = max(count, self._depth.get(key, 0))
+        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, depth)
+        if rates is None or len(rates) == 0:
+            return None
+        self._count("bars_copied", len(rates))
+        self._store(key, rates, depth)
+        return self._bars[key][-count:]
+
+    def _fetch_tail(self, symbol, timeframe, cached):
+        """
+        Догружает хвост истории, удваивая окно, пока оно не перекроет последний
+        закэшированный бар. Возвращает объединённый массив или None (нужна полная загрузка).
+        """
+        last_time = cached['time'][-1]
+        n = 2
+        while n <= len(cached):
+            fresh = mt5.copy_rates_from_pos(symbol, timeframe, 0, n)
+            if fresh is None or len(fresh) == 0:
+                return None
+            self._count("bars_copied", len(fresh))
+            if fresh['time'][0] <= last_time:
+                # бары, начиная с первого полученного, заменяем свежими
+                pos = np.searchsorted(cached['time'], fresh['time'][0])
+                return np.concatenate((cached[:pos], fresh))
+            n *= 2
+        return None
+
+    def _store(self, key, rates, depth):
+        self._bars[key] = rates[-depth:]
+        self._depth[key] = depth
+        self._cycle[key] = (self.cycle_id, time.monotonic())
+
+    def invalidate(self, symbol=None, timeframe=None):
+        """Сбрасывает кэш целиком или по символу/таймфрейму."""
+        for key in list(self._bars):
+            if (symbol is None or key[0] == symbol) and (timeframe is None or key[1] == timeframe):
+                self._bars.pop(key, None)
+                self._depth.pop(key, None)
+                self._cycle.pop(key, None)
+
+    def stats(self):
+        total = self.hits + self.misses + self.incremental
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "incremental": self.incremental,
+            "bars_copied": self.bars_copied,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def stats_line(self):
+        s = self.stats()
+        return (f"hits={s['hits']}, misses={s['misses']}, incremental={s['incremental']}, "
+                f"bars_copied={s['bars_copied']}, hit_ratio={s['hit_ratio']*100:.0f}%")
+
+
+# Единый экземпляр на процесс — его используют все стратегии и Trader
+bar_cache = BarCache()
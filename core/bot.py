@@ -0,0 +1,204 @@
+"""
+Сборка и запуск бота для набора пар (стратегия, символ): трейдеры, расписание,
+исполнение. main.py запускает один Bot на все пары, супервизор — по одному
+Bot в каждом процессе-воркере на его шард.
+"""
+import time
+from config.settings import MIN_LOT, MANAGE_INTERVAL_SEC, STATS_INTERVAL_SEC, SERVER_TIME_OFFSET_SEC
+from config.settings import POSITION_MONITOR_INTERVAL_SEC, UNIVERSE_MODE
+from core.trader import Trader
+from core.position_monitor import PositionMonitor
+from core.universe import UniverseScan
+from core.bar_cache import bar_cache
+from core.market_state import market_state
+from core.position_book import position_book
+from core.risk_ledger import risk_ledger
+from core.scheduler import Scheduler, SystemClock, estimate_server_offset
+from core.executor import TraderExecutor
+from core.mt5_gateway import gateway
+from core.metrics import metrics
+from utils.logger import file_logger
+
+
+def log_position_event(event):
+    icon = "\U0001F7E2" if event.kind == "open" else "⚪"
+    file_logger.info(f"{icon} {event.kind} #{event.ticket} {event.symbol} ({event.strategy or 'чужая'}), "
+                     f"объём {event.position.volume}, прибыль {event.position.profit:.2f}")
+
+
+class Bot:
+    def __init__(self, pairs, guards=None, log_foreign=True, executor=None, clock=None, hooks=None):
+        """
+        pairs — список (класс стратегии, символ); guards — общие ограничения между процессами;
+        clock — часы трейдеров (по умолчанию системные); hooks — core.profiling.ProfilingHooks.
+        """
+        self.pairs = pairs
+        self.hooks = hooks
+        self.clock = clock or SystemClock()
+        # сдвиг времени сервера (уточняется в build_scheduler) — для дня книги риска
+        self.server_offset = SERVER_TIME_OFFSET_SEC or 0
+        self.guards = guards
+        self.log_foreign = log_foreign
+        self.executor = executor or TraderExecutor()
+        if self.executor.mode == "threads":
+            gateway.install()
+            print(f"\U0001F9F5 Параллельный режим: {self.executor.workers} потоков, вызовы MT5 через шлюз.")
+
+        self.traders = [Trader(symbol, StrategyClass(symbol, MIN_LOT), guards=guards, clock=clock)
+                        for StrategyClass, symbol in pairs]
+        self.set_server_offset(self.server_offset)
+        self.owned = {(trader.strategy_name, trader.symbol): trader for trader in self.traders}
+        self.symbols = list(dict.fromkeys(symbol for _, symbol in pairs))
+        market_state.track(self.symbols)
+        position_book.subscribe(self._on_position_event)
+        # выходы из истории сделок (SL/TP, вручную) — в журнал трейдера-владельца пары
+        risk_ledger.subscribe(self._on_exit_deal)
+        # безубыток и трейлинг — монитор позиций на частоте тиков (см. start_monitor); пока он
+        # не запущен и при POSITION_MONITOR_INTERVAL_SEC = 0 — как раньше, в цикле сопровождения
+        self.monitor = None
+        if POSITION_MONITOR_INTERVAL_SEC > 0:
+            self.monitor = PositionMonitor(self.traders, clock=clock)
+        # входы — общим векторным проходом стратегии по всем символам (core.universe)
+        self.universe = UniverseScan() if UNIVERSE_MODE else None
+
+        # нагрузка: время работы циклов с момента запуска
+        self.started = time.monotonic()
+        self.cycles = 0
+        self.busy = 0.0
+        self.last_cycle = 0.0
+        self.max_cycle = 0.0
+        self.scheduler = None
+
+    def set_server_offset(self, offset):
+        # трейдерам — чтобы на закрытии бара отличать формирующийся бар от закрытого
+        self.server_offset = offset
+        for trader in self.traders:
+            trader.server_offset = offset
+
+    def _on_position_event(self, event):
+        owned = (event.strategy, event.symbol) in self.owned
+        if owned or self.log_foreign:
+            log_position_event(event)
+
+    def _on_exit_deal(self, deal, strategy):
+        trader = self.owned.get((strategy, deal.symbol))
+        if trader is not None:
+            trader.log_exit_deal(deal)
+
+    def begin_cycle(self, title):
+        print(f"\n\U0001F501 {title}: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        bar_cache.begin_cycle()
+        market_state.begin_cycle()
+        position_book.begin_cycle()
+        position_book.refresh()
+        # новые сделки из истории терминала: дневной PnL и серии убытков для проверок входа
+        risk_ledger.update(self.clock.now() + self.server_offset)
+
+    def _timed(self, title, traders, stage, then=None):
+        if self.hooks:
+            self.hooks.before_cycle()
+        cycle_start = time.perf_counter()
+        self.begin_cycle(title)
+        start = time.perf_counter()
+        self.executor.run(traders, stage)
+        if then is not None:
+            then()
+        elapsed = time.perf_counter() - start
+        if self.hooks:
+            self.hooks.after_cycle(stage, time.perf_counter() - cycle_start)
+        metrics.observe("bot_cycle_seconds", elapsed, stage=stage)
+        self.cycles += 1
+        self.busy += elapsed
+        self.last_cycle = elapsed
+        self.max_cycle = max(self.max_cycle, elapsed)
+
+    def run_entries(self, group, timeframe):
+        title = f"Закрытие бара TF={timeframe}, проверка входов ({len(group)} трейдеров)"
+        if self.universe:
+            # бары и входы — по трейдерам в пуле исполнителя, сигналы — одним проходом на стратегию
+            self._timed(title, group, "prepare_entry", then=lambda: self.universe.run(group, self.executor))
+        else:
+            self._timed(title, group, "evaluate_entry")
+
+    def run_management(self):
+        self._timed("Сопровождение позиций", self.traders, "manage")
+
+    def load(self):
+        """Сводка нагрузки для отчёта супервизора."""
+        uptime = time.monotonic() - self.started
+        return {
+            "pairs": len(self.traders),
+            "symbols": len(self.symbols),
+            "cycles": self.cycles,
+            "busy": self.busy,
+            "load": self.busy / uptime if uptime else 0.0,
+            "last_cycle": self.last_cycle,
+            "max_cycle": self.max_cycle,
+            # по истории сделок всего счёта (core.risk_ledger) — у всех воркеров одна и та же
+            "daily_pnl": risk_ledger.daily_pnl(),
+        }
+
+    def print_stats(self):
+        print(f"\U0001F4E6 Кэш баров: {bar_cache.stats_line()}")
+        print(f"\U0001F4F8 Снимок рынка: {market_state.stats_line()}")
+        print(f"\U0001F9FE Книга риска: {risk_ledger.stats_line()}")
+        if self.universe:
+            print(f"\U0001F310 Вселенная: {self.universe.stats_line()}")
+        for line in self.scheduler.stats_lines():
+            print(f"⏱ {line}")
+        for line in self.executor.stats_lines():
+            print(f"\U0001F9F5 {line}")
+        if self.monitor:
+            print(f"\U0001F6E1 Монитор позиций: {self.monitor.stats_line()}")
+        if gateway.installed:
+            print(f"\U0001F6AA Шлюз MT5: {gateway.stats_line()}")
+        for line in metrics.stats_lines():
+            print(f"\U0001F4C8 {line}")
+
+    def traders_by_timeframe(self):
+        groups = {}
+        for trader in self.traders:
+            groups.setdefault(trader.strategy.get_timeframe(), []).append(trader)
+        return groups
+
+    def build_scheduler(self):
+        # ⏱ входы — по закрытию бара своего таймфрейма, сопровождение — каждые MANAGE_INTERVAL_SEC
+        server_offset = SERVER_TIME_OFFSET_SEC
+        if server_offset is None:
+            tick = market_state.tick(self.symbols[0]) if self.symbols else None
+            server_offset = estimate_server_offset(tick.time, time.time()) if tick else 0
+        self.set_server_offset(server_offset)
+        scheduler = Scheduler(server_offset=server_offset)
+        for timeframe, group in self.traders_by_timeframe().items():
+            scheduler.on_bar_close(timeframe, lambda group=group, timeframe=timeframe: self.run_entries(group, timeframe),
+                                   name=f"entries_tf{timeframe}")
+        scheduler.every(MANAGE_INTERVAL_SEC, self.run_management, name="manage")
+        scheduler.every(STATS_INTERVAL_SEC, self.print_stats, name="stats", run_now=False)
+        self.scheduler = scheduler
+        return scheduler
+
+    def start_monitor(self, thread=True):
+        """
+        Передаёт безубыток и трейлинг монитору позиций: в бою — его поток (thread=True),
+        в реплее и бенчмарках проход вызывается явно (monitor.poll) на каждом шаге.
+        """
+        if not self.monitor:
+            return
+        if thread:
+            # терминал вызывают два потока (циклы и монитор) — только через шлюз
+            gateway.install()
+            self.monitor.start()
+        for trader in self.traders:
+            trader.monitored = True
+
+    def run(self):
+        if self.scheduler is None:
+            self.build_scheduler()
+        self.start_monitor()
+        self.scheduler.run()
+
+    def shutdown(self):
+        if self.monitor:
+            self.monitor.stop()
+        self.executor.shutdown()
+        gateway.uninstall()
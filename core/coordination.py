@@ -0,0 +1,55 @@
+import multiprocessing
+from config.settings import MAX_POSITIONS_PER_SYMBOL
+
+
+class SharedGuards:
+    """
+    Глобальные ограничения, общие для всех процессов-воркеров.
+
+    Открытые позиции берутся из терминала — он и так общий для всех процессов.
+    Здесь в разделяемой памяти хранится только то, чего терминал ещё не видит:
+    входы «в полёте» по символам и их маржа по стратегиям. Дневной PnL здесь не нужен:
+    каждый воркер читает его из истории сделок счёта (core.risk_ledger), она общая.
+    Проверка и резервирование идут под одной межпроцессной блокировкой.
+    """
+
+    def __init__(self, symbols, strategies, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self._symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self._strategy_index = {name: i for i, name in enumerate(strategies)}
+        self._lock = ctx.Lock()
+        self._pending = ctx.Array('i', max(len(self._symbol_index), 1), lock=False)
+        self._pending_margin = ctx.Array('d', max(len(self._strategy_index), 1), lock=False)
+
+    def reserve(self, symbol, strategy, margin, allocated_equity, exposure):
+        """
+        Резервирует вход. exposure() -> (открыто позиций по символу, маржа открытых позиций
+        стратегии) вызывается под блокировкой, чтобы видеть ордера, только что отправленные
+        другими процессами. Возвращает None при успехе или причину отказа.
+        """
+        i = self._symbol_index.get(symbol)
+        j = self._strategy_index.get(strategy)
+        with self._lock:
+            open_positions, strategy_margin = exposure()
+            pending = self._pending[i] if i is not None else 0
+            if open_positions + pending >= MAX_POSITIONS_PER_SYMBOL:
+                return f"позиций по символу {open_positions}+{pending} в полёте, максимум {MAX_POSITIONS_PER_SYMBOL}"
+            pending_margin = self._pending_margin[j] if j is not None else 0.0
+            if strategy_margin + pending_margin + margin > allocated_equity:
+                return (f"маржа стратегии {strategy_margin:.2f}+{pending_margin:.2f}+{margin:.2f} "
+                        f"превысит выделенный капитал {allocated_equity:.2f}")
+            if i is not None:
+                self._pending[i] += 1
+            if j is not None:
+                self._pending_margin[j] += margin
+            return None
+
+    def release(self, symbol, strategy, margin):
+        """Снимает резерв после order_send: исполненный ордер уже виден в positions_get."""
+        i = self._symbol_index.get(symbol)
+        j = self._strategy_index.get(strategy)
+        with self._lock:
+            if i is not None:
+                self._pending[i] = max(self._pending[i] - 1, 0)
+            if j is not None:
+                self._pending_margin[j] = max(self._pending_margin[j] - margin, 0.0)
@@ -0,0 +1,71 @@
+"""
+Исполнение трейдеров за цикл: последовательно или в пуле потоков.
+
+В режиме "threads" трейдеры делятся на шарды по символу — все стратегии одного
+символа идут в одном потоке, поэтому кэш баров, потоки индикаторов и кэш маржи
+по символу никогда не обновляются параллельно. Вызовы терминала при этом идут
+через единый поток-шлюз (core.mt5_gateway).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import EXECUTION_MODE, EXECUTION_WORKERS
+
+
+class StageStats:
+    def __init__(self):
+        self.runs = 0
+        self.traders = 0
+        self.wall = 0.0          # время этапа целиком
+        self.busy = 0.0          # сумма времени шардов
+        self.max_shard = 0.0
+
+    def record(self, traders, wall, shard_times):
+        self.runs += 1
+        self.traders += traders
+        self.wall += wall
+        self.busy += sum(shard_times)
+        self.max_shard = max(self.max_shard, max(shard_times, default=0.0))
+
+    def line(self):
+        if not self.runs:
+            return "runs=0"
+        parallelism = self.busy / self.wall if self.wall else 0.0
+        return (f"runs={self.runs}, avg={self.wall / self.runs * 1000:.1f}ms, "
+                f"на трейдера={self.wall / max(self.traders, 1) * 1000:.2f}ms, "
+                f"max шард={self.max_shard * 1000:.1f}ms, параллельность={parallelism:.1f}x")
+
+
+class TraderExecutor:
+    def __init__(self, mode=EXECUTION_MODE, workers=EXECUTION_WORKERS):
+        self.mode = mode if workers > 1 else "sequential"
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="trader") \
+            if self.mode == "threads" else None
+        self.stats = {}
+
+    @staticmethod
+    def _run_shard(shard, stage):
+        start = time.perf_counter()
+        for trader in shard:
+            getattr(trader, stage)()
+        return time.perf_counter() - start
+
+    def run(self, traders, stage):
+        """Вызывает trader.<stage>() для всех трейдеров; исключение трейдера пробрасывается, как и раньше."""
+        start = time.perf_counter()
+        if self._pool is None:
+            shard_times = [self._run_shard(traders, stage)]
+        else:
+            shards = {}
+            for trader in traders:
+                shards.setdefault(trader.symbol, []).append(trader)
+            futures = [self._pool.submit(self._run_shard, shard, stage) for shard in shards.values()]
+            shard_times = [future.result() for future in futures]
+        self.stats.setdefault(stage, StageStats()).record(len(traders), time.perf_counter() - start, shard_times)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def stats_lines(self):
+        return [f"{stage} [{self.mode}]: {stats.line()}" for stage, stats in self.stats.items()]
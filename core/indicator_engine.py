@@ -0,0 +1,444 @@
+"""
+Потоковый движок индикаторов.
+
+Состояние хранится по ключу (symbol, timeframe, индикатор, параметры). Закрытый бар
+учитывается один раз за O(1) (CCI — O(period) из-за среднего отклонения), а
+формирующийся бар пересчитывается «на лету» без изменения состояния.
+
+При холодном старте и после разрыва истории состояние заполняется векторно
+ядрами utils.indicators, дальше — пошагово.
+
+Формулы повторяют pandas-реализации стратегий и Trader:
+  • sma/atr/rsi/adx/cci — скользящие окна, совпадают с rolling(...) на любом окне;
+  • ema — ewm(adjust=False), совпадает с pandas при расчёте от того же первого бара;
+  • vwap — скользящее окно `window` баров (равно cumsum по окну той же длины).
+"""
+import math
+from collections import deque
+import numpy as np
+from utils import indicators
+
+NAN = float("nan")
+
+
+def _div(a, b):
+    # деление по правилам IEEE (как в pandas): x/0 → ±inf, 0/0 → nan
+    if b == 0 or math.isnan(b):
+        if math.isnan(a) or math.isnan(b) or a == 0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _RollingWindow:
+    """Скользящая сумма фиксированного окна с учётом nan (как rolling(window) с min_periods=window)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.nan_count = 0
+        self.nonzero = 0
+        self._pushes = 0
+
+    def _sum_with(self, x):
+        # сумма окна, если добавить x (без изменения состояния)
+        total, nan_count, nonzero = self.total, self.nan_count, self.nonzero
+        if math.isnan(x):
+            nan_count += 1
+        else:
+            total += x
+            nonzero += x != 0
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if math.isnan(old):
+                nan_count -= 1
+            else:
+                total -= old
+                nonzero -= old != 0
+            full = True
+        else:
+            full = len(self.values) + 1 == self.window
+        if not full or nan_count:
+            return NAN
+        return total if nonzero else 0.0
+
+    def push(self, x):
+        result = self._sum_with(x)
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old
+                self.nonzero -= old != 0
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self.total += x
+            self.nonzero += x != 0
+        # периодически пересчитываем сумму точно, чтобы не копилась ошибка округления
+        self._pushes += 1
+        if self._pushes >= self.window * 16:
+            self._pushes = 0
+            self.total = math.fsum(v for v in self.values if not math.isnan(v))
+        return result
+
+    def peek(self, x):
+        return self._sum_with(x)
+
+    def fill(self, values):
+        """Заполняет окно последними значениями массива (векторный прогрев)."""
+        self.values = deque(float(v) for v in values[-self.window:])
+        finite = [v for v in self.values if not math.isnan(v)]
+        self.total = math.fsum(finite)
+        self.nan_count = len(self.values) - len(finite)
+        self.nonzero = sum(v != 0 for v in finite)
+        self._pushes = 0
+
+
+class SMA:
+    def __init__(self, period, field="close"):
+        self.period = period
+        self.field = field
+        self._win = _RollingWindow(period)
+
+    def update(self, bar):
+        return self._win.push(float(bar[self.field])) / self.period
+
+    def peek(self, bar):
+        return self._win.peek(float(bar[self.field])) / self.period
+
+    def seed(self, rates):
+        values = rates[self.field]
+        self._win.fill(values)
+        return indicators.sma(values, self.period, field=None)
+
+
+class EMA:
+    def __init__(self, span, field="close"):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.field = field
+        self._value = None
+
+    def _next(self, x):
+        if self._value is None:
+            return x
+        return (1.0 - self.alpha) * self._value + self.alpha * x
+
+    def update(self, bar):
+        self._value = self._next(float(bar[self.field]))
+        return self._value
+
+    def peek(self, bar):
+        return self._next(float(bar[self.field]))
+
+    def seed(self, rates):
+        values = indicators.ema(rates, self.span, field=self.field)
+        self._value = float(values[-1])
+        return values
+
+
+class RSI:
+    """RSI на простых скользящих средних приростов/падений (как EMARSIVolumeStrategy._calculate_rsi)."""
+
+    def __init__(self, period, field="close"):
+        self.period = period
+        self.field = field
+        self._prev = None
+        self._gain = _RollingWindow(period)
+        self._loss = _RollingWindow(period)
+
+    def _split(self, x):
+        if self._prev is None:
+            return 0.0, 0.0
+        delta = x - self._prev
+        return (delta if delta > 0 else 0.0), (-delta if delta < 0 else 0.0)
+
+    @staticmethod
+    def _rsi(gain_sum, loss_sum):
+        rs = _div(gain_sum, loss_sum)
+        if math.isnan(rs):
+            return NAN
+        return 100.0 - 100.0 / (1.0 + rs)
+
+    def update(self, bar):
+        x = float(bar[self.field])
+        gain, loss = self._split(x)
+        self._prev = x
+        return self._rsi(self._gain.push(gain), self._loss.push(loss))
+
+    def peek(self, bar):
+        gain, loss = self._split(float(bar[self.field]))
+        return self._rsi(self._gain.peek(gain), self._loss.peek(loss))
+
+    def seed(self, rates):
+        gain, loss = indicators.gains_losses(rates, self.field)
+        self._gain.fill(gain)
+        self._loss.fill(loss)
+        self._prev = float(rates[self.field][-1])
+        return indicators.rsi(rates, self.period, field=self.field)
+
+
+def _true_range(high, low, prev_close):
+    if prev_close is None:
+        return high - low
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class ATR:
+    """ATR как простое среднее True Range (как Trader._compute_atr)."""
+
+    def __init__(self, period):
+        self.period = period
+        self._prev_close = None
+        self._tr = _RollingWindow(period)
+
+    def update(self, bar):
+        tr = _true_range(float(bar['high']), float(bar['low']), self._prev_close)
+        self._prev_close = float(bar['close'])
+        return self._tr.push(tr) / self.period
+
+    def peek(self, bar):
+        tr = _true_range(float(bar['high']), float(bar['low']), self._prev_close)
+        return self._tr.peek(tr) / self.period
+
+    def seed(self, rates):
+        tr = indicators.true_range(rates)
+        self._tr.fill(tr)
+        self._prev_close = float(rates['close'][-1])
+        return indicators.rolling_sum(tr, self.period) / self.period
+
+
+class ADX:
+    """ADX по формулам PriceActionMAStrategy._calculate_adx."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._prev = None  # (high, low, close)
+        self._tr = _RollingWindow(period)
+        self._plus = _RollingWindow(period)
+        self._minus = _RollingWindow(period)
+        self._dx = _RollingWindow(period)
+
+    def _components(self, bar):
+        high, low = float(bar['high']), float(bar['low'])
+        if self._prev is None:
+            return high - low, 0.0, 0.0
+        prev_high, prev_low, prev_close = self._prev
+        high_diff = high - prev_high
+        low_diff = prev_low - low
+        plus_dm = high_diff if high_diff > low_diff and high_diff > 0 else 0.0
+        minus_dm = low_diff if low_diff > high_diff and low_diff > 0 else 0.0
+        return _true_range(high, low, prev_close), plus_dm, minus_dm
+
+    def _dx_value(self, tr_sum, plus_sum, minus_sum):
+        atr = tr_sum / self.period
+        plus_di = 100.0 * _div(plus_sum, atr)
+        minus_di = 100.0 * _div(minus_sum, atr)
+        return 100.0 * _div(abs(plus_di - minus_di), plus_di + minus_di)
+
+    def update(self, bar):
+        tr, plus_dm, minus_dm = self._components(bar)
+        self._prev = (float(bar['high']), float(bar['low']), float(bar['close']))
+        dx = self._dx_value(self._tr.push(tr), self._plus.push(plus_dm), self._minus.push(minus_dm))
+        return self._dx.push(dx) / self.period
+
+    def peek(self, bar):
+        tr, plus_dm, minus_dm = self._components(bar)
+        dx = self._dx_value(self._tr.peek(tr), self._plus.peek(plus_dm), self._minus.peek(minus_dm))
+        return self._dx.peek(dx) / self.period
+
+    def seed(self, rates):
+        plus_dm, minus_dm = indicators.directional_movement(rates)
+        plus_di, minus_di, adx = indicators.adx(rates, self.period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+        self._tr.fill(indicators.true_range(rates))
+        self._plus.fill(plus_dm)
+        self._minus.fill(minus_dm)
+        self._dx.fill(dx)
+        last = rates[-1]
+        self._prev = (float(last['high']), float(last['low']), float(last['close']))
+        return adx
+
+
+class CCI:
+    """CCI по формулам CCIDivergenceStrategy._calculate_indicators."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._tp = _RollingWindow(period)
+
+    def _cci(self, tp, tp_sum):
+        if math.isnan(tp_sum):
+            return NAN
+        window = np.fromiter(self._tp.values, dtype=float, count=len(self._tp.values))
+        window = np.append(window[len(window) - self.period + 1:], tp)
+        # на постоянном окне pandas даёт точное среднее — повторяем, иначе ошибка округления
+        # делится на почти нулевое отклонение
+        mean = tp if window.min() == window.max() else tp_sum / self.period
+        mean_dev = float(np.mean(np.abs(window - mean)))
+        return _div(tp - mean, 0.015 * mean_dev)
+
+    @staticmethod
+    def _typical(bar):
+        return (float(bar['high']) + float(bar['low']) + float(bar['close'])) / 3.0
+
+    def update(self, bar):
+        tp = self._typical(bar)
+        value = self._cci(tp, self._tp.peek(tp))
+        self._tp.push(tp)
+        return value
+
+    def peek(self, bar):
+        tp = self._typical(bar)
+        return self._cci(tp, self._tp.peek(tp))
+
+    def seed(self, rates):
+        self._tp.fill(indicators.typical_price(rates))
+        return indicators.cci(rates, self.period)
+
+
+class VWAP:
+    """VWAP по typical price и tick_volume за скользящее окно `window` баров."""
+
+    def __init__(self, window=100):
+        self.window = window
+        self._vp = deque()
+        self._vol = deque()
+        self._vp_sum = 0.0
+        self._vol_sum = 0.0
+
+    @staticmethod
+    def _parts(bar):
+        tp = (float(bar['high']) + float(bar['low']) + float(bar['close'])) / 3.0
+        volume = float(bar['tick_volume'])
+        return tp * volume, volume
+
+    def _sums_with(self, vp, volume):
+        vp_sum, vol_sum = self._vp_sum + vp, self._vol_sum + volume
+        if len(self._vp) == self.window:
+            vp_sum -= self._vp[0]
+            vol_sum -= self._vol[0]
+        return vp_sum, vol_sum
+
+    def update(self, bar):
+        vp, volume = self._parts(bar)
+        self._vp_sum, self._vol_sum = self._sums_with(vp, volume)
+        if len(self._vp) == self.window:
+            self._vp.popleft()
+            self._vol.popleft()
+        self._vp.append(vp)
+        self._vol.append(volume)
+        return _div(self._vp_sum, self._vol_sum)
+
+    def peek(self, bar):
+        return _div(*self._sums_with(*self._parts(bar)))
+
+    def seed(self, rates):
+        tail = rates[-self.window:]
+        volume = tail['tick_volume'].astype(float)
+        vp = indicators.typical_price(tail) * volume
+        self._vp = deque(vp.tolist())
+        self._vol = deque(volume.tolist())
+        self._vp_sum = math.fsum(self._vp)
+        self._vol_sum = math.fsum(self._vol)
+        return indicators.vwap(rates, self.window)
+
+
+INDICATORS = {
+    "sma": SMA,
+    "ema": EMA,
+    "rsi": RSI,
+    "atr": ATR,
+    "adx": ADX,
+    "cci": CCI,
+    "vwap": VWAP,
+}
+
+
+class IndicatorStream:
+    """
+    Один индикатор на одном (symbol, timeframe). `sync(rates)` учитывает новые закрытые
+    бары и пересчитывает формирующийся (последний) бар. Значения доступны по
+    отрицательным индексам, как df[col].iloc[i]: stream[-1] — формирующийся бар
+    (последний из переданных; входы на закрытии бара передают только закрытые бары).
+    """
+
+    def __init__(self, factory, history):
+        self._factory = factory
+        self._history = history
+        self.reset()
+
+    def reset(self):
+        self.indicator = self._factory()
+        self.values = deque(maxlen=self._history)
+        self.last_time = None
+        self.forming = NAN
+        self.closed_tail = False
+
+    def sync(self, rates):
+        times = rates['time']
+        start = 0
+        self.closed_tail = False
+        if self.last_time is not None:
+            pos = int(np.searchsorted(times, self.last_time))
+            if pos < len(times) - 1 and times[pos] == self.last_time:
+                start = pos + 1
+            elif pos == len(times) - 1 and times[pos] == self.last_time and self.values:
+                # переданы только закрытые бары, а последний уже учтён (поток видел следующий бар):
+                # значения — из истории, состояние не меняется
+                self.closed_tail = True
+                return self
+            else:
+                # разрыв истории или откат назад — прогреваемся заново
+                self.reset()
+        if start == 0 and len(rates) > 1:
+            # холодный старт: прогреваем состояние векторно
+            self.values.extend(self.indicator.seed(rates[:-1])[-self._history:].tolist())
+        else:
+            for i in range(start, len(rates) - 1):
+                self.values.append(self.indicator.update(rates[i]))
+        if len(rates) > 1:
+            self.last_time = times[-2]
+        self.forming = self.indicator.peek(rates[-1])
+        return self
+
+    def __getitem__(self, index):
+        if index == -1 and not self.closed_tail:
+            return self.forming
+        if index >= 0:
+            raise IndexError("IndicatorStream supports only negative indices")
+        if self.closed_tail:
+            return self.values[index]
+        return self.values[index + 1]
+
+
+class IndicatorEngine:
+    def __init__(self, history=16):
+        self.history = history
+        self._streams = {}
+
+    def stream(self, symbol, timeframe, name, **params):
+        key = (symbol, timeframe, name, tuple(sorted(params.items())))
+        stream = self._streams.get(key)
+        if stream is None:
+            cls = INDICATORS[name]
+            stream = self._streams.setdefault(key, IndicatorStream(lambda: cls(**params), self.history))
+        return stream
+
+    def get(self, symbol, timeframe, rates, name, **params):
+        """Синхронизирует поток с `rates` и возвращает его."""
+        return self.stream(symbol, timeframe, name, **params).sync(rates)
+
+    def reset(self, symbol=None):
+        for key in list(self._streams):
+            if symbol is None or key[0] == symbol:
+                del self._streams[key]
+
+
+# Единый движок на процесс
+indicator_engine = IndicatorEngine()
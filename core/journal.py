@@ -0,0 +1,232 @@
+"""
+Журнал сделок: одна база SQLite (WAL) вместо CSV на каждую пару (стратегия, символ).
+
+    python -m core.journal --import logs/     # разовый перенос старых logs/<Стратегия>_<SYMBOL>.csv
+    python -m core.journal --tail 20          # последние записи
+
+Запись не блокирует трейдера: record() кладёт строку в очередь, фоновый поток пишет
+пачками (JOURNAL_BATCH строк или раз в JOURNAL_FLUSH_SEC) одной транзакцией.
+WAL позволяет читать базу (отчёты) параллельно с записью и писать из нескольких
+процессов-воркеров. В каждой строке — стратегия, символ, тикет, сторона, а для ордеров
+ещё и полный запрос order_send и ответ терминала (JSON).
+"""
+import argparse
+import atexit
+import csv
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config.settings import JOURNAL_PATH, JOURNAL_BATCH, JOURNAL_FLUSH_SEC
+from utils.logger import file_logger
+
+COLUMNS = ("time", "strategy", "symbol", "action", "side", "ticket", "price", "lot", "sl", "tp",
+           "result", "retcode", "request", "response", "source")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id       INTEGER PRIMARY KEY,
+    time     REAL NOT NULL,         -- секунды эпохи
+    strategy TEXT,
+    symbol   TEXT NOT NULL,
+    action   TEXT NOT NULL,         -- entry | exit
+    side     TEXT,                  -- buy | sell (сторона позиции)
+    ticket   INTEGER,
+    price    REAL,
+    lot      REAL,
+    sl       REAL,
+    tp       REAL,
+    result   TEXT,                  -- success | fail
+    retcode  INTEGER,
+    request  TEXT,                  -- JSON запроса order_send
+    response TEXT,                  -- JSON ответа терминала
+    source   TEXT NOT NULL DEFAULT 'bot'
+);
+CREATE INDEX IF NOT EXISTS trades_strategy_symbol_time ON trades (strategy, symbol, time);
+CREATE INDEX IF NOT EXISTS trades_symbol_time ON trades (symbol, time);
+CREATE INDEX IF NOT EXISTS trades_ticket ON trades (ticket);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (time);
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+"""
+
+
+def connect(path=JOURNAL_PATH):
+    """Соединение с базой журнала (схема создаётся при первом подключении)."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # в WAL synchronous=NORMAL не теряет целостность, только последние транзакции при сбое питания
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _json(value):
+    if value is None:
+        return None
+    if hasattr(value, "_asdict"):
+        value = value._asdict()
+    if isinstance(value, dict):
+        # вложенный запрос в ответе order_send хранится отдельной колонкой
+        value = {key: item._asdict() if hasattr(item, "_asdict") else item
+                 for key, item in value.items() if key != "request"}
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class TradeJournal:
+    """Пишущий конец журнала: очередь и фоновый поток с пакетной записью."""
+
+    def __init__(self, path=JOURNAL_PATH, batch=JOURNAL_BATCH, flush_sec=JOURNAL_FLUSH_SEC):
+        self.path = path
+        self.batch = batch
+        self.flush_sec = flush_sec
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def _start(self):
+        # поток и файл базы создаются при первой записи — импорт модуля ничего не трогает
+        with self._lock:
+            if self._thread is None:
+                connect(self.path).close()
+                self._thread = threading.Thread(target=self._writer, name="trade-journal", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, action, strategy, symbol, side=None, price=None, lot=None, result=None, ticket=None,
+               sl=None, tp=None, retcode=None, request=None, response=None, time_=None, source="bot"):
+        """Строка журнала; request/response — dict или namedtuple терминала."""
+        if self._thread is None:
+            self._start()
+        self._queue.put((time_ if time_ is not None else time.time(), strategy, symbol, action, side, ticket,
+                         price, lot, sl, tp, result, retcode, _json(request), _json(response), source))
+
+    def _writer(self):
+        conn = connect(self.path)
+        insert = f"INSERT INTO trades ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        stopping = False
+        while not stopping:
+            try:
+                rows = [self._queue.get(timeout=self.flush_sec)]
+            except queue.Empty:
+                continue
+            # добираем всё, что накопилось, но не больше пачки
+            while len(rows) < self.batch:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if rows[-1] is None:
+                stopping = True
+            data = [row for row in rows if row is not None]
+            if data:
+                try:
+                    with conn:
+                        conn.executemany(insert, data)
+                    self.written += len(data)
+                except sqlite3.Error as exc:
+                    file_logger.error(f"❌ Журнал сделок: не записано {len(data)} строк: {exc}")
+            for _ in rows:
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self):
+        """Дождаться записи всего, что уже в очереди."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+journal = TradeJournal()
+
+
+def trades(path=JOURNAL_PATH, strategy=None, symbol=None, start=None, end=None, after_id=None):
+    """Строки журнала (sqlite3.Row) по фильтрам; after_id — только новее записи с этим id."""
+    conditions, params = [], []
+    for column, op, value in (("strategy", "=", strategy), ("symbol", "=", symbol),
+                              ("time", ">=", start), ("time", "<", end), ("id", ">", after_id)):
+        if value is not None:
+            conditions.append(f"{column} {op} ?")
+            params.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(f"SELECT * FROM trades{where} ORDER BY id", params).fetchall()
+    finally:
+        conn.close()
+
+
+def import_csv(folder="logs", path=JOURNAL_PATH):
+    """Разовый перенос logs/<Стратегия>_<SYMBOL>.csv; уже перенесённые файлы пропускаются."""
+    conn = connect(path)
+    done = {row[0] for row in conn.execute("SELECT path FROM imports")}
+    total = 0
+    for filename in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        name = os.path.basename(filename)[:-len(".csv")]
+        if "_" not in name:
+            continue
+        key = os.path.abspath(filename)
+        if key in done:
+            print(f"⏭ {filename}: уже перенесён")
+            continue
+        strategy = name.rsplit("_", 1)[0]
+        rows = []
+        with open(filename, newline="") as file:
+            for row in csv.DictReader(file):
+                try:
+                    stamp = datetime.fromisoformat(row["timestamp"]).timestamp()
+                    price, lot = float(row["price"]), float(row["lot"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                # в старых CSV не было стороны и тикета
+                rows.append((stamp, strategy, row.get("symbol"), row.get("action"), None, None, price, lot,
+                             None, None, row.get("result"), None, None, None, "csv"))
+        with conn:
+            conn.executemany(f"INSERT INTO trades ({', '.join(COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            conn.execute("INSERT INTO imports (path, rows, time) VALUES (?, ?, ?)", (key, len(rows), time.time()))
+        total += len(rows)
+        print(f"📥 {filename}: {len(rows)} строк ({strategy})")
+    conn.close()
+    print(f"✅ Перенесено {total} строк в {path}")
+    return total
+
+
+def _print_tail(count, path=JOURNAL_PATH):
+    conn = connect(path)
+    rows = conn.execute("SELECT time, strategy, symbol, action, side, ticket, price, lot, result, retcode "
+                        "FROM trades ORDER BY id DESC LIMIT ?", (count,)).fetchall()
+    conn.close()
+    for stamp, strategy, symbol, action, side, ticket, price, lot, result, retcode in reversed(rows):
+        print(f"{datetime.fromtimestamp(stamp):%Y-%m-%d %H:%M:%S}  {strategy or '-':<24} {symbol:<10} "
+              f"{action:<5} {side or '-':<4} #{ticket or '-':<10} {price or 0:<10.5f} {lot or 0:<6} "
+              f"{result or '-'} {retcode or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import", dest="import_dir", nargs="?", const="logs", default=None,
+                        help="перенести старые CSV из каталога (по умолчанию logs/)")
+    parser.add_argument("--tail", type=int, default=None, help="показать последние N записей")
+    parser.add_argument("--db", default=JOURNAL_PATH)
+    args = parser.parse_args()
+    if args.import_dir:
+        import_csv(args.import_dir, args.db)
+    if args.tail or not args.import_dir:
+        _print_tail(args.tail or 20, args.db)
@@ -0,0 +1,119 @@
+import threading
+import time
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
+from config.settings import MARKET_SNAPSHOT_TTL_SEC
+
+
+class MarketSnapshot:
+    """
+    Снимок account_info, symbol_info и тиков по всем активным символам.
+
+    Снимок обновляется одним пакетом на цикл (или по истечении TTL) при первом
+    обращении; все участки кода читают из него. Если нужны свежие данные
+    (цена для ордера), вызывающий передаёт fresh=True.
+    """
+
+    def __init__(self, ttl_sec=MARKET_SNAPSHOT_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self.symbols = []
+        self._account = None
+        self._infos = {}
+        self._ticks = {}
+        self._cycle = None       # (номер цикла, monotonic-время снимка)
+        self.cycle_id = 0
+        self._lock = threading.Lock()   # снимок обновляет один поток, остальные ждут его
+        # счётчики
+        self.refreshes = 0
+        self.hits = 0
+        self.ipc_calls = 0
+
+    def track(self, symbols):
+        """Добавляет символы в пакетный снимок."""
+        for symbol in symbols:
+            if symbol not in self.symbols:
+                self.symbols.append(symbol)
+        self._cycle = None
+
+    def begin_cycle(self):
+        self.cycle_id += 1
+
+    def _is_fresh(self):
+        snapshot = self._cycle
+        if snapshot is None:
+            return False
+        cycle_id, taken_at = snapshot
+        return cycle_id == self.cycle_id and time.monotonic() - taken_at < self.ttl_sec
+
+    def refresh(self):
+        """Пакетный снимок: account_info, symbols_get по списку активных символов и их тики."""
+        self.refreshes += 1
+        self._account = mt5.account_info()
+        self.ipc_calls += 1
+
+        infos = None
+        if self.symbols:
+            infos = mt5.symbols_get(group=",".join(self.symbols))
+            self.ipc_calls += 1
+        if infos:
+            infos = {info.name: info for info in infos}
+        else:
+            # терминал не поддержал групповой запрос — по одному символу
+            infos = {}
+            for symbol in self.symbols:
+                infos[symbol] = mt5.symbol_info(symbol)
+                self.ipc_calls += 1
+
+        ticks = {}
+        for symbol in self.symbols:
+            ticks[symbol] = mt5.symbol_info_tick(symbol)
+            self.ipc_calls += 1
+        # словари подменяются целиком — читатели из других потоков не видят полупустой снимок
+        self._infos, self._ticks = infos, ticks
+        self._cycle = (self.cycle_id, time.monotonic())
+
+    def _ensure_fresh(self):
+        if self._is_fresh():
+            self.hits += 1
+            return
+        with self._lock:
+            if not self._is_fresh():
+                self.refresh()
+
+    def account(self, fresh=False):
+        if fresh:
+            self._account = mt5.account_info()
+            self.ipc_calls += 1
+            return self._account
+        self._ensure_fresh()
+        return self._account
+
+    def symbol_info(self, symbol, fresh=False):
+        if not fresh:
+            self._ensure_fresh()
+            if symbol in self._infos:
+                return self._infos[symbol]
+        # символ вне снимка или запрошены свежие данные
+        info = mt5.symbol_info(symbol)
+        self.ipc_calls += 1
+        self._infos[symbol] = info
+        return info
+
+    def tick(self, symbol, fresh=False):
+        if not fresh:
+            self._ensure_fresh()
+            if symbol in self._ticks:
+                return self._ticks[symbol]
+        tick = mt5.symbol_info_tick(symbol)
+        self.ipc_calls += 1
+        self._ticks[symbol] = tick
+        return tick
+
+    def stats_line(self):
+        return f"refreshes={self.refreshes}, hits={self.hits}, ipc_calls={self.ipc_calls}"
+
+
+# Единый снимок на процесс
+market_state = MarketSnapshot()
@@ -0,0 +1,351 @@
+"""
+Метрики в памяти: гистограммы задержек и счётчики, экспорт в текстовом формате Prometheus.
+
+Гистограммы — в духе HDR: логарифмические корзины (степень двойки, разбитая на
+HISTOGRAM_SUB_BUCKETS частей), погрешность не больше 6% во всём диапазоне от микросекунды
+до минут. Запись — frexp, индекс и сложение под коротким замком, без аллокаций,
+поэтому метрики можно не выключать в бою.
+
+start_metrics() оборачивает функции MetaTrader5 замером времени (mt5_call_seconds)
+и поднимает экспорт: HTTP http://METRICS_HOST:METRICS_PORT/metrics и файл METRICS_FILE,
+перезаписываемый раз в METRICS_FLUSH_SEC. Трейдер пишет время своих этапов
+(trader_stage_seconds) по (стратегия, символ).
+"""
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import MetaTrader5 as mt5
+from config.settings import METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_FILE, METRICS_FLUSH_SEC
+from utils.logger import file_logger, dropped_records
+
+HISTOGRAM_SUB_BUCKETS = 16
+HISTOGRAM_MIN_EXP = -20          # 2^-20 с ≈ 1 мкс — всё меньше попадает в первую корзину
+HISTOGRAM_MAX_EXP = 7            # 2^7 с = 128 с — всё больше попадает в последнюю
+# границы le для экспорта в Prometheus (секунды)
+EXPORT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                  0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# этапы трейдера (trader_stage_seconds{stage=...})
+TRADER_STAGES = ("data", "plan", "signal", "risk", "order", "indicators", "trailing", "exit")
+
+# функции терминала, время которых замеряется
+MT5_FUNCTIONS = (
+    "account_info", "symbol_info", "symbol_info_tick", "symbols_get", "symbol_select",
+    "copy_rates_from", "copy_rates_from_pos", "copy_rates_range", "copy_ticks_from", "copy_ticks_range",
+    "positions_get", "orders_get", "history_deals_get", "history_orders_get",
+    "order_calc_margin", "order_calc_profit", "order_check", "order_send",
+)
+
+HELP = {
+    "mt5_call_seconds": "Время вызова функции MetaTrader5",
+    "mt5_call_errors_total": "Вызовы MetaTrader5, вернувшие None",
+    "mt5_order_send_total": "Ответы order_send по retcode",
+    "trader_stage_seconds": "Время этапа трейдера",
+    "bot_cycle_seconds": "Время этапа цикла бота по всем трейдерам",
+    "order_signal_to_send_seconds": "Время от сигнала входа до вызова order_send",
+    "position_monitor_poll_seconds": "Проход монитора позиций: тики, безубыток и трейлинг",
+    "position_sl_modify_total": "Модификации SL монитором позиций по виду и результату",
+    "universe_pass_seconds": "Векторный проход стратегии по всем символам (режим вселенной)",
+    "log_records_dropped_total": "Записи лога, потерянные при переполнении очереди (LOG_QUEUE_SIZE)",
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max", "_lock")
+
+    size = (HISTOGRAM_MAX_EXP - HISTOGRAM_MIN_EXP + 1) * HISTOGRAM_SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * self.size
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def index(value):
+        if value <= 0:
+            return 0
+        mantissa, exponent = math.frexp(value)      # value = mantissa · 2^exponent, mantissa ∈ [0.5, 1)
+        if exponent < HISTOGRAM_MIN_EXP:
+            return 0
+        if exponent > HISTOGRAM_MAX_EXP:
+            return Histogram.size - 1
+        return (exponent - HISTOGRAM_MIN_EXP) * HISTOGRAM_SUB_BUCKETS + int((mantissa - 0.5) * 2 * HISTOGRAM_SUB_BUCKETS)
+
+    @staticmethod
+    def upper(index):
+        """Верхняя граница корзины."""
+        exponent, sub = divmod(index, HISTOGRAM_SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * HISTOGRAM_SUB_BUCKETS), exponent + HISTOGRAM_MIN_EXP)
+
+    def observe(self, value):
+        index = self.index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def quantile(self, q, snapshot=None):
+        counts, count, _, maximum = snapshot or self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket in enumerate(counts):
+            seen += bucket
+            if seen >= rank and bucket:
+                return min(self.upper(index), maximum)
+        return maximum
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}     # (имя, метки) -> Histogram
+        self._counters = {}       # (имя, метки) -> Counter
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, _labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def counter(self, name, **labels):
+        key = (name, _labels(labels))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def stage_histograms(self, strategy, symbol):
+        """Гистограммы этапов одного трейдера — берутся один раз, запись без поиска по меткам."""
+        return {stage: self.histogram("trader_stage_seconds", strategy=strategy, symbol=symbol, stage=stage)
+                for stage in TRADER_STAGES}
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        current = None
+        for (name, labels), counter in counters:
+            if name != current:
+                current = name
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+        # потери очереди логов считает сам utils.logger
+        name = "log_records_dropped_total"
+        lines += [f"# HELP {name} {HELP[name]}", f"# TYPE {name} counter", f"{name} {dropped_records()}"]
+        current = None
+        for (name, labels), histogram in histograms:
+            if name != current:
+                current = name
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            counts, count, total, _ = histogram.snapshot()
+            cumulative, index = 0, 0
+            for bound in EXPORT_BUCKETS:
+                # корзины HDR, целиком лежащие не выше границы
+                while index < len(counts) and Histogram.upper(index) <= bound:
+                    cumulative += counts[index]
+                    index += 1
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.9f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        current = None
+        for (name, labels), histogram in histograms:
+            if name != current:
+                current = name
+                lines += [f"# HELP {name}_max Максимум {HELP.get(name, name).lower()}", f"# TYPE {name}_max gauge"]
+            lines.append(f"{name}_max{_format_labels(labels)} {histogram.max:.9f}")
+        return "\n".join(lines) + "\n"
+
+    def slowest(self, name, top=5, q=0.99):
+        """[(метки, p50, p99, max, count)] самых медленных рядов гистограммы name."""
+        with self._lock:
+            items = [(labels, histogram) for (key, labels), histogram in self._histograms.items() if key == name]
+        rows = []
+        for labels, histogram in items:
+            snapshot = histogram.snapshot()
+            if snapshot[1]:
+                rows.append((dict(labels), histogram.quantile(0.5, snapshot), histogram.quantile(q, snapshot),
+                             snapshot[3], snapshot[1]))
+        return sorted(rows, key=lambda row: -row[2])[:top]
+
+    def totals(self, name, label):
+        """{значение метки label: (число, сумма)} по всем рядам гистограммы name."""
+        with self._lock:
+            items = [(dict(labels), histogram) for (key, labels), histogram in self._histograms.items() if key == name]
+        result = {}
+        for labels, histogram in items:
+            count, total = result.get(labels.get(label), (0, 0.0))
+            result[labels.get(label)] = (count + histogram.count, total + histogram.sum)
+        return result
+
+    def stats_lines(self):
+        lines = []
+        for title, name, label in (("MT5", "mt5_call_seconds", "function"), ("этапы", "trader_stage_seconds", None)):
+            parts = []
+            for labels, p50, p99, maximum, count in self.slowest(name):
+                key = labels[label] if label else f"{labels['strategy']}/{labels['symbol']}/{labels['stage']}"
+                parts.append(f"{key} p50={p50 * 1000:.2f}ms p99={p99 * 1000:.2f}ms max={maximum * 1000:.1f}ms n={count}")
+            if parts:
+                lines.append(f"{title}: " + "; ".join(parts))
+        if dropped_records():
+            lines.append(f"лог: потеряно записей при переполнении очереди {dropped_records()}")
+        return lines
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_mt5(module=mt5, registry=metrics):
+    """Оборачивает функции MetaTrader5 замером времени. Вызывать до gateway.install()."""
+    for name in MT5_FUNCTIONS:
+        original = getattr(module, name, None)
+        if original is None or getattr(original, "_metrics_wrapped", False):
+            continue
+        setattr(module, name, _timed_call(name, original, registry))
+
+
+def _timed_call(name, original, registry):
+    histogram = registry.histogram("mt5_call_seconds", function=name)
+    errors = registry.counter("mt5_call_errors_total", function=name)
+
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        result = original(*args, **kwargs)
+        histogram.observe(time.perf_counter() - started)
+        if result is None:
+            errors.inc()
+        elif name == "order_send":
+            registry.inc("mt5_order_send_total", retcode=result.retcode)
+        return result
+
+    call.__name__ = name
+    call._metrics_wrapped = True
+    return call
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # запросы скрейпера не нужны в логе
+        pass
+
+
+def write_file(path=METRICS_FILE, registry=metrics):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as file:
+        file.write(registry.render())
+    os.replace(temp, path)
+
+
+def start_metrics(worker_id=None, registry=metrics):
+    """
+    Замер вызовов MT5 и экспорт метрик. У воркера супервизора свой порт
+    (METRICS_PORT + 1 + worker_id) и свой файл (…_worker<N>.prom).
+    """
+    if not METRICS_ENABLED:
+        return None
+    instrument_mt5(registry=registry)
+    port, path = METRICS_PORT, METRICS_FILE
+    if worker_id is not None:
+        port = METRICS_PORT + 1 + worker_id if METRICS_PORT else 0
+        root, ext = os.path.splitext(METRICS_FILE)
+        path = f"{root}_worker{worker_id}{ext}"
+    server = None
+    if port:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, port), _Handler)
+        except OSError as exc:
+            file_logger.error(f"❌ Метрики: порт {port} недоступен: {exc}")
+        else:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"\U0001F4C8 Метрики: http://{METRICS_HOST}:{port}/metrics, файл {path}")
+
+    def flush_loop():
+        while True:
+            time.sleep(METRICS_FLUSH_SEC)
+            try:
+                write_file(path, registry)
+            except OSError as exc:
+                file_logger.error(f"❌ Метрики: не записан {path}: {exc}")
+
+    if path:
+        threading.Thread(target=flush_loop, name="metrics-file", daemon=True).start()
+    return server
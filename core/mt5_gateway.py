@@ -0,0 +1,145 @@
+"""
+Шлюз к терминалу: единственный поток, который вызывает функции MetaTrader5.
+
+После install() функции модуля MetaTrader5 подменяются обёртками: вызов из любого
+потока ставится в очередь шлюза и ждёт результат. Одинаковые запросы на чтение,
+ещё стоящие в очереди, склеиваются в один вызов терминала.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import MetaTrader5 as mt5
+
+# функции терминала, которые идут через шлюз
+GATEWAY_FUNCTIONS = (
+    "account_info", "symbol_info", "symbol_info_tick", "symbols_get", "symbol_select",
+    "copy_rates_from", "copy_rates_from_pos", "copy_rates_range",
+    "copy_ticks_from", "copy_ticks_range",
+    "positions_get", "orders_get", "history_deals_get", "history_orders_get",
+    "order_calc_margin", "order_calc_profit", "order_check", "order_send", "last_error",
+)
+# только чтение — такие запросы можно склеивать
+COALESCABLE = frozenset(GATEWAY_FUNCTIONS) - {"order_send", "order_check", "symbol_select", "last_error"}
+
+
+class _CallStats:
+    __slots__ = ("calls", "coalesced", "exec_time", "wait_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self.exec_time = 0.0
+        self.wait_time = 0.0
+
+
+class MT5Gateway:
+    def __init__(self, module=mt5):
+        self._module = module
+        self._queue = queue.Queue()
+        self._pending = {}        # ключ запроса -> Future (пока запрос в очереди)
+        self._lock = threading.Lock()
+        self._originals = {}
+        self._thread = None
+        self.stats = {}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="mt5-gateway", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def installed(self):
+        return bool(self._originals)
+
+    def install(self):
+        """Подменяет функции модуля MetaTrader5 обёртками шлюза."""
+        self.start()
+        for name in GATEWAY_FUNCTIONS:
+            original = getattr(self._module, name, None)
+            if original is None or name in self._originals:
+                continue
+            self._originals[name] = original
+            setattr(self._module, name, self._wrapper(name))
+        return self
+
+    def uninstall(self):
+        for name, original in self._originals.items():
+            setattr(self._module, name, original)
+        self._originals = {}
+        self.stop()
+
+    def _wrapper(self, name):
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        call.__name__ = name
+        return call
+
+    def call(self, name, *args, **kwargs):
+        original = self._originals.get(name) or getattr(self._module, name)
+        if threading.current_thread() is self._thread:
+            return original(*args, **kwargs)
+
+        key = None
+        if name in COALESCABLE:
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+
+        with self._lock:
+            stats = self.stats.setdefault(name, _CallStats())
+            future = self._pending.get(key) if key is not None else None
+            if future is not None:
+                stats.coalesced += 1
+            else:
+                future = Future()
+                if key is not None:
+                    self._pending[key] = future
+                self._queue.put((name, original, args, kwargs, key, future, time.perf_counter()))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, original, args, kwargs, key, future, submitted = item
+            started = time.perf_counter()
+            with self._lock:
+                # после начала выполнения новые такие же запросы пойдут отдельным вызовом
+                if key is not None:
+                    self._pending.pop(key, None)
+            try:
+                result = original(*args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finished = time.perf_counter()
+            with self._lock:
+                stats = self.stats[name]
+                stats.calls += 1
+                stats.wait_time += started - submitted
+                stats.exec_time += finished - started
+
+    def stats_line(self):
+        with self._lock:
+            items = sorted(self.stats.items(), key=lambda kv: -kv[1].exec_time)
+            parts = [
+                f"{name}: {s.calls} (+{s.coalesced} склеено), exec {s.exec_time * 1000:.0f}ms, "
+                f"wait {s.wait_time * 1000:.0f}ms"
+                for name, s in items
+            ]
+        return "; ".join(parts) if parts else "нет вызовов"
+
+
+gateway = MT5Gateway()
@@ -1,5 +1,6 @@
 import MetaTrader5 as mt5
 from utils.logger import file_logger, console_logger
+from core.market_state import market_state
 from datetime import datetime, timezone, time
 
 # RUB-пары
@@ -8,7 +9,7 @@ RUB_MARKET_START = time(7, 0)   # 07:00 по Москве
 RUB_MARKET_END = time(20, 0)    # 20:00 по Москве
 
 def is_rub_market_open(symbol):
-    tick = mt5.symbol_info_tick(symbol)
+    tick = market_state.tick(symbol)
     if tick is None:
         file_logger.error(f"❌ Не удалось получить тик для {symbol} при проверке времени торговли.")
         return False
@@ -18,58 +19,23 @@ def is_rub_market_open(symbol):
 
     return RUB_MARKET_START <= moscow_time <= RUB_MARKET_END
 
-def send_order(symbol, lot, order_type, price, sl_points=100, tp_points=100, comment=""):
-    symbol_info = mt5.symbol_info(symbol)
-    if symbol_info is None:
-        file_logger.error(f"❌ Символ {symbol} не найден")
-        return False
-
-    account_info = mt5.account_info()
-    if account_info is None:
-        file_logger.error("❌ Не удалось получить информацию о счёте.")
-        return False
-
-    # ⛔ Проверка времени торговли для RUB-пар
-    if symbol in RUB_SYMBOLS and not is_rub_market_open(symbol):
-        file_logger.warning(f"⏱️ {symbol}: Вне торгового окна RUB (07:00–20:00 МСК)")
-        return False
-
-    # 🔍 Подготовка
+def stop_distances(symbol_info, sl_points, tp_points):
+    """Расстояния SL/TP от цены входа: не ближе стоп-левела, двух спредов и 20 пунктов. (sl, tp, min_distance)."""
     point = symbol_info.point
-    stop_level_points = symbol_info.trade_stops_level
-    stop_level_price = stop_level_points * point
+    stop_level_price = symbol_info.trade_stops_level * point
     spread = symbol_info.ask - symbol_info.bid
     min_distance = max(stop_level_price, spread * 2, 20 * point)
-
-    # 🔧 SL и TP
     sl_p = max(sl_points * point, min_distance + 2 * point)
     tp_p = max(tp_points * point, min_distance + 2 * point)
+    return sl_p, tp_p, min_distance
+
 
+def order_request(symbol, lot, order_type, price, sl_distance, tp_distance, comment="", magic=0):
     if order_type == mt5.ORDER_TYPE_BUY:
-        sl_price = price - sl_p
-        tp_price = price + tp_p
+        sl_price, tp_price = price - sl_distance, price + tp_distance
     else:
-        sl_price = price + sl_p
-        tp_price = price - tp_p
-
-    file_logger.info(
-        f"🔍 SL/TP расчёт для {symbol}:\n"
-        f"  • price={price:.5f}, spread={spread:.5f}, point={point}, stop_level={stop_level_points}\n"
-        f"  • SL={sl_price:.5f}, TP={tp_price:.5f}, min_distance={min_distance:.5f}"
-    )
-
-    if not symbol_info.visible or symbol_info.trade_mode != mt5.SYMBOL_TRADE_MODE_FULL:
-        file_logger.warning(f"⚠️ Символ {symbol} недоступен для торговли: рынок закрыт или нет сессии.")
-        return False
-
-    file_logger.warning(
-        f"[{symbol}] Проверка SL/TP:\n"
-        f"  • Цена: {price:.5f}, Спред: {spread:.5f}\n"
-        f"  • SL: {sl_price:.5f}, TP: {tp_price:.5f}\n"
-        f"  • Стоп-левел: {stop_level_points} пунктов ({stop_level_price:.5f}), min_distance: {min_distance:.5f}"
-    )
-
-    request = {
+        sl_price, tp_price = price + sl_distance, price - tp_distance
+    return {
         "action": mt5.TRADE_ACTION_DEAL,
         "symbol": symbol,
         "volume": lot,
@@ -78,30 +44,98 @@ def send_order(symbol, lot, order_type, price, sl_points=100, tp_points=100, com
         "sl": sl_price,
         "tp": tp_price,
         "deviation": 10,
+        "magic": magic,
         "type_filling": mt5.ORDER_FILLING_FOK,
         "comment": comment,
     }
 
+
+def send_request(request, trace=None):
+    """order_send готового запроса; логирование — после отправки. trace (dict) получает request и response."""
     result = mt5.order_send(request)
+    if trace is not None:
+        trace.update(request=request, response=result)
 
     if result.retcode == mt5.TRADE_RETCODE_DONE:
         file_logger.info(
-            f"✅ Сделка открыта: {symbol} | {['BUY','SELL'][order_type]} @ {price:.5f} | SL: {sl_price:.5f} | TP: {tp_price:.5f}"
+            f"✅ Сделка открыта: {request['symbol']} | {['BUY','SELL'][request['type']]} @ {request['price']:.5f} | "
+            f"SL: {request['sl']:.5f} | TP: {request['tp']:.5f}"
         )
         return True
     else:
         file_logger.error(
-            f"❌ Ошибка отправки ордера по {symbol}: {result.retcode}\n"
+            f"❌ Ошибка отправки ордера по {request['symbol']}: {result.retcode}\n"
             f"📨 Запрос: {request}\n"
             f"📩 Ответ: {result._asdict()}"
         )
         return False
 
 
-def close_order(position):
-    """Функция для закрытия позиции."""
+def tradable(symbol, symbol_info):
+    """Символ доступен для торговли: сессия RUB-пар, видимость и режим торговли. Иначе — причина."""
+    # ⛔ Проверка времени торговли для RUB-пар
+    if symbol in RUB_SYMBOLS and not is_rub_market_open(symbol):
+        return f"⏱️ {symbol}: Вне торгового окна RUB (07:00–20:00 МСК)"
+    if not symbol_info.visible or symbol_info.trade_mode != mt5.SYMBOL_TRADE_MODE_FULL:
+        return f"⚠️ Символ {symbol} недоступен для торговли: рынок закрыт или нет сессии."
+    return None
+
+
+def send_order(symbol, lot, order_type, price, sl_points=100, tp_points=100, comment="", magic=0, trace=None):
+    """Рыночный ордер с SL/TP в пунктах. trace (dict) получает request и response для журнала."""
+    symbol_info = market_state.symbol_info(symbol)
+    if symbol_info is None:
+        file_logger.error(f"❌ Символ {symbol} не найден")
+        return False
+
+    account_info = market_state.account()
+    if account_info is None:
+        file_logger.error("❌ Не удалось получить информацию о счёте.")
+        return False
+
+    refused = tradable(symbol, symbol_info)
+    if refused:
+        file_logger.warning(refused)
+        return False
+
+    # 🔧 SL и TP
+    sl_p, tp_p, min_distance = stop_distances(symbol_info, sl_points, tp_points)
+    request = order_request(symbol, lot, order_type, price, sl_p, tp_p, comment, magic)
+
+    file_logger.info(
+        f"🔍 SL/TP расчёт для {symbol}:\n"
+        f"  • price={price:.5f}, spread={symbol_info.ask - symbol_info.bid:.5f}, point={symbol_info.point}, "
+        f"stop_level={symbol_info.trade_stops_level}\n"
+        f"  • SL={request['sl']:.5f}, TP={request['tp']:.5f}, min_distance={min_distance:.5f}"
+    )
+    return send_request(request, trace)
+
+
+def modify_sl(position, sl):
+    """Перенос SL позиции (TP остаётся). Ответ order_send; NO_CHANGES (10025) — не ошибка."""
+    request = {
+        "action": mt5.TRADE_ACTION_SLTP,
+        "symbol": position.symbol,
+        "position": position.ticket,
+        "sl": sl,
+        "tp": position.tp,
+        "deviation": 10,
+        "type_filling": mt5.ORDER_FILLING_FOK,
+    }
+    result = mt5.order_send(request)
+    if result is None:
+        file_logger.error(f"❌ Модификация SL #{position.ticket} не отправлена: {mt5.last_error()}")
+    elif result.retcode not in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_NO_CHANGES,
+                                mt5.TRADE_RETCODE_POSITION_CLOSED):
+        file_logger.error(f"❌ Ошибка модификации SL/TP #{position.ticket}: {result.retcode}")
+    return result
+
+
+def close_order(position, trace=None):
+    """Функция для закрытия позиции. trace (dict) получает request и response для журнала."""
     action = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-    tick = mt5.symbol_info_tick(position.symbol)
+    # цена закрытия — только по свежему тику
+    tick = market_state.tick(position.symbol, fresh=True)
     if tick is None:
         file_logger.error(f"❌ Ошибка получения тика для закрытия позиции по {position.symbol}")
         return False
@@ -115,11 +149,14 @@ def close_order(position):
         "position": position.ticket,
         "price": price,
         "deviation": 10,
+        "magic": position.magic,
         "type_filling": mt5.ORDER_FILLING_FOK,
         "comment": "Close by strategy",
     }
 
     result = mt5.order_send(request)
+    if trace is not None:
+        trace.update(request=request, response=result)
 
     if result.retcode == mt5.TRADE_RETCODE_DONE:
         file_logger.info(f"✅ Позиция по {position.symbol} закрыта успешно.")
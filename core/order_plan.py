@@ -0,0 +1,72 @@
+"""
+Быстрый путь ордера: подготовленный вход трейдера.
+
+Всё, что не зависит от финальной цены, считается до проверки сигнала, на каждом цикле входов:
+проверки риска (интервал входов, свободная маржа, число позиций, дневной убыток, серия убытков,
+торговое окно символа), ATR-дистанции SL/TP с нормализацией как в send_order, лот и маржа
+для обеих сторон. Фильтр тренда H4 хранит суммы закрытых баров (пересчёт — раз на бар H4),
+а формирующийся бар подставляет по цене тика. После сигнала остаются свежий тик,
+фильтр H4 за O(1), резерв общих ограничений и order_send.
+"""
+import math
+import numpy as np
+import MetaTrader5 as mt5
+from utils.helpers import timeframe_seconds
+
+H4_SECONDS = timeframe_seconds(mt5.TIMEFRAME_H4)
+
+
+class EntryPlan:
+    __slots__ = ("bar_time", "cycle_id", "blocked", "warn", "allocated_equity", "risk_amount", "atr",
+                 "sl_points", "tp_points", "sl_distance", "tp_distance", "sides", "trend")
+
+    def __init__(self, bar_time, cycle_id):
+        self.bar_time = bar_time          # время последнего бара стратегии, для которого готовился план
+        self.cycle_id = cycle_id          # цикл снимка рынка (market_state)
+        self.blocked = None               # причина, по которой вход сейчас невозможен
+        self.warn = False                 # причину писать в лог, а не в консоль
+        self.allocated_equity = 0.0
+        self.risk_amount = 0.0
+        self.atr = math.nan
+        self.sl_points = self.tp_points = 0.0
+        self.sl_distance = self.tp_distance = 0.0
+        self.sides = {}                   # "buy"/"sell" -> (тип ордера, SizingDecision)
+        self.trend = None                 # TrendFilter или None
+
+    def block(self, reason, warn=False):
+        self.blocked, self.warn = reason, warn
+        return self
+
+    def fresh(self, rates, cycle_id):
+        return self.cycle_id == cycle_id and self.bar_time == int(rates[-1]['time'])
+
+
+class TrendFilter:
+    """
+    SMA коротк./длин. по H4, как indicator_engine "sma" по барам с формирующимся: суммы
+    закрытых баров готовы заранее, цена формирующегося бара — цена тика в момент входа.
+    """
+    __slots__ = ("bar_time", "short", "long", "sum_short", "sum_long")
+
+    def __init__(self, bar_time, closed, short=10, long=50):
+        self.bar_time = bar_time
+        self.short, self.long = short, long
+        closes = np.asarray(closed, dtype=float)
+        # недостаточно баров — SMA не определена (NaN), фильтр вход не запрещает
+        self.sum_short = float(closes[-(short - 1):].sum()) if len(closes) >= short - 1 else math.nan
+        self.sum_long = float(closes[-(long - 1):].sum()) if len(closes) >= long - 1 else math.nan
+
+    def smas(self, price):
+        return (self.sum_short + price) / self.short, (self.sum_long + price) / self.long
+
+    def allows(self, signal, price):
+        sma_short, sma_long = self.smas(price)
+        return not ((signal == 'buy' and sma_short < sma_long) or (signal == 'sell' and sma_short > sma_long))
+
+    @classmethod
+    def from_rates(cls, rates_h4, now):
+        """Фильтр по барам H4 (как из copy_rates, последний может формироваться) на момент now."""
+        bucket = now - now % H4_SECONDS
+        forming = len(rates_h4) and int(rates_h4[-1]['time']) == bucket
+        closed = rates_h4['close'][:-1] if forming else rates_h4['close']
+        return cls(bucket, closed)
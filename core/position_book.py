@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import namedtuple
+import MetaTrader5 as mt5
+from config.settings import MAGIC_NUMBERS, MARKET_SNAPSHOT_TTL_SEC
+from utils.logger import file_logger
+
+# событие открытия/закрытия позиции: kind = "open" | "close"
+PositionEvent = namedtuple("PositionEvent", "kind ticket strategy symbol position")
+
+STRATEGY_BY_MAGIC = {magic: name for name, magic in MAGIC_NUMBERS.items()}
+
+
+def position_strategy(position):
+    """Стратегия-владелец позиции: по magic, для старых позиций без magic — по комментарию."""
+    name = STRATEGY_BY_MAGIC.get(position.magic)
+    if name:
+        return name
+    for name in MAGIC_NUMBERS:
+        if name in position.comment:
+            return name
+    return None
+
+
+class PositionBook:
+    """
+    Книга позиций: один mt5.positions_get() на цикл, индексы по тикету, символу
+    и стратегии (по MAGIC_NUMBERS). Между обновлениями вычисляется разница,
+    события открытия/закрытия рассылаются подписчикам.
+    """
+
+    def __init__(self, ttl_sec=MARKET_SNAPSHOT_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self.by_ticket = {}
+        self.by_symbol = {}
+        self.by_strategy = {}
+        self._by_key = {}        # (strategy, symbol) -> [positions]
+        self._subscribers = []
+        self._loaded = None      # (номер цикла, monotonic-время загрузки)
+        self._initialized = False
+        self._lock = threading.RLock()
+        self.cycle_id = 0
+        self.refreshes = 0
+
+    def subscribe(self, callback):
+        """callback(PositionEvent) вызывается на каждое открытие/закрытие позиции."""
+        self._subscribers.append(callback)
+
+    def begin_cycle(self):
+        self.cycle_id += 1
+
+    def invalidate(self):
+        """Сбрасывает книгу после собственного ордера — следующее чтение перезагрузит позиции."""
+        self._loaded = None
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        positions = mt5.positions_get()
+        self.refreshes += 1
+        if positions is None:
+            file_logger.error(f"❌ positions_get не вернул данные: {mt5.last_error()}")
+            return
+        previous = self.by_ticket
+        by_ticket, by_symbol, by_strategy, by_key = {}, {}, {}, {}
+        for pos in positions:
+            strategy = position_strategy(pos)
+            by_ticket[pos.ticket] = pos
+            by_symbol.setdefault(pos.symbol, []).append(pos)
+            by_strategy.setdefault(strategy, []).append(pos)
+            by_key.setdefault((strategy, pos.symbol), []).append(pos)
+        self.by_ticket, self.by_symbol, self.by_strategy, self._by_key = by_ticket, by_symbol, by_strategy, by_key
+        self._loaded = (self.cycle_id, time.monotonic())
+
+        # первая загрузка — это исходное состояние, а не события
+        if not self._initialized:
+            self._initialized = True
+            return
+        for ticket, pos in by_ticket.items():
+            if ticket not in previous:
+                self._publish(PositionEvent("open", ticket, position_strategy(pos), pos.symbol, pos))
+        for ticket, pos in previous.items():
+            if ticket not in by_ticket:
+                self._publish(PositionEvent("close", ticket, position_strategy(pos), pos.symbol, pos))
+
+    def _publish(self, event):
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as exc:
+                file_logger.error(f"❌ Ошибка обработчика события позиции #{event.ticket}: {exc}")
+
+    def _is_fresh(self):
+        loaded = self._loaded
+        if loaded is None:
+            return False
+        cycle_id, loaded_at = loaded
+        return cycle_id == self.cycle_id and time.monotonic() - loaded_at < self.ttl_sec
+
+    def _ensure_fresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            # пока ждали блокировку, книгу мог обновить другой поток
+            if not self._is_fresh():
+                self._refresh()
+
+    def get(self, strategy, symbol):
+        """Первая позиция стратегии по символу или None."""
+        self._ensure_fresh()
+        positions = self._by_key.get((strategy, symbol))
+        return positions[0] if positions else None
+
+    def for_symbol(self, symbol):
+        self._ensure_fresh()
+        return self.by_symbol.get(symbol, [])
+
+    def for_strategy(self, strategy):
+        self._ensure_fresh()
+        return self.by_strategy.get(strategy, [])
+
+    def ticket(self, ticket):
+        self._ensure_fresh()
+        return self.by_ticket.get(ticket)
+
+    def all(self):
+        self._ensure_fresh()
+        return list(self.by_ticket.values())
+
+
+# Единая книга позиций на процесс
+position_book = PositionBook()
@@ -0,0 +1,216 @@
+"""
+Монитор позиций: безубыток и трейлинг на частоте тиков, отдельно от циклов входов.
+
+Раз в POSITION_MONITOR_INTERVAL_SEC монитор читает свежие тики только по символам
+с открытыми позициями своих пар (стратегия, символ) и одним векторным проходом по всем
+позициям считает новые SL. ATR берётся у трейдера — он пересчитывает его на цикле
+сопровождения и при входе, — бары монитор не запрашивает.
+
+Модификация уходит, только если стоп сдвигается заметно: безубыток — один раз, трейлинг —
+когда новый SL лучше текущего минимум на TRAILING_STEP_ATR × ATR (стоп отстаёт от цены
+на (TRAILING_ATR − TRAILING_STEP_ATR) × ATR и подтягивается шагами). Все изменения прохода
+отправляются пачкой, самые выгодные первыми, с ограничением частоты на счёт
+(POSITION_MONITOR_MAX_MODIFY_PER_SEC) и на позицию (POSITION_MONITOR_MIN_MODIFY_INTERVAL_SEC);
+не уместившиеся ждут следующего прохода.
+
+В бою монитор работает в своём потоке (start/stop), в реплее проход вызывается явно (poll).
+"""
+import math
+import threading
+import time
+import numpy as np
+import MetaTrader5 as mt5
+from config.settings import BREAK_EVEN_ATR, TRAILING_ATR, TRAILING_STEP_ATR
+from config.settings import (POSITION_MONITOR_INTERVAL_SEC, POSITION_MONITOR_MAX_MODIFY_PER_SEC,
+                             POSITION_MONITOR_MIN_MODIFY_INTERVAL_SEC)
+from core.market_state import market_state
+from core.metrics import metrics
+from core.mt5_interface import modify_sl
+from core.position_book import position_book, position_strategy
+from core.scheduler import SystemClock
+from utils.logger import file_logger, get_logger
+
+log = get_logger("orders")
+
+
+class _TicketState:
+    __slots__ = ("be", "sl", "sent_at")
+
+    def __init__(self):
+        self.be = False           # безубыток выставлен (или стоп уже не хуже него)
+        self.sl = 0.0             # последний отправленный SL (книга позиций может отставать)
+        self.sent_at = -math.inf  # время последней отправки по часам монитора
+
+
+class PositionMonitor:
+    def __init__(self, traders, clock=None, interval=POSITION_MONITOR_INTERVAL_SEC,
+                 max_per_sec=POSITION_MONITOR_MAX_MODIFY_PER_SEC,
+                 min_interval=POSITION_MONITOR_MIN_MODIFY_INTERVAL_SEC):
+        """traders — трейдеры своих пар: у них берётся ATR (trader.atr), позиции чужих пар не трогаются."""
+        self.traders = {(trader.strategy_name, trader.symbol): trader for trader in traders}
+        self.clock = clock or SystemClock()
+        self.interval = interval
+        self.max_per_sec = max_per_sec
+        self.min_interval = min_interval
+        self._state = {}          # тикет -> _TicketState
+        self._specs = {}          # символ -> (point, минимальная дистанция стопа)
+        self._tokens = float(max_per_sec)
+        self._refilled_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._poll_time = metrics.histogram("position_monitor_poll_seconds")
+        # счётчики
+        self.polls = 0
+        self.sent = 0
+        self.throttled = 0
+        self.errors = 0
+        position_book.subscribe(self._on_position_event)
+
+    def _on_position_event(self, event):
+        if event.kind == "close":
+            self._state.pop(event.ticket, None)
+
+    # ── поток ────────────────────────────────────────────────────────
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="position-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as exc:
+                file_logger.error(f"❌ Монитор позиций: {exc}")
+
+    # ── проход ───────────────────────────────────────────────────────
+    def _spec(self, symbol):
+        spec = self._specs.get(symbol)
+        if spec is None:
+            info = market_state.symbol_info(symbol)
+            if info is None:
+                return None
+            spec = self._specs[symbol] = (info.point, info.trade_stops_level * info.point)
+        return spec
+
+    def poll(self):
+        """Один проход: тики, векторный расчёт SL по всем позициям, пачка модификаций. Число отправленных."""
+        started = time.perf_counter()
+        try:
+            return self._poll()
+        finally:
+            self.polls += 1
+            self._poll_time.observe(time.perf_counter() - started)
+
+    def _poll(self):
+        rows = []
+        ticks = {}
+        for pos in position_book.all():
+            trader = self.traders.get((position_strategy(pos), pos.symbol))
+            if trader is None or not trader.atr > 0:
+                continue
+            spec = self._spec(pos.symbol)
+            if spec is None:
+                continue
+            if pos.symbol not in ticks:
+                ticks[pos.symbol] = market_state.tick(pos.symbol, fresh=True)
+            if ticks[pos.symbol] is None:
+                continue
+            rows.append((pos, trader, spec, self._state.setdefault(pos.ticket, _TicketState())))
+        if not rows:
+            return 0
+
+        buy = np.array([pos.type == mt5.ORDER_TYPE_BUY for pos, _, _, _ in rows])
+        sign = np.where(buy, 1.0, -1.0)
+        # для стопа buy смотрит на bid, sell — на ask
+        price = np.array([ticks[pos.symbol].bid if pos.type == mt5.ORDER_TYPE_BUY else ticks[pos.symbol].ask
+                          for pos, _, _, _ in rows])
+        entry = np.array([pos.price_open for pos, _, _, _ in rows])
+        current = np.array([max(pos.sl, state.sl) if pos.type == mt5.ORDER_TYPE_BUY
+                            else min(pos.sl or math.inf, state.sl or math.inf) for pos, _, _, state in rows])
+        current = np.where(np.isfinite(current) & (current > 0), current, np.nan)   # nan — стопа нет
+        atr = np.array([trader.atr for _, trader, _, _ in rows])
+        point = np.array([spec[0] for _, _, spec, _ in rows])
+        min_dist = np.array([spec[1] for _, _, spec, _ in rows])
+        be_mult = np.array([BREAK_EVEN_ATR[trader.strategy_name] for _, trader, _, _ in rows])
+        trail_mult = np.array([TRAILING_ATR[trader.strategy_name] for _, trader, _, _ in rows])
+        step_mult = np.array([TRAILING_STEP_ATR[trader.strategy_name] for _, trader, _, _ in rows])
+        be_done = np.array([state.be for _, _, _, state in rows])
+
+        def gain(level):
+            # насколько уровень лучше текущего стопа в сторону прибыли (без стопа — любой уровень лучше)
+            return np.where(np.isnan(current), np.inf, sign * (level - current))
+
+        profit = sign * (price - entry)
+        be_price = entry + sign * min_dist
+        be_due = ~be_done & (profit >= be_mult * atr)
+        be_ok = be_due & (sign * (price - be_price) >= min_dist) & (gain(be_price) >= point)
+        # стоп уже не хуже безубытка — отправлять нечего, безубыток считается выставленным
+        be_reached = be_due & (gain(be_price) < point)
+
+        trail_price = price - sign * (trail_mult - step_mult) * atr
+        trail_ok = (be_done | be_due) & (sign * (price - trail_price) >= min_dist) & \
+            (gain(trail_price) >= step_mult * atr)
+
+        use_trail = trail_ok & (~be_ok | (sign * (trail_price - be_price) > 0))
+        target = np.where(use_trail, trail_price, be_price)
+        due = use_trail | be_ok
+        for i in np.flatnonzero(be_reached & ~due):
+            rows[i][3].be = True
+
+        # самые выгодные изменения (в ATR) — первыми, пока есть лимит
+        order = np.flatnonzero(due)
+        order = order[np.argsort(-np.minimum(gain(target)[order], 1e9) / atr[order], kind="stable")]
+        return self._send(rows, order, target, use_trail, be_due, profit)
+
+    def _take_token(self, now):
+        if self._refilled_at is not None:
+            self._tokens = min(self.max_per_sec, self._tokens + (now - self._refilled_at) * self.max_per_sec)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _send(self, rows, order, target, use_trail, be_due, profit):
+        sent = 0
+        for i in order:
+            pos, trader, spec, state = rows[i]
+            now = self.clock.now()
+            if now - state.sent_at < self.min_interval or not self._take_token(now):
+                self.throttled += 1
+                metrics.inc("position_sl_modify_total", kind="trail" if use_trail[i] else "be", result="throttled")
+                continue
+            digits = max(int(round(-math.log10(spec[0]))), 0)
+            sl = round(float(target[i]), digits)
+            kind = "trail" if use_trail[i] else "be"
+            response = modify_sl(pos, sl)
+            state.sent_at = now
+            if response is not None and response.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_NO_CHANGES):
+                state.sl = sl
+                state.be = state.be or bool(be_due[i])
+                sent += 1
+                self.sent += 1
+                metrics.inc("position_sl_modify_total", kind=kind, result="done")
+                icon = "↔️" if use_trail[i] else "🔒"
+                log.info("%s %s: %s SL #%d → %.5f, прибыль %.5f", icon, pos.symbol, kind.upper(), pos.ticket, sl,
+                         profit[i], extra={"symbol": pos.symbol, "strategy": trader.strategy_name, "sl": sl})
+            elif response is not None and response.retcode == mt5.TRADE_RETCODE_POSITION_CLOSED:
+                # позиция закрылась между проходами — книга перечитается на следующем
+                position_book.invalidate()
+                metrics.inc("position_sl_modify_total", kind=kind, result="closed")
+            else:
+                self.errors += 1
+                metrics.inc("position_sl_modify_total", kind=kind, result="error")
+        return sent
+
+    def stats_line(self):
+        return (f"проходов={self.polls}, SL отправлено={self.sent}, отложено лимитом={self.throttled}, "
+                f"ошибок={self.errors}, p99 прохода={self._poll_time.quantile(0.99) * 1000:.2f}ms")
@@ -0,0 +1,293 @@
+"""
+Профилирование работающего бота без перезапуска.
+
+Управление — командами в файле PROFILE_CONTROL_FILE (файл перечитывается, когда меняется
+его время изменения; каждый процесс-воркер выполняет команды сам), на POSIX ещё и сигналами:
+
+    echo "cprofile on"  > profile.ctl     # cProfile циклов (kill -USR1 <pid> — вкл/выкл)
+    echo "cprofile off" > profile.ctl     # -> profiles/cprofile_<время>.prof (snakeviz, pstats)
+    echo "sample on"    > profile.ctl     # сэмплирующий профайлер всех потоков (kill -USR2 <pid>)
+    echo "sample off"   > profile.ctl     # -> profiles/sample_<время>.txt (свёрнутые стеки, flamegraph.pl)
+    echo "tracemalloc snapshot" > profile.ctl
+    echo "slow 10"      > profile.ctl     # сколько самых медленных циклов хранить
+
+Сэмплер — поток, который раз в PROFILE_SAMPLE_INTERVAL_SEC снимает стеки всех потоков
+(sys._current_frames) и считает одинаковые. Пока он работает только во время циклов,
+стоимость — единицы процентов, поэтому при PROFILE_SLOW_CYCLES > 0 (или после "slow N")
+он пишет профиль каждого цикла: N самых медленных лежат в profiles/slow_<этап>_<мс>ms_<время>.txt.
+cProfile видит только поток цикла — в режиме "threads" трейдеров смотрите сэмплером.
+tracemalloc (PROFILE_TRACEMALLOC_EVERY > 0) снимает снимок памяти раз в K циклов
+и пишет рост по строкам кода относительно прошлого снимка; хранятся последние
+PROFILE_TRACEMALLOC_KEEP снимков.
+"""
+import cProfile
+import heapq
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from config.settings import (PROFILE_DIR, PROFILE_CONTROL_FILE, PROFILE_SLOW_CYCLES, PROFILE_SAMPLE_INTERVAL_SEC,
+                             PROFILE_TRACEMALLOC_EVERY, PROFILE_TRACEMALLOC_FRAMES, PROFILE_TRACEMALLOC_KEEP)
+from utils.logger import file_logger
+
+
+def _stamp():
+    return time.strftime("%Y%m%d_%H%M%S")
+
+
+# кадры ожидания (очереди, события, select) — поток простаивает, в профиль не попадает
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+
+def _idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _collapse(frame):
+    """Стек кадра в свёрнутом виде: внешний;…;внутренний."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Сэмплирующий профайлер: свёрнутые стеки всех потоков, кроме своего."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL_SEC):
+        self.interval = interval
+        self.counts = None        # общий профиль (sample on/off) или None
+        self.segment = None       # профиль текущего цикла или None
+        self.samples = 0
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.counts is not None or self.segment is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        own = threading.get_ident()
+        while True:
+            if not self.active:
+                # простаиваем, пока нечего записывать
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            stacks = [_collapse(frame) for ident, frame in sys._current_frames().items()
+                      if ident != own and not _idle(frame)]
+            with self._lock:
+                for target in (self.counts, self.segment):
+                    if target is not None:
+                        target.update(stacks)
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def begin_segment(self):
+        with self._lock:
+            self.segment = Counter()
+        self._wake.set()
+
+    def end_segment(self):
+        with self._lock:
+            segment, self.segment = self.segment, None
+        return segment or Counter()
+
+    def enable(self):
+        with self._lock:
+            self.counts = Counter()
+        self._wake.set()
+
+    def disable(self):
+        with self._lock:
+            counts, self.counts = self.counts, None
+        return counts or Counter()
+
+
+def write_collapsed(path, counts, header=""):
+    with open(path, "w", encoding="utf-8") as file:
+        if header:
+            file.write(f"# {header}\n")
+        for stack, count in counts.most_common():
+            file.write(f"{stack} {count}\n")
+
+
+class ProfilingHooks:
+    """Хуки цикла для Bot: команды управления, профили медленных циклов, снимки tracemalloc."""
+
+    def __init__(self, out_dir=PROFILE_DIR, control_file=PROFILE_CONTROL_FILE, slow_cycles=PROFILE_SLOW_CYCLES,
+                 tracemalloc_every=PROFILE_TRACEMALLOC_EVERY, tracemalloc_keep=PROFILE_TRACEMALLOC_KEEP, tag=""):
+        self.out_dir = out_dir
+        self.control_file = control_file
+        self.slow_cycles = slow_cycles
+        self.tracemalloc_every = tracemalloc_every
+        self.tag = f"{tag}_" if tag else ""
+        self.sampler = StackSampler()
+        self.profile = None          # cProfile.Profile, пока включён
+        self.cycles = 0
+        self._slowest = []           # куча (мс, путь) — самые медленные циклы
+        self._control_mtime = None
+        self._pending = []           # команды из сигналов, выполняются в потоке цикла
+        self._snapshot = None        # прошлый снимок tracemalloc
+        self._snapshots = deque()    # пути .snap записанных снимков, от старых к новым
+        self.tracemalloc_keep = tracemalloc_keep
+        os.makedirs(out_dir, exist_ok=True)
+        if slow_cycles:
+            self.sampler.start()
+        if tracemalloc_every and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        try:
+            # начальное состояние файла управления — старые команды не выполняем
+            self._control_mtime = os.stat(control_file).st_mtime_ns
+        except OSError:
+            pass
+
+    def _path(self, kind, suffix):
+        return os.path.join(self.out_dir, f"{kind}_{self.tag}{_stamp()}{suffix}")
+
+    def install_signals(self):
+        """SIGUSR1 — cProfile вкл/выкл, SIGUSR2 — сэмплер вкл/выкл (только POSIX, только из главного потока)."""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        signal.signal(signal.SIGUSR1, lambda *_: self._pending.append("cprofile toggle"))
+        signal.signal(signal.SIGUSR2, lambda *_: self._pending.append("sample toggle"))
+
+    # ── команды ──────────────────────────────────────────────────────
+    def _read_control(self):
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+        except OSError:
+            return []
+        if mtime == self._control_mtime:
+            return []
+        self._control_mtime = mtime
+        with open(self.control_file, encoding="utf-8") as file:
+            return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+    def command(self, text):
+        words = text.lower().split()
+        what, arg = words[0], words[1] if len(words) > 1 else "toggle"
+        if what == "cprofile":
+            on = self.profile is None if arg == "toggle" else arg == "on"
+            self._cprofile(on)
+        elif what == "sample":
+            on = self.sampler.counts is None if arg == "toggle" else arg == "on"
+            self._sample(on)
+        elif what == "tracemalloc":
+            if arg == "off":
+                tracemalloc.stop()
+                self._snapshot = None
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                if arg == "snapshot":
+                    self.take_snapshot()
+        elif what == "slow" and arg.isdigit():
+            self.slow_cycles = int(arg)
+            if self.slow_cycles:
+                self.sampler.start()
+        else:
+            file_logger.warning(f"⚠️ Профилирование: неизвестная команда {text!r}")
+
+    def _cprofile(self, on):
+        if on and self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            print("\U0001F52C cProfile включён")
+        elif not on and self.profile is not None:
+            self.profile.disable()
+            path = self._path("cprofile", ".prof")
+            self.profile.dump_stats(path)
+            self.profile = None
+            print(f"\U0001F52C cProfile выключен -> {path}")
+
+    def _sample(self, on):
+        if on and self.sampler.counts is None:
+            self.sampler.start()
+            self.sampler.enable()
+            print("\U0001F52C Сэмплер включён")
+        elif not on and self.sampler.counts is not None:
+            counts = self.sampler.disable()
+            path = self._path("sample", ".txt")
+            write_collapsed(path, counts, f"интервал {self.sampler.interval} сек, сэмплов {sum(counts.values())}")
+            print(f"\U0001F52C Сэмплер выключен -> {path}")
+
+    # ── хуки цикла ───────────────────────────────────────────────────
+    def before_cycle(self):
+        for text in self._pending + self._read_control():
+            self.command(text)
+        self._pending = []
+        if self.slow_cycles:
+            self.sampler.begin_segment()
+
+    def after_cycle(self, stage, elapsed):
+        self.cycles += 1
+        if self.slow_cycles:
+            self._keep_if_slow(stage, elapsed, self.sampler.end_segment())
+        if self.tracemalloc_every and self.cycles % self.tracemalloc_every == 0:
+            self.take_snapshot()
+
+    def _keep_if_slow(self, stage, elapsed, counts):
+        ms = elapsed * 1000
+        if not counts or (len(self._slowest) >= self.slow_cycles and ms <= self._slowest[0][0]):
+            return
+        path = os.path.join(self.out_dir, f"slow_{self.tag}{stage}_{ms:.0f}ms_{_stamp()}.txt")
+        write_collapsed(path, counts, f"этап {stage}, {ms:.1f} мс, сэмплов {sum(counts.values())}")
+        heapq.heappush(self._slowest, (ms, path))
+        # вытесненный из топа профиль больше не нужен
+        while len(self._slowest) > self.slow_cycles:
+            _, evicted = heapq.heappop(self._slowest)
+            try:
+                os.remove(evicted)
+            except OSError:
+                pass
+
+    def take_snapshot(self, top=15):
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        path = self._path("tracemalloc", ".snap")
+        snapshot.dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"цикл {self.cycles}: выделено {current / 2 ** 20:.1f} МБ, пик {peak / 2 ** 20:.1f} МБ"]
+        if self._snapshot is not None:
+            lines.append(f"рост с прошлого снимка (top {top}):")
+            lines += [str(stat) for stat in snapshot.compare_to(self._snapshot, "lineno")[:top]]
+        else:
+            lines.append(f"крупнейшие места (top {top}):")
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+        with open(path[:-len(".snap")] + ".txt", "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        file_logger.info(f"\U0001F9EE tracemalloc: {lines[0]} -> {path}")
+        self._snapshot = snapshot
+        if not self._snapshots or self._snapshots[-1] != path:   # в ту же секунду — файл перезаписан
+            self._snapshots.append(path)
+        # старые снимки больше не нужны — сравнение идёт только с прошлым, он в памяти
+        while len(self._snapshots) > max(self.tracemalloc_keep, 1):
+            evicted = self._snapshots.popleft()
+            for old in (evicted, evicted[:-len(".snap")] + ".txt"):
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return path
+
+    def shutdown(self):
+        """Сбросить то, что ещё пишется (cProfile, сэмплер)."""
+        self._cprofile(False)
+        self._sample(False)
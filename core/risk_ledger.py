@@ -0,0 +1,204 @@
+"""
+Книга риска портфеля: реализованный PnL и серии убытков по истории сделок терминала.
+
+Раз в цикл (Bot.begin_cycle) одним history_deals_get от курсора (время, тикет последней
+учтённой сделки) дочитываются только новые сделки. Выходы относятся к стратегии по magic
+(как в книге позиций), передаются подписчикам (журнал сделок — выходы по SL/TP и вручную)
+и копятся в счётчиках по счёту, стратегии, символу и паре
+(стратегия, символ): дневной PnL (прибыль + комиссия + своп + fee) и текущая серия
+убыточных выходов. Экспозиция (позиции, объём, плавающая прибыль) пересчитывается
+из книги позиций. Трейдеры только читают готовые значения — O(1), без вызовов терминала.
+
+День — по времени сервера; на новом дне дневной PnL и серии обнуляются. Курсор и счётчики
+пишутся в RISK_LEDGER_PATH: после перезапуска история дочитывается от курсора (в счётчики дня
+идут только сделки текущего дня), а при первом запуске читается с начала текущего дня.
+"""
+import json
+import os
+import threading
+import MetaTrader5 as mt5
+from config.settings import RISK_LEDGER_PATH
+from core.position_book import position_book, position_strategy
+from utils.logger import file_logger
+
+DAY_SECONDS = 86400
+ACCOUNT = ("account",)
+
+
+def _keys(strategy, symbol):
+    """Счётчики, в которые попадает сделка или позиция."""
+    return (ACCOUNT, ("strategy", strategy), ("symbol", symbol), ("pair", strategy, symbol))
+
+
+def _key(strategy=None, symbol=None):
+    if strategy is None and symbol is None:
+        return ACCOUNT
+    if symbol is None:
+        return ("strategy", strategy)
+    if strategy is None:
+        return ("symbol", symbol)
+    return ("pair", strategy, symbol)
+
+
+def _dump_key(key):
+    return "|".join("" if part is None else part for part in key)
+
+
+def _load_key(text):
+    parts = text.split("|")
+    return tuple(None if part == "" and i else part for i, part in enumerate(parts))
+
+
+class RiskLedger:
+    def __init__(self, path=RISK_LEDGER_PATH):
+        self.path = path
+        self.day = None              # номер дня (время сервера // сутки)
+        self.cursor = None           # (time_msc, тикет) последней учтённой сделки
+        self.daily = {}              # ключ -> реализованный PnL за день
+        self.streaks = {}            # ключ -> убыточных выходов подряд
+        self.exposure_by = {}        # ключ -> (позиций, объём, плавающая прибыль)
+        self._opened = False
+        self._lock = threading.Lock()
+        self._subscribers = []
+        # счётчики
+        self.updates = 0
+        self.deals = 0
+
+    # ── состояние на диске ───────────────────────────────────────────
+    def open(self, path=None):
+        """Загружает курсор и счётчики (один раз на процесс; воркеры супервизора — каждый свой файл)."""
+        if self._opened:
+            return self
+        self._opened = True
+        self.path = path or self.path
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as exc:
+            file_logger.error(f"❌ Книга риска: не прочитать {self.path}: {exc}, история с начала дня")
+            return self
+        self.day = state.get("day")
+        self.cursor = tuple(state["cursor"]) if state.get("cursor") else None
+        self.daily = {_load_key(key): value for key, value in state.get("daily", {}).items()}
+        self.streaks = {_load_key(key): value for key, value in state.get("streaks", {}).items()}
+        return self
+
+    def save(self):
+        state = {
+            "day": self.day,
+            "cursor": list(self.cursor) if self.cursor else None,
+            "daily": {_dump_key(key): value for key, value in self.daily.items()},
+            "streaks": {_dump_key(key): value for key, value in self.streaks.items()},
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # запись через временный файл — при падении на диске остаётся прежнее состояние
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(temp, self.path)
+
+    def subscribe(self, callback):
+        """callback(deal, strategy) вызывается один раз на каждую новую сделку выхода."""
+        self._subscribers.append(callback)
+
+    def _publish(self, deal, strategy):
+        for callback in self._subscribers:
+            try:
+                callback(deal, strategy)
+            except Exception as exc:
+                file_logger.error(f"❌ Ошибка обработчика сделки #{deal.ticket}: {exc}")
+
+    # ── обновление ───────────────────────────────────────────────────
+    def update(self, server_now):
+        """Дочитывает новые сделки и пересчитывает экспозицию. server_now — время сервера, сек."""
+        with self._lock:
+            self.open()
+            self.updates += 1
+            changed = self._roll_day(int(server_now) // DAY_SECONDS)
+            changed |= self._read_deals(server_now)
+            if changed:
+                self.save()
+            self._update_exposure()
+
+    def _roll_day(self, day):
+        if self.day is not None and day <= self.day:
+            return False
+        self.day = day
+        self.daily = {}
+        self.streaks = {}
+        return True
+
+    def _read_deals(self, server_now):
+        # от курсора, даже если он во вчерашнем дне: сделки перед полуночью, пришедшие после прошлого
+        # чтения, нужны подписчикам (журнал), в счётчики дня они не попадают; секунда курсора
+        # запрашивается ещё раз — в ней могли быть сделки, не попавшие в прошлый ответ.
+        # Без курсора (первый запуск) — с начала дня
+        date_from = self.day * DAY_SECONDS if self.cursor is None else self.cursor[0] // 1000
+        # конец — с запасом на расхождение часов терминала и сервера
+        deals = mt5.history_deals_get(date_from, int(server_now) + DAY_SECONDS)
+        if deals is None:
+            file_logger.error(f"❌ history_deals_get не вернул данные: {mt5.last_error()}")
+            return False
+        changed = False
+        for deal in sorted(deals, key=lambda d: (d.time_msc, d.ticket)):
+            position = (deal.time_msc, deal.ticket)
+            if self.cursor is not None and position <= self.cursor:
+                continue
+            self.cursor = position
+            changed = True
+            if deal.entry == mt5.DEAL_ENTRY_IN or deal.type not in (mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL):
+                continue
+            strategy = position_strategy(deal)
+            self._publish(deal, strategy)
+            day = deal.time // DAY_SECONDS
+            if day < self.day:
+                continue
+            # сделка уже следующего дня (часы сервера впереди оценки) — день начинается с неё
+            self._roll_day(day)
+            self._record(strategy, deal.symbol,
+                         deal.profit + deal.commission + deal.swap + getattr(deal, "fee", 0.0))
+        return changed
+
+    def _record(self, strategy, symbol, pnl):
+        self.deals += 1
+        for key in _keys(strategy, symbol):
+            self.daily[key] = self.daily.get(key, 0.0) + pnl
+            if pnl < 0:
+                self.streaks[key] = self.streaks.get(key, 0) + 1
+            elif pnl > 0:
+                self.streaks[key] = 0
+
+    def _update_exposure(self):
+        exposure = {}
+        for pos in position_book.all():
+            for key in _keys(position_strategy(pos), pos.symbol):
+                count, volume, profit = exposure.get(key, (0, 0.0, 0.0))
+                exposure[key] = (count + 1, volume + pos.volume, profit + pos.profit)
+        self.exposure_by = exposure
+
+    # ── чтение (O(1), без терминала) ─────────────────────────────────
+    def daily_pnl(self, strategy=None, symbol=None):
+        """Реализованный PnL за день: по счёту, стратегии, символу или паре."""
+        return self.daily.get(_key(strategy, symbol), 0.0)
+
+    def loss_streak(self, strategy=None, symbol=None):
+        """Убыточных выходов подряд за день."""
+        return self.streaks.get(_key(strategy, symbol), 0)
+
+    def exposure(self, strategy=None, symbol=None):
+        """(открыто позиций, объём в лотах, плавающая прибыль)."""
+        return self.exposure_by.get(_key(strategy, symbol), (0, 0.0, 0.0))
+
+    def stats_line(self):
+        count, volume, profit = self.exposure()
+        return (f"дневной PnL={self.daily_pnl():.2f}, убытков подряд={self.loss_streak()}, "
+                f"позиций={count} ({volume:.2f} лот, {profit:+.2f}), сделок учтено={self.deals}, "
+                f"обновлений={self.updates}")
+
+
+# Единая книга риска на процесс
+risk_ledger = RiskLedger()
@@ -0,0 +1,180 @@
+"""
+Планировщик главного цикла.
+
+Проверка входа для каждого таймфрейма запускается сразу после закрытия бара
+(плюс небольшая задержка, чтобы терминал успел открыть новый бар), сопровождение
+позиций — на своём, более частом периоде. Часы внедряются (SystemClock/FakeClock),
+поэтому расписание проверяется офлайн без реального времени.
+"""
+import time
+from datetime import datetime, timezone
+from utils.helpers import timeframe_seconds
+from config.settings import BAR_CLOSE_DELAY_SEC
+
+_WEEK_SHIFT = 3 * 86400   # недельные бары MT5 открываются в воскресенье, а эпоха — в четверг
+
+
+class SystemClock:
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeClock:
+    """Часы для офлайн-прогонов: sleep мгновенно сдвигает время."""
+
+    def __init__(self, start=0.0):
+        self.t = float(start)
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.t += seconds
+
+    def advance(self, seconds):
+        self.t += seconds
+
+
+def next_bar_close(timeframe, now, server_offset=0):
+    """Момент закрытия бара, содержащего `now` (по локальным часам; server_offset — сдвиг сервера)."""
+    server_now = now + server_offset
+    if timeframe & 0xC000 == 0xC000:
+        months = timeframe & 0x3FFF
+        dt = datetime.fromtimestamp(server_now, tz=timezone.utc)
+        index = dt.year * 12 + dt.month - 1
+        index = (index // months + 1) * months
+        close = datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc).timestamp()
+        return close - server_offset
+    period = timeframe_seconds(timeframe)
+    shift = _WEEK_SHIFT if timeframe & 0xC000 == 0x8000 else 0
+    close = ((server_now - shift) // period + 1) * period + shift
+    return close - server_offset
+
+
+def estimate_server_offset(server_time, local_now, granularity=1800, limit=14 * 3600):
+    """Сдвиг времени сервера относительно локальных часов по времени последнего тика."""
+    offset = round((server_time - local_now) / granularity) * granularity
+    # устаревший тик (выходные) даёт бессмысленный сдвиг — тогда считаем сервер в UTC
+    return offset if abs(offset) <= limit else 0
+
+
+class JobStats:
+    def __init__(self):
+        self.runs = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+        self.overruns = 0
+        self.skipped = 0
+
+    def record(self, jitter, duration, overrun):
+        self.runs += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_jitter += jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.overruns += overrun
+
+    def line(self):
+        if not self.runs:
+            return "runs=0"
+        return (f"runs={self.runs}, avg={self.total_duration / self.runs * 1000:.1f}ms, "
+                f"max={self.max_duration * 1000:.1f}ms, jitter avg={self.total_jitter / self.runs * 1000:.1f}ms "
+                f"max={self.max_jitter * 1000:.1f}ms, overruns={self.overruns}, skipped={self.skipped}")
+
+
+class Job:
+    def __init__(self, name, callback, interval=None, timeframe=None):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.timeframe = timeframe
+        self.due = None
+        self.stats = JobStats()
+
+
+class Scheduler:
+    def __init__(self, clock=None, server_offset=0, bar_close_delay=BAR_CLOSE_DELAY_SEC):
+        self.clock = clock or SystemClock()
+        self.server_offset = server_offset
+        self.bar_close_delay = bar_close_delay
+        self.jobs = []
+        self._stopped = False
+
+    def every(self, interval, callback, name=None, run_now=True):
+        """Периодическая задача с фиксированным темпом (без накопления дрейфа)."""
+        job = Job(name or callback.__name__, callback, interval=interval)
+        job.due = self.clock.now() + (0 if run_now else interval)
+        self.jobs.append(job)
+        return job
+
+    def on_bar_close(self, timeframe, callback, name=None):
+        """Задача, запускаемая сразу после закрытия каждого бара таймфрейма."""
+        job = Job(name or f"bar_close_{timeframe}", callback, timeframe=timeframe)
+        job.due = self._bar_due(timeframe, self.clock.now())
+        self.jobs.append(job)
+        return job
+
+    def _bar_due(self, timeframe, now):
+        return next_bar_close(timeframe, now, self.server_offset) + self.bar_close_delay
+
+    def _next_due(self, job, now):
+        """Следующий слот строго после текущего и число пропущенных слотов."""
+        if job.interval is not None:
+            due = job.due + job.interval
+            missed = 0
+            if due <= now:
+                missed = int((now - due) // job.interval) + 1
+                due += missed * job.interval
+            return due, missed
+        due = self._bar_due(job.timeframe, job.due - self.bar_close_delay)
+        if due > now:
+            return due, 0
+        fresh = self._bar_due(job.timeframe, now)
+        return fresh, int(round((fresh - due) / timeframe_seconds(job.timeframe)))
+
+    def run_pending(self):
+        """Запускает все задачи, срок которых наступил. Возвращает число запусков."""
+        ran = 0
+        for job in sorted(self.jobs, key=lambda j: j.due):
+            start = self.clock.now()
+            if job.due > start:
+                continue
+            try:
+                job.callback()
+            finally:
+                end = self.clock.now()
+                next_due, missed = self._next_due(job, end)
+                # перерасход: задача не уложилась в свой период и съела следующий слот
+                job.stats.skipped += missed
+                job.stats.record(start - job.due, end - start, missed > 0)
+                job.due = next_due
+                ran += 1
+        return ran
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self, until=None, max_iterations=None):
+        """Главный цикл: спим до ближайшей задачи и выполняем её. until — момент остановки по часам."""
+        self._stopped = False
+        iterations = 0
+        while not self._stopped and self.jobs:
+            if max_iterations is not None and iterations >= max_iterations:
+                break
+            next_due = min(job.due for job in self.jobs)
+            if until is not None and next_due > until:
+                self.clock.sleep(until - self.clock.now())
+                break
+            self.clock.sleep(next_due - self.clock.now())
+            self.run_pending()
+            iterations += 1
+
+    def stats_lines(self):
+        return [f"{job.name}: {job.stats.line()}" for job in self.jobs]
@@ -1,7 +1,12 @@
 from abc import ABC, abstractmethod
-import MetaTrader5 as mt5 # игнорировать проверку типов
-from utils.risk import calculate_raw_lot, adjust_lot, max_affordable_lot
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
+from utils.risk import size_position
 from config.settings import RISK_PER_TRADE
+from core.indicator_engine import indicator_engine
+from core.market_state import market_state
 
 class StrategyBase(ABC):
     def __init__(self, symbol, lot, tp=50, sl=0):
@@ -21,30 +26,47 @@ class StrategyBase(ABC):
         """
         pass
 
+    def indicator(self, rates, name, **params):
+        """
+        Потоковый индикатор по символу и таймфрейму стратегии (см. core.indicator_engine).
+        Значения читаются как в pandas: ind[-1] — формирующийся бар, ind[-2] — предыдущий.
+        """
+        return indicator_engine.get(self.symbol, self.get_timeframe(), rates, name, **params)
+
+    @abstractmethod
+    def vector_signals(self, rates):
+        """
+        Сигналы по всей истории одним векторным проходом (для backtest): на закрытии бара i
+        entries[i] = +1 (buy) / -1 (sell) / 0 — как check_entry_signal(rates[:i + 1]),
+        exits[i] — как check_exit_signal(rates[:i + 1]).
+        """
+        pass
+
+    @abstractmethod
+    def universe_signals(self, rates, point):
+        """
+        Режим вселенной (core.universe): rates — бары всех символов стратегии одной матрицей
+        (символы × бары), point — пункт символов столбцом. Для последнего бара каждого символа —
+        сигнал +1 (buy) / -1 (sell) / 0, как check_entry_signal, и оценка силы сигнала для отбора лучших.
+        """
+        pass
+
+    def sizing(self, symbol_info, order_type, entry_price: float, sl_price: float, max_margin: float = None,
+               verify: bool = True):
+        """
+        Полный расчёт объёма (utils.risk.size_position): риск — фиксированный процент
+        от текущего баланса, далее шаг и лимиты брокера, свободная маржа и лимит маржи на сделку.
+        """
+        account = market_state.account()
+        # сумма риска на одну сделку
+        risk_amount = account.balance * RISK_PER_TRADE
+        return size_position(symbol_info, order_type, entry_price, sl_price, risk_amount,
+                             margin_free=account.margin_free, max_margin=max_margin, verify=verify)
+
     def calculate_lot(self, symbol_info, entry_price: float, sl_price: float) -> float:
         """
         Рассчитывает размер позиции на основе фиксированного процента риска от текущего баланса
         и расстояния между ценой входа и стоп-лоссом с помощью утилит управления риском.
         """
-        # получаем текущий баланс
-        balance = mt5.account_info().balance
-        # сумма риска на одну сделку
-        risk_amount = balance * RISK_PER_TRADE
-        # первоначальный лот на основе суммы риска и дистанции до SL
-        raw_lot = calculate_raw_lot(
-            risk_amount,
-            sl_price,
-            entry_price,
-            symbol_info.trade_contract_size,
-            symbol_info.point
-        )
-        # корректируем согласно ограничениям брокера
-        adjusted = adjust_lot(
-            raw_lot,
-            symbol_info.volume_step,
-            symbol_info.volume_min,
-            symbol_info.volume_max
-        )
-        # проверяем доступность лота по марже
-        lot = max_affordable_lot(symbol_info.name, adjusted, entry_price)
-        return lot
\ No newline at end of file
+        order_type = mt5.ORDER_TYPE_BUY if sl_price < entry_price else mt5.ORDER_TYPE_SELL
+        return self.sizing(symbol_info, order_type, entry_price, sl_price).lot
@@ -0,0 +1,201 @@
+"""
+Супервизор: пары (стратегия, символ) делятся на шарды по символу и исполняются
+в отдельных процессах-воркерах, каждый со своим подключением к терминалу.
+
+Упавший или зависший (без heartbeat) воркер перезапускается с нарастающей паузой.
+Глобальные ограничения (MAX_POSITIONS_PER_SYMBOL, STRATEGY_ALLOCATION) согласуются через
+core.coordination.SharedGuards в разделяемой памяти; DAILY_RISK_LIMIT каждый воркер проверяет
+по истории сделок терминала (core.risk_ledger) — она общая для всех процессов.
+"""
+import os
+import queue
+import time
+import multiprocessing
+from config.settings import (SUPERVISOR_WORKERS, WORKER_HEARTBEAT_SEC, WORKER_HEARTBEAT_TIMEOUT_SEC,
+                             WORKER_RESTART_BACKOFF_SEC, STATS_INTERVAL_SEC)
+from core.coordination import SharedGuards
+from utils.logger import file_logger
+
+_MAX_BACKOFF_SEC = 300
+_STABLE_RUN_SEC = 600     # воркер, проработавший столько, считается здоровым — пауза сбрасывается
+
+
+def shard_pairs(pairs, workers):
+    """Шарды по символу: все стратегии символа — в одном воркере; символы раскладываются по наименее загруженным."""
+    by_symbol = {}
+    for StrategyClass, symbol in pairs:
+        by_symbol.setdefault(symbol, []).append((StrategyClass, symbol))
+    shards = [[] for _ in range(max(min(workers, len(by_symbol)), 1))]
+    for group in sorted(by_symbol.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return shards
+
+
+def worker_main(worker_id, pairs, guards, status_queue, stop_event):
+    """Точка входа процесса-воркера: свой Bot на шард и heartbeat с нагрузкой супервизору."""
+    from core.mt5_wrapper import initialize_mt5, shutdown_mt5
+    from core.bot import Bot
+    from core.metrics import start_metrics
+    from core.profiling import ProfilingHooks
+    from core.risk_ledger import risk_ledger
+    from config.settings import RISK_LEDGER_PATH
+    from utils.logger import use_worker_files
+
+    # свои файлы лога: общий trading_bot.log ротирует только процесс супервизора
+    use_worker_files(worker_id)
+    if not initialize_mt5():
+        raise SystemExit(2)
+    # у каждого воркера свой курсор истории сделок
+    root, ext = os.path.splitext(RISK_LEDGER_PATH)
+    risk_ledger.open(f"{root}_worker{worker_id}{ext}")
+    start_metrics(worker_id)
+    hooks = ProfilingHooks(tag=f"worker{worker_id}")
+    hooks.install_signals()
+    bot = Bot(pairs, guards=guards, log_foreign=worker_id == 0, hooks=hooks)
+    scheduler = bot.build_scheduler()
+
+    def heartbeat():
+        if stop_event.is_set():
+            scheduler.stop()
+        status_queue.put((worker_id, os.getpid(), bot.load()))
+
+    scheduler.every(WORKER_HEARTBEAT_SEC, heartbeat, name="heartbeat")
+    try:
+        # безубыток и трейлинг — поток монитора позиций воркера, как в Bot.run
+        bot.start_monitor()
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hooks.shutdown()
+        bot.shutdown()
+        shutdown_mt5()
+
+
+class WorkerHandle:
+    def __init__(self, worker_id, pairs):
+        self.worker_id = worker_id
+        self.pairs = pairs
+        self.process = None
+        self.started = 0.0
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.backoff = WORKER_RESTART_BACKOFF_SEC
+        self.restart_at = None
+        self.load = None
+
+    @property
+    def symbols(self):
+        return list(dict.fromkeys(symbol for _, symbol in self.pairs))
+
+
+class Supervisor:
+    def __init__(self, pairs, workers=None, ctx=None):
+        # spawn — единственный вариант на Windows, где работает терминал MT5
+        self.ctx = ctx or multiprocessing.get_context("spawn")
+        workers = workers or SUPERVISOR_WORKERS or os.cpu_count() or 1
+        symbols = list(dict.fromkeys(symbol for _, symbol in pairs))
+        strategies = list(dict.fromkeys(StrategyClass.__name__ for StrategyClass, _ in pairs))
+        self.guards = SharedGuards(symbols, strategies, self.ctx)
+        self.status = self.ctx.Queue()
+        self.stop_event = self.ctx.Event()
+        self.workers = [WorkerHandle(i, shard) for i, shard in enumerate(shard_pairs(pairs, workers))]
+
+    def _start(self, worker):
+        worker.process = self.ctx.Process(
+            target=worker_main,
+            args=(worker.worker_id, worker.pairs, self.guards, self.status, self.stop_event),
+            name=f"worker-{worker.worker_id}",
+        )
+        worker.process.start()
+        worker.started = worker.last_seen = time.monotonic()
+        worker.restart_at = None
+        worker.load = None
+        print(f"\U0001F477 worker-{worker.worker_id} запущен (pid {worker.process.pid}): "
+              f"{len(worker.pairs)} пар, символы {', '.join(worker.symbols)}")
+
+    def _drain(self, timeout):
+        try:
+            item = self.status.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            worker_id, pid, load = item
+            worker = self.workers[worker_id]
+            if worker.process is not None and worker.process.pid == pid:
+                worker.last_seen = time.monotonic()
+                worker.load = load
+            try:
+                item = self.status.get_nowait()
+            except queue.Empty:
+                return
+
+    def _schedule_restart(self, worker, reason):
+        now = time.monotonic()
+        if now - worker.started >= _STABLE_RUN_SEC:
+            worker.backoff = WORKER_RESTART_BACKOFF_SEC
+        worker.restart_at = now + worker.backoff
+        file_logger.error(f"❌ worker-{worker.worker_id}: {reason}, перезапуск через {worker.backoff:.0f} сек")
+        print(f"❌ worker-{worker.worker_id}: {reason}, перезапуск через {worker.backoff:.0f} сек")
+        worker.backoff = min(worker.backoff * 2, _MAX_BACKOFF_SEC)
+        worker.process = None
+
+    def _check(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is None:
+                if worker.restart_at is not None and now >= worker.restart_at:
+                    worker.restarts += 1
+                    self._start(worker)
+                continue
+            if not worker.process.is_alive():
+                self._schedule_restart(worker, f"процесс завершился с кодом {worker.process.exitcode}")
+            elif now - worker.last_seen > WORKER_HEARTBEAT_TIMEOUT_SEC:
+                worker.process.terminate()
+                worker.process.join(5)
+                self._schedule_restart(worker, f"нет heartbeat {now - worker.last_seen:.0f} сек")
+
+    def report(self):
+        print(f"\n\U0001F4CA Нагрузка воркеров: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        for worker in self.workers:
+            pid = worker.process.pid if worker.process is not None else "-"
+            load = worker.load
+            if load is None:
+                print(f"\U0001F477 worker-{worker.worker_id} pid {pid}: {len(worker.pairs)} пар, "
+                      f"нет данных, перезапусков {worker.restarts}")
+                continue
+            print(f"\U0001F477 worker-{worker.worker_id} pid {pid}: {load['pairs']} пар / {load['symbols']} символов, "
+                  f"циклов {load['cycles']}, загрузка {load['load'] * 100:.0f}%, "
+                  f"последний цикл {load['last_cycle'] * 1000:.0f}ms, max {load['max_cycle'] * 1000:.0f}ms, "
+                  f"перезапусков {worker.restarts}")
+        # книга риска каждого воркера читает историю сделок всего счёта — берём самую свежую
+        fresh = max((worker for worker in self.workers if worker.load is not None),
+                    key=lambda worker: worker.last_seen, default=None)
+        if fresh is not None:
+            print(f"\U0001F4B0 Дневной реализованный PnL счёта (книга риска): {fresh.load['daily_pnl']:.2f}")
+
+    def run(self):
+        print(f"\U0001F9ED Супервизор: {len(self.workers)} воркеров, "
+              f"{sum(len(worker.pairs) for worker in self.workers)} пар")
+        for worker in self.workers:
+            self._start(worker)
+        next_report = time.monotonic() + STATS_INTERVAL_SEC
+        try:
+            while True:
+                self._drain(timeout=1.0)
+                self._check()
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report += STATS_INTERVAL_SEC
+        finally:
+            self.stop()
+
+    def stop(self, timeout=30):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(max(deadline - time.monotonic(), 0))
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                    worker.process.join(5)
@@ -1,16 +1,30 @@
-from utils.logger import file_logger
+from utils.logger import file_logger, get_logger
 import MetaTrader5 as mt5
-from core.mt5_interface import send_order, close_order
-from config.settings import STRATEGY_ALLOCATION
-import os
-import csv
-from datetime import datetime
-import pandas as pd
-from config.settings import ATR_SETTINGS, RISK_PER_TRADE, MIN_LOT, MAX_LOT
+from core.mt5_interface import close_order, order_request, send_request, stop_distances, tradable
+from core.order_plan import EntryPlan, TrendFilter, H4_SECONDS
+from core.bar_cache import bar_cache
+from core.indicator_engine import indicator_engine
+from core.market_state import market_state
+from core.position_book import position_book
+from core.risk_ledger import risk_ledger
+from core.journal import journal
+from core.metrics import metrics
+from core.scheduler import SystemClock
+from utils.risk import margin_cache
+from utils.helpers import timeframe_seconds
+from config.settings import STRATEGY_ALLOCATION, MAGIC_NUMBERS
+from config.settings import ATR_SETTINGS, RISK_PER_TRADE, MAX_MARGIN_PER_TRADE, SIZING_VERIFY_PLANNED_LOT
 from config.settings import BREAK_EVEN_ATR, TRAILING_ATR, TRAILING_STEP_ATR
 from config.settings import MAX_POSITIONS_PER_SYMBOL, DAILY_RISK_LIMIT, MAX_CONSECUTIVE_LOSSES, MIN_FREE_MARGIN_RATIO, MIN_ENTRY_INTERVAL_SEC
 from datetime import datetime, timedelta
+import logging
 import math
+import time
+
+# категории логов (LOG_LEVELS): цикл трейдера и проверка сигналов идут на каждом цикле —
+# сообщения в них с ленивым форматированием, повторяющиеся прореживаются по ключу sample
+log = get_logger("trader")
+signal_log = get_logger("signal")
 
 STRATEGY_ICONS = {
     "EMARSIVolumeStrategy": "🕰️",
@@ -23,238 +37,355 @@ def log_cycle_header():
     print(f"\n🔁 Новый цикл обработки: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 class Trader:
-    def __init__(self, symbol, strategy):
+    def __init__(self, symbol, strategy, guards=None, clock=None):
         self.symbol = symbol
         self.strategy = strategy
         self.strategy_name = self.strategy.__class__.__name__
-        self.log_path = f"logs/{self.strategy_name}_{self.symbol}.csv"
-        self._prepare_log()
-        # session risk tracking
-        self.daily_pnl = 0.0
-        self.consec_losses = 0
+        # дневной PnL и серии убытков — в книге риска (core.risk_ledger), общей для всех трейдеров
         self.last_entry_time = None
+        # общие для процессов ограничения (core.coordination.SharedGuards), None — только локальные
+        self.guards = guards
+        # часы (SystemClock; в реплее — время симуляции) и сдвиг времени сервера (Bot.build_scheduler)
+        self.clock = clock or SystemClock()
+        self.server_offset = 0
         # Initialize trailing/break-even state per position
         self._trailing_state = {}
+        # последний ATR стратегии по символу и признак, что безубыток и трейлинг ведёт монитор позиций
+        # (core.position_monitor) — тогда цикл сопровождения только обновляет ATR
+        self.atr = math.nan
+        self.monitored = False
+        # время этапов (core.metrics, trader_stage_seconds)
+        self._stages = metrics.stage_histograms(self.strategy_name, self.symbol)
+        self._order_elapsed = 0.0
+        self._signal_to_send = metrics.histogram("order_signal_to_send_seconds", strategy=self.strategy_name)
+        # план входа на текущий цикл и фильтр H4 на текущий бар H4 (core.order_plan)
+        self._plan = None
+        self._trend = None
+        # бары для общего прохода стратегии в режиме вселенной (prepare_entry), None — вход не проверяется
+        self.universe_rates = None
+        # сигнал, отобранный общим проходом для входа (enter_universe)
+        self.universe_signal = None
+        position_book.subscribe(self._on_position_event)
+
+    def _on_position_event(self, event):
+        # позиция закрыта (SL/TP, вручную или нами) — состояние трейлинга больше не нужно
+        if event.kind == "close" and event.strategy == self.strategy_name and event.symbol == self.symbol:
+            self._trailing_state.pop(event.ticket, None)
+
+    def _log_trade(self, action, side, price, lot, result, ticket=None, trace=None):
+        # запись в журнал сделок (core.journal) — в очередь, без ожидания диска
+        trace = trace or {}
+        request, response = trace.get("request"), trace.get("response")
+        if ticket is None and response is not None and result == "success":
+            # в режиме хеджирования тикет позиции совпадает с тикетом открывшего её ордера
+            ticket = response.order or None
+        journal.record(action, self.strategy_name, self.symbol, side=side, price=price, lot=lot, result=result,
+                       ticket=ticket, sl=request.get("sl") if request else None,
+                       tp=request.get("tp") if request else None,
+                       retcode=response.retcode if response is not None else None,
+                       request=request, response=response, time_=self.clock.now())
+
+    def log_exit_deal(self, deal):
+        """Выход из истории сделок (core.risk_ledger): закрытия по SL/TP, stop out и вручную."""
+        # свои закрытия (close_position) уже в журнале — с запросом и ответом order_send
+        if deal.reason == mt5.DEAL_REASON_EXPERT:
+            return
+        # сделка выхода противоположна позиции; время сделки — серверное, в журнале — по часам бота
+        side = "buy" if deal.type == mt5.DEAL_TYPE_SELL else "sell"
+        journal.record("exit", self.strategy_name, self.symbol, side=side, price=deal.price, lot=deal.volume,
+                       result="success", ticket=deal.position_id, response=deal,
+                       time_=deal.time_msc / 1000 - self.server_offset, source="history")
 
-    def _prepare_log(self):
-        os.makedirs("logs", exist_ok=True)
-        if not os.path.isfile(self.log_path):
-            with open(self.log_path, mode="w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(["timestamp", "action", "symbol", "price", "lot", "result"])
+    def _now(self):
+        return datetime.fromtimestamp(self.clock.now())
 
-    def _log_trade(self, action, price, lot, result):
-        with open(self.log_path, mode="a", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow([datetime.now().isoformat(), action, self.symbol, price, lot, result])
+    def _server_now(self):
+        return self.clock.now() + self.server_offset
+
+    def _closed_bars(self, rates):
+        """
+        Входы проверяются на закрытии бара: последний бар copy_rates_from_pos открыт секунды назад
+        (O≈H≈L≈C, объём ≈ 1) — его отбрасываем, сигнал и ATR считаются по закрытым барам, как в бэктесте.
+        Если новый бар ещё не появился (не было тиков), последний бар уже закрыт и остаётся.
+        """
+        if rates[-1]['time'] + timeframe_seconds(self.strategy.get_timeframe()) > self._server_now():
+            rates = rates[:-1]
+        return rates if len(rates) else None
 
     def run(self):
+        """Полный проход: сопровождение открытой позиции или проверка входа."""
+        if position_book.get(self.strategy_name, self.symbol):
+            self.manage()
+        else:
+            self.evaluate_entry()
+
+    def _prepare(self, emoji):
+        # общие проверки перед любым этапом: данные, режим торговли, спред
+        started = time.perf_counter()
+        try:
+            rates = self.strategy.get_rates()
+            if rates is None:
+                log.warning("%s %s — ⚠️ нет данных", emoji, self.symbol,
+                            extra={"sample": ("no_data", self.strategy_name, self.symbol)})
+                return None
+
+            symbol_info = market_state.symbol_info(self.symbol)
+            if not symbol_info or symbol_info.trade_mode != mt5.SYMBOL_TRADE_MODE_FULL:
+                log.info("%s %s — ⚠️ торговля запрещена", emoji, self.symbol,
+                         extra={"sample": ("trade_mode", self.strategy_name, self.symbol)})
+                return None
+
+            spread = symbol_info.ask - symbol_info.bid
+            if spread > symbol_info.point * 200:  # допустим максимум 20 пунктов для мажоров
+                log.info("%s %s — ⚠️ спред слишком высокий", emoji, self.symbol,
+                         extra={"sample": ("spread", self.strategy_name, self.symbol)})
+                return None
+            return rates
+        finally:
+            self._stages["data"].observe(time.perf_counter() - started)
+
+    def manage(self):
+        """Сопровождение открытой позиции: безубыток, трейлинг, сигнал выхода."""
+        current_position = position_book.get(self.strategy_name, self.symbol)
+        if not current_position:
+            return
         emoji = STRATEGY_ICONS.get(self.strategy_name, "📈")
-
-        rates = self.strategy.get_rates()
-        if rates is None:
-            print(f"{emoji} {self.symbol} — ⚠️ нет данных")
+        if self._prepare(emoji) is None:
             return
+        log.debug("%s %s — 🟢 позиция открыта", emoji, self.symbol)
+        self.check_and_close_position(current_position)
 
-        symbol_info = mt5.symbol_info(self.symbol)
-        if not symbol_info or symbol_info.trade_mode != mt5.SYMBOL_TRADE_MODE_FULL:
-            print(f"{emoji} {self.symbol} — ⚠️ торговля запрещена")
+    def evaluate_entry(self):
+        """Проверка сигнала входа, если у стратегии нет позиции по символу."""
+        if position_book.get(self.strategy_name, self.symbol):
             return
-
-        spread = symbol_info.ask - symbol_info.bid
-        if spread > symbol_info.point * 200:  # допустим максимум 20 пунктов для мажоров
-            print(f"{emoji} {self.symbol} — ⚠️ спред слишком высокий")
+        emoji = STRATEGY_ICONS.get(self.strategy_name, "📈")
+        rates = self._prepare(emoji)
+        if rates is None:
+            return
+        rates = self._closed_bars(rates)
+        if rates is None:
             return
 
-        positions = mt5.positions_get(symbol=self.symbol)
-        current_position = None
-        if positions:
-            for pos in positions:
-                if self.strategy_name in pos.comment:
-                    current_position = pos
-                    break
-
-        if current_position:
-            print(f"{emoji} {self.symbol} — 🟢 позиция открыта")
-            self.check_and_close_position(current_position)
-        else:
-            # Debug: log strategy entry check details
-            file_logger.info(f"{self.symbol}: проверка входного сигнала ({self.strategy_name}) на {len(rates)} баров, последний close={rates[-1]['close']}")
-            print(f"DEBUG {self.symbol}: running check_entry_signal for last close={rates[-1]['close']}")
-            # Print last 5 bars for debugging
-            last_bars = rates[-5:]
-            print(f"DEBUG {self.symbol}: последние 5 баров (time, close): " +
-                  ", ".join(f"({datetime.fromtimestamp(b['time']).strftime('%H:%M')}, {b['close']:.5f})" for b in last_bars))
+        # подробности проверки — только при DEBUG: строка с последними барами дорогая
+        if signal_log.isEnabledFor(logging.DEBUG):
+            signal_log.debug("%s: проверка входного сигнала (%s) на %d баров, последние 5 (time, close): %s",
+                             self.symbol, self.strategy_name, len(rates),
+                             ", ".join(f"({datetime.fromtimestamp(b['time']).strftime('%H:%M')}, {b['close']:.5f})"
+                                       for b in rates[-5:]))
+        # план входа — до сигнала: после сигнала остаются только тик и order_send
+        with self._stages["plan"].time():
+            self._plan = self._plan_entry(rates)
+        with self._stages["signal"].time():
             signal = self.strategy.check_entry_signal(rates)
-            file_logger.info(f"{self.symbol}: check_entry_signal returned '{signal}'")
-            print(f"DEBUG {self.symbol}: сигнал входа = {signal}")
-            if signal:
-                print(f"{emoji} {self.symbol} — ✅ {signal.upper()}")
-                self._try_open_order(signal, rates)
-            else:
-                print(f"{emoji} {self.symbol} — ❌ ⛔")
+        if signal:
+            self._open_signal(signal, rates, emoji)
+        else:
+            signal_log.info("%s %s — ❌ ⛔", emoji, self.symbol,
+                            extra={"sample": ("no_signal", self.strategy_name, self.symbol)})
+
+    def prepare_entry(self):
+        """Режим вселенной (core.universe): только бары для общего прохода стратегии, без проверки сигнала."""
+        self.universe_rates = None
+        if position_book.get(self.strategy_name, self.symbol):
+            return
+        rates = self._prepare(STRATEGY_ICONS.get(self.strategy_name, "📈"))
+        if rates is not None:
+            self.universe_rates = self._closed_bars(rates)
+
+    def enter(self, signal, rates):
+        """Вход по сигналу, отобранному общим проходом вселенной: план входа, затем быстрый путь."""
+        with self._stages["plan"].time():
+            self._plan = self._plan_entry(rates)
+        self._open_signal(signal, rates, STRATEGY_ICONS.get(self.strategy_name, "📈"))
+
+    def enter_universe(self):
+        """Этап исполнителя для отобранных вселенной: вход по universe_signal на барах prepare_entry."""
+        signal, self.universe_signal = self.universe_signal, None
+        if signal is not None and self.universe_rates is not None:
+            self.enter(signal, self.universe_rates)
+
+    def _open_signal(self, signal, rates, emoji):
+        signal_at = time.perf_counter()
+        # этап risk — путь от сигнала до ордера, без времени самого order_send
+        self._order_elapsed = 0.0
+        self._try_open_order(signal, rates, signal_at)
+        self._stages["risk"].observe(time.perf_counter() - signal_at - self._order_elapsed)
+        signal_log.info("%s %s — ✅ %s", emoji, self.symbol, signal.upper(),
+                        extra={"symbol": self.symbol, "strategy": self.strategy_name, "signal": signal})
+
+    def _plan_entry(self, rates):
+        """План входа до проверки сигнала (core.order_plan): всё, что не зависит от финального тика."""
+        plan = EntryPlan(int(rates[-1]['time']), market_state.cycle_id)
 
-    def _try_open_order(self, signal, rates):
         # Entry interval guard
-        now = datetime.now()
+        now = self._now()
         if self.last_entry_time and (now - self.last_entry_time).total_seconds() < MIN_ENTRY_INTERVAL_SEC:
-            print(f"⚠️ {self.symbol}: слишком частые входы, жди {MIN_ENTRY_INTERVAL_SEC} сек")
-            return
+            return plan.block(f"⚠️ {self.symbol}: слишком частые входы, жди {MIN_ENTRY_INTERVAL_SEC} сек")
 
-        account = mt5.account_info()
+        account = market_state.account()
         full_equity = account.equity if account else 40000
         allocation = STRATEGY_ALLOCATION.get(self.strategy_name, 1.0)  # например, 0.2 для 20%
-        allocated_equity = full_equity * allocation
-        file_logger.info(
-            f"Стратегия {self.strategy_name}: {self.symbol}: total_equity={full_equity:.2f}, allocation={allocation*100:.0f}%, "
-            f"allocated_equity={allocated_equity:.2f}"
-        )
+        plan.allocated_equity = allocated_equity = full_equity * allocation
+        plan.risk_amount = allocated_equity * RISK_PER_TRADE
 
         # до того, как мы рассчитываем лот
         if account and account.margin_free < allocated_equity * MIN_FREE_MARGIN_RATIO:
-            file_logger.warning(
+            return plan.block(
                 f"{self.symbol}: свободная маржа ({account.margin_free:.2f}) "
-                f"< {MIN_FREE_MARGIN_RATIO*100:.0f}% выделенного капитала ({allocated_equity:.2f}), входы приостановлены")
-            return
+                f"< {MIN_FREE_MARGIN_RATIO*100:.0f}% выделенного капитала ({allocated_equity:.2f}), входы приостановлены",
+                warn=True)
 
         # Max positions per symbol guard
-        positions = mt5.positions_get(symbol=self.symbol) or []
+        positions = position_book.for_symbol(self.symbol)
         if len(positions) >= MAX_POSITIONS_PER_SYMBOL:
-            print(f"⚠️ {self.symbol}: уже открыто {len(positions)} позиций, максимум {MAX_POSITIONS_PER_SYMBOL}")
-            return
-
-        # Daily loss guard
-        if account and self.daily_pnl < -DAILY_RISK_LIMIT * account.balance:
-            print(f"⚠️ {self.symbol}: дневной убыток превысил {DAILY_RISK_LIMIT*100:.0f}% депо")
-            return
-
-        # Consecutive losses guard
-        if self.consec_losses >= MAX_CONSECUTIVE_LOSSES:
-            print(f"⚠️ {self.symbol}: подряд {self.consec_losses} убыточных сделок, входы заблокированы")
-            return
-
-        # Multi-TF filter: require H4 trend alignment
-        rates_h4 = mt5.copy_rates_from(self.symbol, mt5.TIMEFRAME_H4, datetime.now(), 100)
-        if rates_h4 is not None and len(rates_h4) > 0:
-    
-            df_h4 = pd.DataFrame(rates_h4)
-            sma_short = df_h4['close'].rolling(window=10).mean().iloc[-1]
-            sma_long = df_h4['close'].rolling(window=50).mean().iloc[-1]
-            if (signal == 'buy' and sma_short < sma_long) or (signal == 'sell' and sma_short > sma_long):
-                file_logger.info(f"{self.symbol}: H4 trend mismatch (sma10={sma_short:.5f}, sma50={sma_long:.5f}), вход {signal} отменён")
-                return
+            return plan.block(f"⚠️ {self.symbol}: уже открыто {len(positions)} позиций, максимум {MAX_POSITIONS_PER_SYMBOL}")
+
+        # Daily loss guard: реализованный PnL счёта по истории сделок — общий для всех процессов
+        daily_pnl = risk_ledger.daily_pnl()
+        if account and daily_pnl < -DAILY_RISK_LIMIT * account.balance:
+            return plan.block(f"⚠️ {self.symbol}: дневной убыток превысил {DAILY_RISK_LIMIT*100:.0f}% депо")
+
+        # Consecutive losses guard: убыточные выходы пары подряд за день
+        consec_losses = risk_ledger.loss_streak(self.strategy_name, self.symbol)
+        if consec_losses >= MAX_CONSECUTIVE_LOSSES:
+            return plan.block(f"⚠️ {self.symbol}: подряд {consec_losses} убыточных сделок, входы заблокированы")
+
+        symbol_info = market_state.symbol_info(self.symbol)
+        if symbol_info is None:
+            return plan.block(f"❌ Символ {self.symbol} не найден", warn=True)
+        refused = tradable(self.symbol, symbol_info)
+        if refused:
+            return plan.block(refused, warn=True)
+
+        # Multi-TF filter: суммы закрытых H4-баров — раз на бар H4, формирующийся бар — по цене тика при входе
+        # (бар H4 — по времени сервера: последний бар стратегии уже закрыт и может быть из прошлого H4)
+        server_now = int(self._server_now())
+        if self._trend is None or self._trend.bar_time != server_now - server_now % H4_SECONDS:
+            rates_h4 = bar_cache.get_rates(self.symbol, mt5.TIMEFRAME_H4, 100)
+            self._trend = TrendFilter.from_rates(rates_h4, server_now) if rates_h4 is not None and len(rates_h4) else None
+        plan.trend = self._trend
 
         # динамический расчет SL/TP на основе ATR (настройки для каждой стратегии)
-        df_atr = pd.DataFrame(rates)
-        df_atr['prev_close'] = df_atr['close'].shift(1)
-        df_atr['hl'] = df_atr['high'] - df_atr['low']
-        df_atr['hc'] = (df_atr['high'] - df_atr['prev_close']).abs()
-        df_atr['lc'] = (df_atr['low'] - df_atr['prev_close']).abs()
-        df_atr['tr'] = df_atr[['hl', 'hc', 'lc']].max(axis=1)
-        df_atr.drop(columns=['prev_close','hl','hc','lc'], inplace=True)
         strategy_atr = ATR_SETTINGS.get(self.strategy_name, {})
         period = strategy_atr.get('period', 14)
-        sl_multiplier = strategy_atr.get('sl_multiplier', 1.5)
-        tp_multiplier = strategy_atr.get('tp_multiplier', 3.0)
-        atr = df_atr['tr'].rolling(window=period).mean().iloc[-1]
-
-        symbol_info = mt5.symbol_info(self.symbol)
+        plan.atr = atr = self._compute_atr(rates, period)
+        if not atr > 0:
+            # мало баров для ATR (NaN) — стоп не рассчитать
+            return plan.block(f"⚠️ {self.symbol}: ATR({period}) ещё не рассчитан")
         point = symbol_info.point
-
-        # SL/TP в пунктах (расчёт через ATR)
-        sl_points = (sl_multiplier * atr) / point
-        tp_points = (tp_multiplier * atr) / point
-        print(f"ATR={atr:.5f}, SL_pts={sl_points:.2f}, TP_pts={tp_points:.2f}")
-
-        tick = mt5.symbol_info_tick(self.symbol)
-        if tick is None:
-            print(f"❌ {self.symbol}: ошибка тика")
+        # SL/TP в пунктах (расчёт через ATR) и расстояния от цены с нормализацией как в send_order
+        plan.sl_points = strategy_atr.get('sl_multiplier', 1.5) * atr / point
+        plan.tp_points = strategy_atr.get('tp_multiplier', 3.0) * atr / point
+        plan.sl_distance, plan.tp_distance, _ = stop_distances(symbol_info, plan.sl_points, plan.tp_points)
+
+        # лот для обеих сторон по цене снимка: риск от расстояния SL от цены не зависит,
+        # маржа на 1 лот — из кэша с порогом SIZING_REPRICE_THRESHOLD
+        # Hard cap: max MAX_MARGIN_PER_TRADE of allocated equity used for margin per trade
+        sl_offset = plan.sl_points * point
+        for signal, order_type, price in (("buy", mt5.ORDER_TYPE_BUY, symbol_info.ask),
+                                          ("sell", mt5.ORDER_TYPE_SELL, symbol_info.bid)):
+            sl_price = price - sl_offset if signal == 'buy' else price + sl_offset
+            plan.sides[signal] = (order_type, self.strategy.sizing(
+                symbol_info, order_type, price, sl_price, max_margin=allocated_equity * MAX_MARGIN_PER_TRADE,
+                verify=SIZING_VERIFY_PLANNED_LOT))
+        return plan
+
+    def _try_open_order(self, signal, rates, signal_at=None):
+        """Быстрый путь: план готов до сигнала, после него — свежий тик, фильтр H4 по цене тика и order_send."""
+        signal_at = signal_at or time.perf_counter()
+        plan = self._plan
+        if plan is None or not plan.fresh(rates, market_state.cycle_id):
+            plan = self._plan = self._plan_entry(rates)
+        if plan.blocked:
+            if plan.warn:
+                file_logger.warning(plan.blocked)
+            else:
+                print(plan.blocked)
             return
 
-        price = tick.ask if signal == 'buy' else tick.bid
-        # рассчитываем цену стоп-лосса в валютных единицах
-        sl_price = price - sl_points * point if signal == 'buy' else price + sl_points * point
-        account_info = mt5.account_info()
-        full_equity = account_info.equity if account_info else 40000
-        allocation = STRATEGY_ALLOCATION.get(self.strategy_name, 1.0)
-        allocated_equity = full_equity * allocation
-        # Calculate risk amount based on configured percentage of allocated equity
-        risk_amount = allocated_equity * RISK_PER_TRADE
-        file_logger.info(f"{self.symbol}: equity full={full_equity:.2f}, allocation={allocation*100:.0f}%, allocated={allocated_equity:.2f}, risk_amount={risk_amount:.2f}")
-        
-        symbol_info = mt5.symbol_info(self.symbol)
-
-        # Determine lot size from risk amount and stop-loss
-        file_logger.info(
-            f"Стратегия {self.strategy_name}: рассчитываю lot на основе price={price:.5f}, "
-            f"sl_price={sl_price:.5f}, risk_amount={risk_amount:.2f}"
-        )
-        raw_lot = self.strategy.calculate_lot(symbol_info, price, sl_price)
-        file_logger.info(f"Стратегия {self.strategy_name}: raw_lot={raw_lot:.2f}")
-        lot = max(MIN_LOT, min(raw_lot, MAX_LOT))
-        file_logger.info(f"Стратегия {self.strategy_name}: lot после clamp [{MIN_LOT}, {MAX_LOT}] = {lot:.2f}")
-
-        # Hard cap: max 10% of allocated equity used for margin per trade
-        max_margin_per_trade = allocated_equity * 0.10
-        volume_step = symbol_info.volume_step
-
-        # Estimate margin required for 1.0 lot
-        margin_for_one_lot = mt5.order_calc_margin(
-            mt5.ORDER_TYPE_BUY if signal == 'buy' else mt5.ORDER_TYPE_SELL,
-            self.symbol, 1.0, price
-        )
-        if margin_for_one_lot is None:
+        order_type, sizing = plan.sides[signal]
+        if sizing.margin_per_lot is None:
             file_logger.error(f"{self.symbol}: не удалось рассчитать маржу для 1.0 лота")
             return
-        # Compute maximum allowed lot under margin cap
-        allowed_lot = max_margin_per_trade / margin_for_one_lot
-        # Convert to steps
-        max_steps = math.floor(allowed_lot / volume_step)
-        if max_steps <= 0:
-            print(f"⚠️ {self.symbol}: недостаточно маржи для минимального лота после ограничения маржи")
+        lot = sizing.lot
+        if lot <= 0:
+            print(f"⚠️ {self.symbol}: недостаточно маржи для минимального лота ({sizing.reason})")
             return
-        max_lot_by_margin = max_steps * volume_step
-        # Final lot is limited by both raw calculation and margin cap
-        lot = min(lot, max_lot_by_margin, MAX_LOT)
-        file_logger.info(
-            f"{self.symbol}: lot capped by margin cap to {lot:.2f} "
-            f"(max allowed by margin: {max_lot_by_margin:.2f})"
-        )
 
-        print(f"🔎 {self.symbol}: риск={risk_amount:.2f}, SL={sl_points:.2f}, лот={lot}")
+        # цена входа — только по свежему тику
+        tick = market_state.tick(self.symbol, fresh=True)
+        if tick is None:
+            print(f"❌ {self.symbol}: ошибка тика")
+            return
+        price = tick.ask if signal == 'buy' else tick.bid
 
-        if lot <= 0:
-            print(f"⚠️ {self.symbol}: Лот некорректен")
+        # бары строятся по bid — он и есть close формирующегося H4-бара
+        if plan.trend is not None and not plan.trend.allows(signal, tick.bid):
+            sma_short, sma_long = plan.trend.smas(tick.bid)
+            file_logger.info(f"{self.symbol}: H4 trend mismatch (sma10={sma_short:.5f}, sma50={sma_long:.5f}), вход {signal} отменён")
             return
 
-        print(f"📤 {self.symbol}: открытие {signal.upper()} @ {price:.5f}, лот {lot}")
+        # резерв в общих ограничениях: другие процессы не откроют тот же символ параллельно
+        margin = sizing.margin_per_lot * lot
+        if self.guards:
+            refused = self.guards.reserve(self.symbol, self.strategy_name, margin, plan.allocated_equity, self._exposure)
+            if refused:
+                print(f"⚠️ {self.symbol}: вход отклонён общими ограничениями: {refused}")
+                return
 
-        result = send_order(
-            self.symbol,
-            lot,
-            mt5.ORDER_TYPE_BUY if signal == 'buy' else mt5.ORDER_TYPE_SELL,
-            price,
-            sl_points=sl_points,
-            tp_points=tp_points,
-            comment=f"{self.strategy_name}_entry"
+        request = order_request(self.symbol, lot, order_type, price, plan.sl_distance, plan.tp_distance,
+                                comment=f"{self.strategy_name}_entry", magic=MAGIC_NUMBERS.get(self.strategy_name, 0))
+        trace = {}
+        sent_at = time.perf_counter()
+        try:
+            result = send_request(request, trace)
+        finally:
+            self._order_elapsed = time.perf_counter() - sent_at
+            self._stages["order"].observe(self._order_elapsed)
+            if self.guards:
+                self.guards.release(self.symbol, self.strategy_name, margin)
+
+        # всё, что не нужно для отправки, — уже после неё
+        latency = sent_at - signal_at
+        self._signal_to_send.observe(latency)
+        log.info("⚡ %s %s: сигнал → order_send %.2f мс, order_send %.1f мс", self.symbol, signal.upper(),
+                 latency * 1000, self._order_elapsed * 1000,
+                 extra={"symbol": self.symbol, "strategy": self.strategy_name, "signal_to_send_ms": latency * 1000,
+                        "order_send_ms": self._order_elapsed * 1000})
+        file_logger.info(
+            f"Стратегия {self.strategy_name}: {self.symbol}: allocated_equity={plan.allocated_equity:.2f}, "
+            f"risk_amount={plan.risk_amount:.2f}, ATR={plan.atr:.5f}, SL_pts={plan.sl_points:.2f}, "
+            f"TP_pts={plan.tp_points:.2f}, price={price:.5f}, lot={lot:.2f} ({sizing.reason}), "
+            f"risk_lot={sizing.risk_lot:.2f}, free_margin_lot={sizing.affordable_lot:.2f}, "
+            f"margin_cap_lot={sizing.margin_cap_lot}, broker=[{sizing.volume_min}, {sizing.volume_max}] "
+            f"step {sizing.volume_step}, margin/lot={sizing.margin_per_lot:.2f}"
         )
 
         if result:
-            print(f"✅ {self.symbol}: {signal.upper()} открыто (lot {lot})")
-            self._log_trade("entry", price, lot, "success")
-            self.last_entry_time = now
+            position_book.invalidate()
+            # монитор позиций ведёт новую позицию с ATR плана, до первого цикла сопровождения
+            self.atr = plan.atr
+            print(f"✅ {self.symbol}: {signal.upper()} открыто @ {price:.5f} (lot {lot})")
+            self._log_trade("entry", signal, price, lot, "success", trace=trace)
+            self.last_entry_time = self._now()
         else:
             print(f"⚠️ {self.symbol}: ошибка открытия ({signal.upper()})")
-            self._log_trade("entry", price, lot, "fail")
+            self._log_trade("entry", signal, price, lot, "fail", trace=trace)
+
+    def _exposure(self):
+        """Позиции по символу и маржа позиций стратегии по свежему positions_get (для SharedGuards)."""
+        position_book.refresh()
+        strategy_margin = 0.0
+        for pos in position_book.for_strategy(self.strategy_name):
+            # маржа оценивается по цене открытия — для лимита распределения этого достаточно
+            per_lot = margin_cache.margin_per_lot(pos.symbol, pos.type, pos.price_open)
+            strategy_margin += (per_lot or 0.0) * pos.volume
+        return len(position_book.for_symbol(self.symbol)), strategy_margin
 
     def _compute_atr(self, rates, period):
-        df = pd.DataFrame(rates)
-        df['prev_close'] = df['close'].shift(1)
-        df['hl'] = df['high'] - df['low']
-        df['hc'] = (df['high'] - df['prev_close']).abs()
-        df['lc'] = (df['low'] - df['prev_close']).abs()
-        df['tr'] = df[['hl', 'hc', 'lc']].max(axis=1)
-        return df['tr'].rolling(window=period).mean().iloc[-1]
+        # потоковый ATR по таймфрейму стратегии: закрытые бары учтены, пересчитывается только текущий
+        return indicator_engine.get(self.symbol, self.strategy.get_timeframe(), rates, "atr", period=period)[-1]
 
     def _manage_trailing(self, position, atr):
         """
@@ -263,8 +394,8 @@ class Trader:
         enforcing minimal stop distance and treating CODE 10025 (NO_CHANGES) as success.
         """
         # Retrieve symbol parameters and current market tick
-        symbol_info = mt5.symbol_info(self.symbol)
-        tick = mt5.symbol_info_tick(self.symbol)
+        symbol_info = market_state.symbol_info(self.symbol)
+        tick = market_state.tick(self.symbol)
         if not symbol_info or not tick:
             return
 
@@ -307,15 +438,16 @@ class Trader:
                     file_logger.error(f"❌ Ошибка модификации SL/TP #{ticket}: {res.retcode}")
                 state["be"] = True
                 file_logger.info(f"{self.symbol}: BE SL → {be_price:.5f}, PROFIT={profit:.5f}")
-                file_logger.info(f"{self.symbol}: TRAIL SL → {trail_price:.5f}")
 
         # Trailing stop logic
         trail_mult = TRAILING_ATR.get(self.strategy_name, TRAILING_ATR)
         step_mult = TRAILING_STEP_ATR.get(self.strategy_name, TRAILING_STEP_ATR)
         base_dist = (trail_mult - step_mult) * atr
-        trail_price = price_for_sl + base_dist if is_buy else price_for_sl - base_dist
+        # стоп тянется за ценой: у buy — ниже bid, у sell — выше ask, и только в сторону прибыли
+        trail_price = price_for_sl - base_dist if is_buy else price_for_sl + base_dist
+        tightens = not position.sl or (trail_price > position.sl if is_buy else trail_price < position.sl)
 
-        if state["be"]:
+        if state["be"] and tightens:
             # Ensure trailing SL respects minimal distance and has changed since last trail
             if abs(trail_price - price_for_sl) >= min_dist and \
                (state["last_trail"] is None or abs(trail_price - state["last_trail"]) >= point):
@@ -334,7 +466,6 @@ class Trader:
                 else:
                     file_logger.error(f"❌ Ошибка модификации SL/TP #{ticket}: {res.retcode}")
                 state["last_trail"] = trail_price
-                file_logger.info(f"{self.symbol}: BE SL → {be_price:.5f}, PROFIT={profit:.5f}")
                 file_logger.info(f"{self.symbol}: TRAIL SL → {trail_price:.5f}")
 
 
@@ -345,23 +476,29 @@ class Trader:
             return
 
         # compute ATR and apply break-even/trailing logic
-        atr = self._compute_atr(self.strategy.get_rates(), ATR_SETTINGS[self.strategy_name]['period'])
-        self._manage_trailing(position, atr)
-
-        if self.strategy.check_exit_signal(rates):
+        with self._stages["indicators"].time():
+            self.atr = atr = self._compute_atr(rates, ATR_SETTINGS[self.strategy_name]['period'])
+        if not self.monitored:
+            with self._stages["trailing"].time():
+                self._manage_trailing(position, atr)
+
+        with self._stages["exit"].time():
+            exit_signal = self.strategy.check_exit_signal(rates)
+        if exit_signal:
             self.close_position(position)
 
     def close_position(self, position):
-        price = mt5.symbol_info_tick(self.symbol)
-        if price is None:
-            file_logger.error(f"❌ Ошибка тика для закрытия {self.symbol}")
-            return
-
-        current_price = price.ask if position.type == mt5.ORDER_TYPE_BUY else price.bid
-        result = close_order(position)
+        side = "buy" if position.type == mt5.ORDER_TYPE_BUY else "sell"
+        trace = {}
+        with self._stages["order"].time():
+            result = close_order(position, trace=trace)
+        # цена — исполнения из ответа order_send, без неё — цена запроса (закрытие по свежему тику)
+        request, response = trace.get("request"), trace.get("response")
+        price = response.price if result and response.price else (request["price"] if request else None)
         if result:
+            position_book.invalidate()
             print(f"✅ {self.symbol}: позиция закрыта")
-            self._log_trade("exit", current_price, position.volume, "success")
+            self._log_trade("exit", side, price, position.volume, "success", position.ticket, trace)
         else:
             print(f"❌ {self.symbol}: ошибка закрытия")
-            self._log_trade("exit", current_price, position.volume, "fail")
+            self._log_trade("exit", side, price, position.volume, "fail", position.ticket, trace)
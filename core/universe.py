@@ -0,0 +1,91 @@
+"""
+Режим вселенной: проверка входа стратегии сразу по всем символам одним векторным проходом.
+
+Вместо check_entry_signal на каждого трейдера: трейдеры без позиции готовят бары
+(Trader.prepare_entry — в пуле исполнителя, как обычный этап), бары одной стратегии
+складываются в матрицу символы × бары (строки одной длины, выровнены по последнему бару),
+и StrategyBase.universe_signals считает индикаторы и сигнал последнего бара для всех
+символов на ядрах utils.indicators. Кандидаты ранжируются по оценке силы сигнала
+стратегии (ADX, отклонение от VWAP, расхождение CCI, всплеск объёма), и только лучшие
+UNIVERSE_TOP_K на стратегию идут во вход (Trader.enter_universe — план входа и быстрый путь
+ордера) через тот же исполнитель, что и остальные этапы: в режиме "threads" — шардами по символу.
+
+Параметры стратегии берутся у первого трейдера группы: все экземпляры класса создаются
+с одинаковыми параметрами. EMA в проходе затравливается на окне get_rates, а не
+накапливается между циклами, как в потоковом движке, — на длинных окнах разница мала.
+"""
+import time
+import numpy as np
+from config.settings import UNIVERSE_TOP_K
+from core.market_state import market_state
+from core.metrics import metrics
+from utils.logger import get_logger
+
+signal_log = get_logger("signal")
+
+
+class UniverseScan:
+    def __init__(self, top_k=UNIVERSE_TOP_K):
+        self.top_k = top_k
+        # счётчики
+        self.passes = 0
+        self.symbols = 0
+        self.candidates = 0
+        self.taken = 0
+
+    def _points(self, traders):
+        points = []
+        for trader in traders:
+            info = market_state.symbol_info(trader.symbol)
+            points.append(info.point if info else np.nan)
+        return np.array(points)[:, None]
+
+    def candidates_for(self, traders):
+        """Сигналы группы трейдеров одной стратегии: [(оценка, трейдер, "buy"/"sell")] по убыванию оценки."""
+        by_length = {}
+        for trader in traders:
+            if trader.universe_rates is not None:
+                by_length.setdefault(len(trader.universe_rates), []).append(trader)
+        found = []
+        for rows in by_length.values():
+            rates = np.stack([trader.universe_rates for trader in rows])
+            started = time.perf_counter()
+            entries, score = rows[0].strategy.universe_signals(rates, self._points(rows))
+            metrics.observe("universe_pass_seconds", time.perf_counter() - started,
+                            strategy=rows[0].strategy_name)
+            self.symbols += len(rows)
+            # без оценки (nan) — в конце очереди
+            score = np.where(np.isnan(score), -np.inf, score)
+            for i in np.flatnonzero(entries):
+                found.append((float(score[i]), rows[i], "buy" if entries[i] > 0 else "sell"))
+        found.sort(key=lambda item: item[0], reverse=True)
+        return found
+
+    def run(self, traders, executor=None):
+        """Общий проход по стратегиям группы и вход лучших кандидатов. Число переданных во вход."""
+        by_strategy = {}
+        for trader in traders:
+            by_strategy.setdefault(trader.strategy_name, []).append(trader)
+        entering = []
+        for name, group in by_strategy.items():
+            self.passes += 1
+            found = self.candidates_for(group)
+            chosen = found[:self.top_k] if self.top_k else found
+            self.candidates += len(found)
+            self.taken += len(chosen)
+            signal_log.info("🌐 %s: символов %d, сигналов %d, к входу %d", name,
+                            sum(trader.universe_rates is not None for trader in group), len(found), len(chosen))
+            for score, trader, signal in chosen:
+                trader.universe_signal = signal
+                entering.append(trader)
+        # по убыванию силы сигнала внутри стратегии; без исполнителя — последовательно
+        if executor is not None:
+            executor.run(entering, "enter_universe")
+        else:
+            for trader in entering:
+                trader.enter_universe()
+        return len(entering)
+
+    def stats_line(self):
+        return (f"проходов={self.passes}, символов={self.symbols}, сигналов={self.candidates}, "
+                f"к входу={self.taken}")
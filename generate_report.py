@@ -1,67 +1,77 @@
+"""
+Сводный отчёт по журналу сделок.
+
+    python generate_report.py [--by strategy symbol] [--from 2024-01-01] [--to 2024-02-01]
+                              [--csv reports/summary.csv] [--html reports/summary.html] [--rebuild] [--db logs/journal.db]
+
+Перед выводом отчёт дочитывает из журнала только новые строки (report.engine),
+полный пересчёт — --rebuild.
+"""
+import argparse
 import os
-import csv
-from collections import defaultdict
+import time
 from datetime import datetime
-from glob import glob
+import pandas as pd
+from config.settings import JOURNAL_PATH
+from report.engine import ReportEngine, summarize, total
 
+TITLES = {
+    "strategy": "Стратегия", "symbol": "Символ", "trades": "Сделок", "pnl": "PnL", "win_rate": "Прибыльных",
+    "avg_win": "Ср. прибыль", "avg_loss": "Ср. убыток", "expectancy": "Матожидание",
+    "profit_factor": "PF", "max_drawdown": "Макс. просадка",
+}
 
-def generate_summary_report(logs_folder="logs"):
-    summary = defaultdict(lambda: {
-        "entry": 0,
-        "exit": 0,
-        "profit_trades": 0,
-        "fail_trades": 0,
-        "profit": 0.0
-    })
 
-    for filepath in glob(os.path.join(logs_folder, "*.csv")):
-        strategy_name = os.path.basename(filepath).replace(".csv", "")
+def generate_summary_report(journal_path=JOURNAL_PATH, by=("strategy",), start=None, end=None,
+                            csv_path=None, html_path=None, rebuild=False):
+    started = time.perf_counter()
+    engine = ReportEngine(journal_path)
+    rows, new_trades = engine.rebuild() if rebuild else engine.update()
+    trades = engine.trades(start, end)
+    summary = pd.concat([summarize(trades, by), total(trades).rename(columns={"strategy": by[0]})],
+                        ignore_index=True)
+    table = summary.rename(columns=TITLES)
 
-        deals = []
+    # Вывод отчёта
+    print(f"\n📊 Стратегии — сводный отчёт ({len(trades)} сделок, новых строк журнала {rows}, "
+          f"новых сделок {new_trades}):\n")
+    print(table.to_string(index=False, na_rep="-", float_format=lambda value: f"{value:.2f}",
+                          formatters={TITLES["win_rate"]: "{:.0%}".format}))
+    opened = engine.open_positions()
+    if len(opened):
+        print(f"\n🟢 Входов без выхода в журнале: {len(opened)}")
 
-        with open(filepath, newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                action = row.get('action')
-                symbol = row.get('symbol')
-                price = float(row.get('price', 0))
-                lot = float(row.get('lot', 0))
-                side = row.get('side', 'buy')
-                result = row.get('result')
+    for path, write in ((csv_path, lambda path: summary.to_csv(path, index=False)),
+                        (html_path, lambda path: _write_html(path, table, len(trades)))):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            write(path)
+            print(f"💾 {path}")
+    print(f"⏱ {time.perf_counter() - started:.2f} сек")
+    return summary
 
-                if action == 'entry':
-                    summary[strategy_name]['entry'] += 1
-                    if result == 'success':
-                        summary[strategy_name]['profit_trades'] += 1
-                        deals.append({
-                            "side": side,
-                            "price": price,
-                            "lot": lot
-                        })
-                    else:
-                        summary[strategy_name]['fail_trades'] += 1
 
-                elif action == 'exit':
-                    summary[strategy_name]['exit'] += 1
-                    if deals:
-                        entry = deals.pop(0)
-                        profit = calculate_profit(entry['side'], entry['price'], price, entry['lot'])
-                        summary[strategy_name]['profit'] += profit
+def _write_html(path, table, count):
+    html = table.to_html(index=False, na_rep="-", float_format=lambda value: f"{value:.2f}",
+                         formatters={TITLES["win_rate"]: "{:.0%}".format}, border=0)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"<!doctype html><meta charset='utf-8'><title>Отчёт</title>"
+                   f"<style>body{{font-family:sans-serif}} td,th{{padding:4px 10px;text-align:right}}</style>"
+                   f"<h2>Сводный отчёт — {count} сделок, {datetime.now():%Y-%m-%d %H:%M}</h2>{html}")
 
-    # Вывод отчёта
-    print("\n📊 Стратегии — сводный отчёт:\n")
-    print(f"{'Стратегия':<35} {'Входов':<7} {'Выходов':<9} {'Успехов':<8} {'Ошибок':<8} {'Профит':<10}")
-    print("-" * 80)
 
-    for strategy, data in summary.items():
-        print(f"{strategy:<35} {data['entry']:<7} {data['exit']:<9} {data['profit_trades']:<8} {data['fail_trades']:<8} {data['profit']:.2f}")
+def _timestamp(text):
+    return datetime.fromisoformat(text).timestamp()
 
-def calculate_profit(side, entry_price, exit_price, lot):
-    if side == 'buy':
-        profit = (exit_price - entry_price) * lot * 100000
-    else:  # sell
-        profit = (entry_price - exit_price) * lot * 100000
-    return profit
 
 if __name__ == "__main__":
-    generate_summary_report()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=JOURNAL_PATH)
+    parser.add_argument("--by", nargs="+", default=["strategy"], choices=["strategy", "symbol"])
+    parser.add_argument("--from", dest="start", type=_timestamp, default=None)
+    parser.add_argument("--to", dest="end", type=_timestamp, default=None)
+    parser.add_argument("--csv", default=None)
+    parser.add_argument("--html", default=None)
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать отчёт по всему журналу")
+    args = parser.parse_args()
+    generate_summary_report(args.db, args.by, args.start, args.end, args.csv, args.html, args.rebuild)
@@ -1,20 +1,13 @@
-from config.settings import SYMBOLS, MIN_LOT
+from config.settings import SYMBOLS, RUN_MODE
 from core.mt5_wrapper import initialize_mt5, shutdown_mt5
 from strategies.CCI import CCIDivergenceStrategy
 from strategies.VWAP import VWAPStrategy
 from strategies.ema_cross import EMARSIVolumeStrategy
 from strategies.price_action_ma import PriceActionMAStrategy
-from core.trader import Trader
-import time
-
-print("\U0001F680 Запуск трейдинг-бота...")
-
-# ⚙️ Подключение к MetaTrader 5
-if not initialize_mt5():
-    print("\u274C Ошибка подключения к MetaTrader 5. Завершение.")
-    exit()
-
-print("\u2705 Успешное подключение к MetaTrader 5.")
+from core.bot import Bot
+from core.supervisor import Supervisor
+from core.metrics import start_metrics
+from core.profiling import ProfilingHooks
 
 # 📈 Выбор активных стратегий
 active_strategies = [
@@ -24,25 +17,48 @@ active_strategies = [
      CCIDivergenceStrategy
 ]
 
-# 📈 Инициализация стратегий и трейдеров
-strategies = []
-for StrategyClass in active_strategies:
-    for symbol in SYMBOLS:
-        strategy = StrategyClass(symbol, MIN_LOT)
-        strategies.append(strategy)
-
-# 🔥 Правильное создание трейдеров
-traders = [Trader(strategy.symbol, strategy) for strategy in strategies]
-
-# 🔁 Основной цикл обработки
-try:
-    while True:
-        print(f"\n\U0001F501 Новый цикл обработки: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        for trader in traders:
-            trader.run()
-        time.sleep(10)
-except KeyboardInterrupt:
-    print("\n\U0001F6D1 Остановка по запросу пользователя.")
-finally:
-    shutdown_mt5()
-    print("\U0001F4F4 MetaTrader 5 отключён. Бот завершил работу.")
+
+def main():
+    print("\U0001F680 Запуск трейдинг-бота...")
+
+    # 📈 Пары (стратегия, символ) — по трейдеру на каждую
+    pairs = [(StrategyClass, symbol) for StrategyClass in active_strategies for symbol in SYMBOLS]
+
+    # 🧭 Режим супервизора: пары делятся по процессам-воркерам, у каждого своё подключение к MT5
+    if RUN_MODE == "supervisor":
+        try:
+            Supervisor(pairs).run()
+        except KeyboardInterrupt:
+            print("\n\U0001F6D1 Остановка по запросу пользователя.")
+        print("\U0001F4F4 Воркеры остановлены. Бот завершил работу.")
+        return
+
+    # ⚙️ Подключение к MetaTrader 5
+    if not initialize_mt5():
+        print("❌ Ошибка подключения к MetaTrader 5. Завершение.")
+        exit()
+
+    print("✅ Успешное подключение к MetaTrader 5.")
+
+    # 📈 Замер вызовов MT5 и экспорт метрик — до Bot: шлюз MT5 оборачивает уже замеряемые функции
+    start_metrics()
+    # 🔬 Профилирование по команде (profile.ctl, SIGUSR1/SIGUSR2) и профили медленных циклов
+    hooks = ProfilingHooks()
+    hooks.install_signals()
+    bot = Bot(pairs, hooks=hooks)
+
+    # 🔁 Основной цикл обработки
+    try:
+        bot.run()
+    except KeyboardInterrupt:
+        print("\n\U0001F6D1 Остановка по запросу пользователя.")
+    finally:
+        hooks.shutdown()
+        bot.shutdown()
+        shutdown_mt5()
+        print("\U0001F4F4 MetaTrader 5 отключён. Бот завершил работу.")
+
+
+# процессы-воркеры импортируют этот модуль заново (spawn) — запуск только из точки входа
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Инкрементальный отчёт по журналу сделок (core.journal).
+
+Закрытые сделки копятся в таблицах отчёта в той же базе: report_trades — пары
+вход/выход с PnL, report_open — входы без выхода, report_state — id последней
+обработанной строки журнала. update() читает из журнала только новые строки, поэтому
+ночной отчёт за год стоит столько же, сколько за день; метрики (PnL, просадка,
+доля прибыльных, матожидание) считаются векторно по всей таблице report_trades.
+
+Вход и выход сопоставляются по (стратегия, символ, тикет); у строк из старых CSV
+тикета нет — они сопоставляются по порядку внутри (стратегия, символ).
+PnL = направление × (выход − вход) × лот × размер контракта символа, переведённый
+в валюту счёта через trade_tick_value; параметры символа берутся из терминала
+и запоминаются в report_symbols — без терминала (и без пакета MetaTrader5) используются
+сохранённые.
+
+Выходы по SL/TP, stop out и вручную бот пишет в журнал из истории сделок (source='history'),
+поэтому каждая закрытая позиция — одна сделка отчёта; сверку с историей брокера делает
+sim.replay (reconcile).
+"""
+import numpy as np
+import pandas as pd
+from config.settings import JOURNAL_PATH
+from core.journal import connect
+from utils.logger import file_logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_state (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS report_open (
+    id INTEGER PRIMARY KEY, time REAL, strategy TEXT, symbol TEXT, ticket INTEGER, side TEXT, price REAL, lot REAL
+);
+CREATE TABLE IF NOT EXISTS report_trades (
+    id INTEGER PRIMARY KEY,          -- id строки выхода в журнале
+    strategy TEXT, symbol TEXT, ticket INTEGER, side TEXT,
+    entry_time REAL, exit_time REAL, entry_price REAL, exit_price REAL, lot REAL, pnl REAL
+);
+CREATE INDEX IF NOT EXISTS report_trades_strategy_time ON report_trades (strategy, exit_time);
+CREATE TABLE IF NOT EXISTS report_symbols (symbol TEXT PRIMARY KEY, contract_size REAL, conversion REAL);
+"""
+
+OPEN_COLUMNS = ["id", "time", "strategy", "symbol", "ticket", "side", "price", "lot"]
+TRADE_COLUMNS = ["id", "strategy", "symbol", "ticket", "side", "entry_time", "exit_time",
+                 "entry_price", "exit_price", "lot", "pnl"]
+KEY = ["strategy", "symbol"]
+# без терминала и без сохранённых параметров — как для мажоров
+DEFAULT_CONTRACT_SIZE = 100000.0
+
+
+class ReportEngine:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._terminal = None     # модуль MetaTrader5, если удалось подключиться (проверяется один раз)
+
+    def _connect(self):
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    # ── параметры символов ────────────────────────────────────────────
+    def _symbol_info(self, symbol):
+        if self._terminal is None:
+            # терминал нужен только за параметрами новых символов — офлайн отчёт строится без него
+            try:
+                import MetaTrader5 as mt5
+            except ImportError:
+                mt5 = None
+            self._terminal = mt5 if mt5 is not None and mt5.initialize() else False
+        return self._terminal.symbol_info(symbol) if self._terminal else None
+
+    def _specs(self, conn, symbols):
+        """symbol -> (размер контракта, множитель валюта котировки -> валюта счёта)."""
+        known = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT * FROM report_symbols")}
+        for symbol in sorted(set(symbols) - set(known)):
+            info = self._symbol_info(symbol)
+            if info is None:
+                file_logger.warning(f"⚠️ Отчёт: нет параметров {symbol} — контракт {DEFAULT_CONTRACT_SIZE:.0f}")
+                known[symbol] = (DEFAULT_CONTRACT_SIZE, 1.0)
+                continue
+            size = info.trade_contract_size
+            tick_value = getattr(info, "trade_tick_value", 0.0)
+            tick_size = getattr(info, "trade_tick_size", 0.0)
+            conversion = tick_value / (tick_size * size) if tick_value and tick_size else 1.0
+            known[symbol] = (size, conversion)
+            conn.execute("INSERT OR REPLACE INTO report_symbols VALUES (?, ?, ?)", (symbol, size, conversion))
+        return known
+
+    # ── инкрементальное сопоставление ────────────────────────────────
+    def update(self):
+        """Обрабатывает строки журнала новее сохранённой отметки. Возвращает (строк, новых сделок)."""
+        conn = self._connect()
+        try:
+            with conn:
+                state = conn.execute("SELECT value FROM report_state WHERE key = 'last_id'").fetchone()
+                last_id = state[0] if state else 0
+                rows = pd.read_sql(
+                    "SELECT id, time, strategy, symbol, action, side, ticket, price, lot FROM trades "
+                    "WHERE id > ? AND result = 'success' ORDER BY id", conn, params=(last_id,))
+                if rows.empty:
+                    return 0, 0
+                opened = pd.read_sql("SELECT * FROM report_open ORDER BY id", conn)
+                entries = pd.concat([opened, rows.loc[rows['action'] == 'entry', OPEN_COLUMNS]], ignore_index=True)
+                exits = rows[rows['action'] == 'exit']
+                trades, still_open = self._match(entries, exits)
+                if len(trades):
+                    specs = self._specs(conn, trades['symbol'].unique())
+                    size = trades['symbol'].map(lambda symbol: specs[symbol][0] * specs[symbol][1])
+                    direction = np.where(trades['side'] == 'sell', -1.0, 1.0)
+                    trades['pnl'] = direction * (trades['exit_price'] - trades['entry_price']) * trades['lot'] * size
+                    conn.executemany(f"INSERT OR REPLACE INTO report_trades VALUES ({', '.join('?' * len(TRADE_COLUMNS))})",
+                                     trades[TRADE_COLUMNS].astype(object).where(trades[TRADE_COLUMNS].notna(), None)
+                                     .itertuples(index=False, name=None))
+                conn.execute("DELETE FROM report_open")
+                conn.executemany(f"INSERT INTO report_open VALUES ({', '.join('?' * len(OPEN_COLUMNS))})",
+                                 still_open[OPEN_COLUMNS].astype(object).where(still_open[OPEN_COLUMNS].notna(), None)
+                                 .itertuples(index=False, name=None))
+                conn.execute("INSERT OR REPLACE INTO report_state VALUES ('last_id', ?)", (int(rows['id'].max()),))
+            return len(rows), len(trades)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _match(entries, exits):
+        """Пары вход/выход и оставшиеся открытыми входы."""
+        pairs = []
+        has_ticket = entries['ticket'].notna()
+        exit_ticket = exits['ticket'].notna()
+        # по тикету
+        pairs.append(exits[exit_ticket].merge(entries[has_ticket], on=KEY + ["ticket"], suffixes=("", "_entry")))
+        # без тикета (старые CSV) — k-й выход пары закрывает k-й вход
+        legacy_entries = entries[~has_ticket].assign(seq=lambda df: df.groupby(KEY).cumcount())
+        legacy_exits = exits[~exit_ticket].assign(seq=lambda df: df.groupby(KEY).cumcount())
+        pairs.append(legacy_exits.merge(legacy_entries, on=KEY + ["seq"], suffixes=("", "_entry"))
+                     .drop(columns=["seq", "ticket_entry"]))
+        matched = pd.concat(pairs, ignore_index=True)
+        matched = matched.drop_duplicates("id_entry")
+        trades = pd.DataFrame({
+            "id": matched['id'],
+            "strategy": matched['strategy'],
+            "symbol": matched['symbol'],
+            "ticket": matched['ticket'],
+            # сторона — по входу; у старых строк её нет ни у входа, ни у выхода — считаем buy
+            "side": matched['side_entry'].fillna(matched['side']).fillna("buy"),
+            "entry_time": matched['time_entry'],
+            "exit_time": matched['time'],
+            "entry_price": matched['price_entry'],
+            "exit_price": matched['price'],
+            "lot": matched['lot'].fillna(matched['lot_entry']),
+        })
+        still_open = entries[~entries['id'].isin(matched['id_entry'])]
+        return trades, still_open
+
+    def rebuild(self):
+        """Сбросить отчёт и пересчитать по всему журналу."""
+        conn = self._connect()
+        with conn:
+            conn.executescript("DELETE FROM report_state; DELETE FROM report_open; DELETE FROM report_trades;")
+        conn.close()
+        return self.update()
+
+    # ── метрики ──────────────────────────────────────────────────────
+    def trades(self, start=None, end=None):
+        conn = self._connect()
+        try:
+            query, params = "SELECT * FROM report_trades", []
+            if start is not None or end is not None:
+                query += " WHERE exit_time >= ? AND exit_time < ?"
+                params = [start if start is not None else float("-inf"), end if end is not None else float("inf")]
+            return pd.read_sql(query + " ORDER BY exit_time, id", conn, params=params)
+        finally:
+            conn.close()
+
+    def open_positions(self):
+        conn = self._connect()
+        try:
+            return pd.read_sql("SELECT * FROM report_open ORDER BY id", conn)
+        finally:
+            conn.close()
+
+
+def summarize(trades, by=("strategy",)):
+    """Метрики по группам: сделки, PnL, доля прибыльных, средние, матожидание, PF, макс. просадка."""
+    by = list(by)
+    columns = ["trades", "pnl", "win_rate", "avg_win", "avg_loss", "expectancy", "profit_factor", "max_drawdown"]
+    if trades.empty:
+        return pd.DataFrame(columns=by + columns)
+    trades = trades.sort_values(by + ["exit_time", "id"])
+    pnl = trades['pnl']
+    wins, losses = pnl.where(pnl > 0), pnl.where(pnl < 0)
+    # просадка — от максимума накопленного PnL группы (старт с нуля)
+    equity = pnl.groupby([trades[column] for column in by]).cumsum()
+    peak = equity.groupby([trades[column] for column in by]).cummax().clip(lower=0)
+    frame = trades.assign(win=pnl > 0, gain=wins, loss=losses, gross_win=wins.fillna(0), gross_loss=-losses.fillna(0),
+                          drawdown=peak - equity)
+    grouped = frame.groupby(by)
+    summary = pd.DataFrame({
+        "trades": grouped.size(),
+        "pnl": grouped['pnl'].sum(),
+        "win_rate": grouped['win'].mean(),
+        "avg_win": grouped['gain'].mean(),
+        "avg_loss": grouped['loss'].mean(),
+        "expectancy": grouped['pnl'].mean(),
+        "gross_win": grouped['gross_win'].sum(),
+        "gross_loss": grouped['gross_loss'].sum(),
+        "max_drawdown": grouped['drawdown'].max(),
+    })
+    summary['profit_factor'] = summary['gross_win'] / summary['gross_loss'].replace(0, np.nan)
+    return summary.reset_index()[by + columns]
+
+
+def total(trades):
+    """Те же метрики по всем сделкам вместе (просадка — по общей кривой в порядке закрытия)."""
+    return summarize(trades.assign(strategy="ВСЕГО"))
+
+
+report_engine = ReportEngine()
@@ -0,0 +1,540 @@
+"""
+Симулятор брокера — подмена модуля MetaTrader5 для офлайн-реплея.
+
+Брокер проигрывает записанные бары (и, если есть, тики) по общей шкале времени
+базового таймфрейма. На шаге k время равно открытию бара k: сформировавшиеся бары
+видны целиком, текущий — как в терминале сразу после открытия (O=H=L=C=open).
+Старшие таймфреймы собираются из базового. advance() проводит цену по бару
+(по тикам или по пути O→L→H→C / O→H→L→C), исполняет SL/TP и переходит к следующему бару.
+
+Исполнение: спред — из баров или фиксированный, проскальзывание — случайное в пределах
+slippage_points против клиента (больше deviation запроса — реквот), SL/TP ближе
+trade_stops_level отклоняются кодом TRADE_RETCODE_INVALID_STOPS, как у брокера.
+"""
+import sys
+import types
+from collections import namedtuple
+from datetime import datetime
+from fnmatch import fnmatch
+import numpy as np
+from utils.helpers import timeframe_seconds
+from backtest.data import resample
+
+CONSTANTS = {
+    # таймфреймы
+    "TIMEFRAME_M1": 1, "TIMEFRAME_M2": 2, "TIMEFRAME_M3": 3, "TIMEFRAME_M4": 4, "TIMEFRAME_M5": 5,
+    "TIMEFRAME_M6": 6, "TIMEFRAME_M10": 10, "TIMEFRAME_M12": 12, "TIMEFRAME_M15": 15, "TIMEFRAME_M20": 20,
+    "TIMEFRAME_M30": 30, "TIMEFRAME_H1": 0x4001, "TIMEFRAME_H2": 0x4002, "TIMEFRAME_H3": 0x4003,
+    "TIMEFRAME_H4": 0x4004, "TIMEFRAME_H6": 0x4006, "TIMEFRAME_H8": 0x4008, "TIMEFRAME_H12": 0x400C,
+    "TIMEFRAME_D1": 0x4018, "TIMEFRAME_W1": 0x8001, "TIMEFRAME_MN1": 0xC001,
+    # ордера и позиции
+    "ORDER_TYPE_BUY": 0, "ORDER_TYPE_SELL": 1, "POSITION_TYPE_BUY": 0, "POSITION_TYPE_SELL": 1,
+    "TRADE_ACTION_DEAL": 1, "TRADE_ACTION_SLTP": 6,
+    "ORDER_FILLING_FOK": 0, "ORDER_FILLING_IOC": 1, "ORDER_FILLING_RETURN": 2, "ORDER_TIME_GTC": 0,
+    "SYMBOL_TRADE_MODE_DISABLED": 0, "SYMBOL_TRADE_MODE_FULL": 4,
+    "DEAL_TYPE_BUY": 0, "DEAL_TYPE_SELL": 1, "DEAL_ENTRY_IN": 0, "DEAL_ENTRY_OUT": 1,
+    "DEAL_REASON_CLIENT": 0, "DEAL_REASON_EXPERT": 3, "DEAL_REASON_SL": 4, "DEAL_REASON_TP": 5,
+    "COPY_TICKS_ALL": -1, "COPY_TICKS_INFO": 1, "COPY_TICKS_TRADE": 2,
+    # коды ответа
+    "TRADE_RETCODE_REQUOTE": 10004, "TRADE_RETCODE_DONE": 10009, "TRADE_RETCODE_INVALID": 10013,
+    "TRADE_RETCODE_INVALID_VOLUME": 10014, "TRADE_RETCODE_INVALID_PRICE": 10015,
+    "TRADE_RETCODE_INVALID_STOPS": 10016, "TRADE_RETCODE_MARKET_CLOSED": 10018,
+    "TRADE_RETCODE_NO_MONEY": 10019, "TRADE_RETCODE_NO_CHANGES": 10025, "TRADE_RETCODE_POSITION_CLOSED": 10036,
+}
+C = types.SimpleNamespace(**CONSTANTS)
+
+SymbolInfo = namedtuple("SymbolInfo", "name point digits spread trade_contract_size trade_tick_size trade_tick_value "
+                                      "volume_min volume_max volume_step trade_stops_level trade_mode visible "
+                                      "bid ask currency_base currency_profit currency_margin filling_mode time")
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+AccountInfo = namedtuple("AccountInfo", "login balance equity margin margin_free margin_level profit currency leverage")
+TradePosition = namedtuple("TradePosition", "ticket time time_msc time_update time_update_msc type magic identifier "
+                                            "reason volume price_open sl tp price_current swap profit symbol "
+                                            "comment external_id")
+TradeDeal = namedtuple("TradeDeal", "ticket order time time_msc type entry magic position_id reason volume price "
+                                    "commission swap profit fee symbol comment external_id")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id "
+                                                "retcode_external request")
+
+
+class SimSymbol:
+    def __init__(self, name, rates, point, stops_level, contract_size, ticks=None):
+        self.name = name
+        self.rates = rates
+        self.point = point
+        self.digits = max(int(round(-np.log10(point))), 0)
+        self.stops_level = stops_level
+        self.contract_size = contract_size
+        self.ticks = ticks              # структурированный массив (time_msc, bid, ask) или None
+        letters = name[:6]
+        self.base, self.quote = (letters[:3], letters[3:6]) if letters.isalpha() else ("", "")
+        self.count = None               # бары с time <= время шага, по шагам шкалы
+        self.open_now = None            # есть ли у символа бар, открывшийся на шаге
+        self._agg = {}                  # таймфрейм -> (бары, номер агрегата для каждого базового бара, начала)
+
+
+class SimBroker:
+    def __init__(self, rates_by_symbol, timeframe=5, points=None, spread_points=None, slippage_points=0,
+                 stops_level=10, contract_size=100000.0, commission_per_lot=0.0, balance=10000.0,
+                 leverage=100, currency="USD", ticks_by_symbol=None, seed=0):
+        self.timeframe = timeframe
+        self.spread_points = spread_points
+        self.slippage_points = slippage_points
+        self.commission_per_lot = commission_per_lot
+        self.leverage = leverage
+        self.currency = currency
+        self.balance = balance
+        self._rng = np.random.default_rng(seed)
+        points = points or {}
+        ticks_by_symbol = ticks_by_symbol or {}
+
+        self.symbols = {}
+        for name, rates in rates_by_symbol.items():
+            self.symbols[name] = SimSymbol(name, rates, points.get(name, 1e-5), stops_level, contract_size,
+                                           ticks_by_symbol.get(name))
+        self.timeline = np.unique(np.concatenate([s.rates['time'] for s in self.symbols.values()]))
+        for sym in self.symbols.values():
+            times = sym.rates['time']
+            sym.count = np.searchsorted(times, self.timeline, side="right")
+            last = np.maximum(sym.count - 1, 0)
+            sym.open_now = (sym.count > 0) & (times[last] == self.timeline)
+
+        self.k = 0
+        self.positions = {}       # ticket -> dict
+        self.deals = []
+        self._ticket = 1000
+        self._error = (1, "Success")
+        self.equity_curve = np.zeros(len(self.timeline))
+        self.rejections = {}
+
+    # ── часы (интерфейс SystemClock для Trader) ───────────────────────
+    def now(self):
+        return float(self.timeline[self.k])
+
+    def sleep(self, seconds):
+        pass
+
+    @property
+    def steps(self):
+        return len(self.timeline)
+
+    def bar_closed(self, timeframe):
+        """Закрылся ли на этом шаге бар таймфрейма (шаг — открытие нового бара)."""
+        if self.k == 0:
+            return False
+        period = timeframe_seconds(timeframe)
+        return self.timeline[self.k] // period != self.timeline[self.k - 1] // period
+
+    # ── служебное ─────────────────────────────────────────────────────
+    def _next_ticket(self):
+        self._ticket += 1
+        return self._ticket
+
+    def _index(self, sym):
+        return int(sym.count[self.k]) - 1
+
+    def _quote(self, sym):
+        """(bid, ask, время в мс) на текущий момент или None, если данных ещё нет."""
+        i = self._index(sym)
+        if i < 0:
+            return None
+        now = int(self.timeline[self.k])
+        if sym.ticks is not None and len(sym.ticks):
+            j = np.searchsorted(sym.ticks['time_msc'], now * 1000, side="right") - 1
+            if j >= 0:
+                tick = sym.ticks[j]
+                return float(tick['bid']), float(tick['ask']), int(tick['time_msc'])
+        bar = sym.rates[i]
+        bid = float(bar['open'] if sym.open_now[self.k] else bar['close'])
+        spread = self.spread_points if self.spread_points is not None else int(bar['spread'])
+        return bid, bid + spread * sym.point, now * 1000
+
+    def _convert(self, amount, currency):
+        """Сумма из валюты `currency` в валюту счёта по текущим котировкам."""
+        if currency == self.currency or not currency:
+            return amount
+        for sym in self.symbols.values():
+            quote = self._quote(sym) if sym.base and sym.quote else None
+            if quote is None:
+                continue
+            if sym.base == currency and sym.quote == self.currency:
+                return amount * quote[0]
+            if sym.base == self.currency and sym.quote == currency:
+                return amount / quote[0]
+        return amount
+
+    def _profit(self, sym, direction, volume, price_open, price_close):
+        return self._convert(direction * (price_close - price_open) * sym.contract_size * volume, sym.quote)
+
+    def _margin(self, sym, volume, price):
+        notional = volume * sym.contract_size / self.leverage
+        if sym.base == self.currency:
+            return notional
+        if sym.quote == self.currency:
+            return notional * price
+        return self._convert(notional * price, sym.quote)
+
+    def _fail(self, retcode, request, comment, quote=None):
+        self.rejections[retcode] = self.rejections.get(retcode, 0) + 1
+        bid, ask = (quote[0], quote[1]) if quote else (0.0, 0.0)
+        return OrderSendResult(retcode, 0, 0, 0.0, 0.0, bid, ask, comment, 0, 0, request)
+
+    def _stops_valid(self, sym, direction, sl, tp, bid, ask):
+        level = sym.stops_level * sym.point
+        if direction > 0:
+            return (not sl or sl <= bid - level) and (not tp or tp >= bid + level)
+        return (not sl or sl >= ask + level) and (not tp or tp <= ask - level)
+
+    def _slippage(self):
+        return int(self._rng.integers(0, self.slippage_points + 1)) if self.slippage_points else 0
+
+    def _position_tuple(self, pos):
+        sym = self.symbols[pos['symbol']]
+        quote = self._quote(sym)
+        current = quote[0] if pos['direction'] > 0 else quote[1]
+        profit = self._profit(sym, pos['direction'], pos['volume'], pos['price_open'], current)
+        return TradePosition(pos['ticket'], pos['time'], pos['time'] * 1000, pos['time_update'],
+                             pos['time_update'] * 1000, 0 if pos['direction'] > 0 else 1, pos['magic'],
+                             pos['ticket'], 3, pos['volume'], pos['price_open'], pos['sl'], pos['tp'],
+                             current, 0.0, profit, pos['symbol'], pos['comment'], "")
+
+    def _record_deal(self, pos, entry, volume, price, profit, reason, comment):
+        direction = pos['direction'] if entry == C.DEAL_ENTRY_IN else -pos['direction']
+        commission = -self.commission_per_lot * volume
+        now = int(self.timeline[self.k])
+        deal = TradeDeal(self._next_ticket(), self._ticket, now, now * 1000, 0 if direction > 0 else 1, entry,
+                         pos['magic'], pos['ticket'], reason, volume, price, commission, 0.0, profit, 0.0,
+                         pos['symbol'], comment, "")
+        self.deals.append(deal)
+        self.balance += profit + commission
+        return deal
+
+    def _close(self, pos, volume, price, reason, comment):
+        sym = self.symbols[pos['symbol']]
+        profit = self._profit(sym, pos['direction'], volume, pos['price_open'], price)
+        deal = self._record_deal(pos, C.DEAL_ENTRY_OUT, volume, price, profit, reason, comment)
+        pos['volume'] = round(pos['volume'] - volume, 8)
+        if pos['volume'] <= 0:
+            del self.positions[pos['ticket']]
+        return deal
+
+    # ── API MetaTrader5 ───────────────────────────────────────────────
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self):
+        return self._error
+
+    def symbol_select(self, symbol, enable=True):
+        return symbol in self.symbols
+
+    def symbol_info(self, symbol):
+        sym = self.symbols.get(symbol)
+        if sym is None:
+            self._error = (-1, f"unknown symbol {symbol}")
+            return None
+        quote = self._quote(sym) or (0.0, 0.0, 0)
+        bid, ask = quote[0], quote[1]
+        return SymbolInfo(symbol, sym.point, sym.digits, int(round((ask - bid) / sym.point)), sym.contract_size,
+                          sym.point, sym.point * sym.contract_size, 0.01, 100.0, 0.01, sym.stops_level,
+                          C.SYMBOL_TRADE_MODE_FULL, True, bid, ask, sym.base, sym.quote, sym.base, 1,
+                          int(self.timeline[self.k]))
+
+    def symbols_get(self, group=None):
+        patterns = [p.strip() for p in group.split(",")] if group else ["*"]
+        return tuple(self.symbol_info(name) for name in self.symbols
+                     if any(fnmatch(name, pattern) for pattern in patterns))
+
+    def symbol_info_tick(self, symbol):
+        sym = self.symbols.get(symbol)
+        quote = self._quote(sym) if sym else None
+        if quote is None:
+            return None
+        bid, ask, time_msc = quote
+        return Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, 6, 0.0)
+
+    def account_info(self):
+        profit = sum(self._position_tuple(pos).profit for pos in self.positions.values())
+        margin = sum(self._margin(self.symbols[pos['symbol']], pos['volume'], pos['price_open'])
+                     for pos in self.positions.values())
+        equity = self.balance + profit
+        level = equity / margin * 100 if margin else 0.0
+        return AccountInfo(1, self.balance, equity, margin, equity - margin, level, profit, self.currency,
+                           self.leverage)
+
+    def _aggregated(self, sym, timeframe):
+        agg = sym._agg.get(timeframe)
+        if agg is None:
+            bars = resample(sym.rates, timeframe)
+            owner = np.searchsorted(bars['time'], sym.rates['time'], side="right") - 1
+            starts = np.searchsorted(sym.rates['time'], bars['time'])
+            agg = sym._agg[timeframe] = (bars, owner, starts)
+        return agg
+
+    def _virtual_bars(self, sym, timeframe):
+        """(сформированные бары, текущий бар или None) таймфрейма на момент шага."""
+        i = self._index(sym)
+        if i < 0:
+            return sym.rates[:0], None
+        open_now = sym.open_now[self.k]
+        if timeframe == self.timeframe:
+            closed = sym.rates[:i] if open_now else sym.rates[:i + 1]
+            if not open_now:
+                return closed, None
+            forming = sym.rates[i:i + 1].copy()
+            forming['high'] = forming['low'] = forming['close'] = forming['open']
+            forming['tick_volume'] = 1
+            forming['real_volume'] = 0
+            return closed, forming
+
+        bars, owner, starts = self._aggregated(sym, timeframe)
+        b = owner[i]
+        period = timeframe_seconds(timeframe)
+        if not open_now and self.timeline[self.k] >= bars['time'][b] + period:
+            return bars[:b + 1], None
+        start = starts[b]
+        forming = bars[b:b + 1].copy()
+        end = i if open_now else i + 1
+        src = sym.rates[start:end]
+        if open_now:
+            bar = sym.rates[i]
+            forming['open'] = src['open'][0] if len(src) else bar['open']
+            forming['high'] = max(src['high'].max(), bar['open']) if len(src) else bar['open']
+            forming['low'] = min(src['low'].min(), bar['open']) if len(src) else bar['open']
+            forming['close'] = bar['open']
+            forming['tick_volume'] = int(src['tick_volume'].sum()) + 1
+            forming['spread'] = bar['spread']
+        else:
+            forming['open'] = src['open'][0]
+            forming['high'] = src['high'].max()
+            forming['low'] = src['low'].min()
+            forming['close'] = src['close'][-1]
+            forming['tick_volume'] = src['tick_volume'].sum()
+        return bars[:b], forming
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        sym = self.symbols.get(symbol)
+        if sym is None or timeframe_seconds(timeframe) < timeframe_seconds(self.timeframe):
+            self._error = (-2, "timeframe below replay base" if sym else f"unknown symbol {symbol}")
+            return None
+        closed, forming = self._virtual_bars(sym, timeframe)
+        total = len(closed) + (forming is not None)
+        end = total - start_pos
+        begin = max(end - count, 0)
+        if end <= begin:
+            return None
+        out = np.empty(end - begin, dtype=closed.dtype)
+        stop = min(end, len(closed))
+        out[:stop - begin] = closed[begin:stop]
+        if end > stop:
+            out[-1] = forming[0]
+        return out
+
+    def _all_bars(self, symbol, timeframe):
+        sym = self.symbols.get(symbol)
+        if sym is None:
+            return None
+        closed, forming = self._virtual_bars(sym, timeframe)
+        return np.concatenate([closed, forming]) if forming is not None else closed.copy()
+
+    @staticmethod
+    def _timestamp(value):
+        return int(value.timestamp()) if isinstance(value, datetime) else int(value)
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        bars = self._all_bars(symbol, timeframe)
+        if bars is None:
+            return None
+        end = np.searchsorted(bars['time'], self._timestamp(date_from), side="right")
+        return bars[max(end - count, 0):end]
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        bars = self._all_bars(symbol, timeframe)
+        if bars is None:
+            return None
+        times = bars['time']
+        return bars[(times >= self._timestamp(date_from)) & (times <= self._timestamp(date_to))]
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        result = []
+        for pos in self.positions.values():
+            if symbol is not None and pos['symbol'] != symbol:
+                continue
+            if ticket is not None and pos['ticket'] != ticket:
+                continue
+            if group is not None and not fnmatch(pos['symbol'], group):
+                continue
+            result.append(self._position_tuple(pos))
+        return tuple(result)
+
+    def orders_get(self, *args, **kwargs):
+        return ()
+
+    def history_deals_get(self, date_from=None, date_to=None, group=None, ticket=None, position=None):
+        deals = self.deals
+        if position is not None:
+            return tuple(d for d in deals if d.position_id == position)
+        if ticket is not None:
+            return tuple(d for d in deals if d.ticket == ticket)
+        start = self._timestamp(date_from) if date_from is not None else 0
+        end = self._timestamp(date_to) if date_to is not None else float("inf")
+        return tuple(d for d in deals if start <= d.time <= end and (group is None or fnmatch(d.symbol, group)))
+
+    def order_calc_margin(self, order_type, symbol, volume, price):
+        sym = self.symbols.get(symbol)
+        return self._margin(sym, volume, price) if sym else None
+
+    def order_calc_profit(self, order_type, symbol, volume, price_open, price_close):
+        sym = self.symbols.get(symbol)
+        direction = 1 if order_type == C.ORDER_TYPE_BUY else -1
+        return self._profit(sym, direction, volume, price_open, price_close) if sym else None
+
+    def order_send(self, request):
+        sym = self.symbols.get(request.get("symbol"))
+        if sym is None:
+            return self._fail(C.TRADE_RETCODE_INVALID, request, "unknown symbol")
+        quote = self._quote(sym)
+        if quote is None or not sym.open_now[self.k]:
+            return self._fail(C.TRADE_RETCODE_MARKET_CLOSED, request, "Market closed", quote)
+        bid, ask, _ = quote
+        action = request.get("action")
+
+        if action == C.TRADE_ACTION_SLTP:
+            pos = self.positions.get(request.get("position"))
+            if pos is None:
+                return self._fail(C.TRADE_RETCODE_POSITION_CLOSED, request, "Position closed", quote)
+            sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+            if abs(sl - pos['sl']) < sym.point / 2 and abs(tp - pos['tp']) < sym.point / 2:
+                return self._fail(C.TRADE_RETCODE_NO_CHANGES, request, "No changes", quote)
+            if not self._stops_valid(sym, pos['direction'], sl, tp, bid, ask):
+                return self._fail(C.TRADE_RETCODE_INVALID_STOPS, request, "Invalid stops", quote)
+            pos['sl'], pos['tp'] = sl, tp
+            pos['time_update'] = int(self.timeline[self.k])
+            return OrderSendResult(C.TRADE_RETCODE_DONE, 0, 0, 0.0, 0.0, bid, ask, "Request executed", 0, 0,
+                                   request)
+
+        if action != C.TRADE_ACTION_DEAL:
+            return self._fail(C.TRADE_RETCODE_INVALID, request, "Unsupported action", quote)
+
+        volume = float(request.get("volume", 0.0))
+        steps = volume / 0.01
+        if volume < 0.01 or volume > 100.0 or abs(steps - round(steps)) > 1e-6:
+            return self._fail(C.TRADE_RETCODE_INVALID_VOLUME, request, "Invalid volume", quote)
+        buy = request.get("type") == C.ORDER_TYPE_BUY
+        slip = self._slippage()
+        if slip > request.get("deviation", 0):
+            return self._fail(C.TRADE_RETCODE_REQUOTE, request, "Requote", quote)
+        price = ask + slip * sym.point if buy else bid - slip * sym.point
+
+        if "position" in request:
+            pos = self.positions.get(request["position"])
+            if pos is None:
+                return self._fail(C.TRADE_RETCODE_POSITION_CLOSED, request, "Position closed", quote)
+            deal = self._close(pos, min(volume, pos['volume']), price, C.DEAL_REASON_EXPERT,
+                               request.get("comment", ""))
+            return OrderSendResult(C.TRADE_RETCODE_DONE, deal.ticket, deal.order, deal.volume, price, bid, ask,
+                                   "Request executed", 0, 0, request)
+
+        direction = 1 if buy else -1
+        sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+        if not self._stops_valid(sym, direction, sl, tp, bid, ask):
+            return self._fail(C.TRADE_RETCODE_INVALID_STOPS, request, "Invalid stops", quote)
+        if self._margin(sym, volume, price) > self.account_info().margin_free:
+            return self._fail(C.TRADE_RETCODE_NO_MONEY, request, "No money", quote)
+
+        now = int(self.timeline[self.k])
+        ticket = self._next_ticket()
+        pos = {"ticket": ticket, "symbol": sym.name, "direction": direction, "volume": volume,
+               "price_open": price, "sl": sl, "tp": tp, "magic": request.get("magic", 0),
+               "comment": request.get("comment", ""), "time": now, "time_update": now}
+        self.positions[ticket] = pos
+        deal = self._record_deal(pos, C.DEAL_ENTRY_IN, volume, price, 0.0, C.DEAL_REASON_EXPERT, pos['comment'])
+        return OrderSendResult(C.TRADE_RETCODE_DONE, deal.ticket, ticket, volume, price, bid, ask,
+                               "Request executed", 0, 0, request)
+
+    # ── проход цены внутри бара ───────────────────────────────────────
+    def _trigger(self, pos, bid, ask):
+        """Сработавший уровень позиции при цене bid/ask: (цена исполнения, причина) или None."""
+        sl, tp = pos['sl'], pos['tp']
+        if pos['direction'] > 0:
+            if sl and bid <= sl:
+                return bid, C.DEAL_REASON_SL
+            if tp and bid >= tp:
+                return bid, C.DEAL_REASON_TP
+        else:
+            if sl and ask >= sl:
+                return ask, C.DEAL_REASON_SL
+            if tp and ask <= tp:
+                return ask, C.DEAL_REASON_TP
+        return None
+
+    def _walk_ticks(self, sym, positions, start_msc, end_msc):
+        ticks = sym.ticks
+        a, b = np.searchsorted(ticks['time_msc'], [start_msc, end_msc])
+        bid, ask = ticks['bid'][a:b], ticks['ask'][a:b]
+        for pos in positions:
+            sl, tp = pos['sl'], pos['tp']
+            if pos['direction'] > 0:
+                hit = ((bid <= sl) if sl else False) | ((bid >= tp) if tp else False)
+            else:
+                hit = ((ask >= sl) if sl else False) | ((ask <= tp) if tp else False)
+            hits = np.flatnonzero(hit)
+            if len(hits):
+                j = hits[0]
+                price, reason = self._trigger(pos, float(bid[j]), float(ask[j]))
+                self._close(pos, pos['volume'], price, reason, f"[{'sl' if reason == C.DEAL_REASON_SL else 'tp'}]")
+
+    def _walk_bar(self, sym, positions, bar):
+        spread = (self.spread_points if self.spread_points is not None else int(bar['spread'])) * sym.point
+        o, h, l, c = float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close'])
+        path = (o, l, h, c) if c >= o else (o, h, l, c)
+        for pos in positions:
+            for n, price in enumerate(path):
+                # на экстремуме уровень пройден по пути — исполнение по уровню; на открытии — по цене гэпа
+                trigger = self._trigger(pos, price, price + spread)
+                if trigger is None:
+                    continue
+                fill, reason = trigger
+                if n > 0:
+                    fill = pos['sl'] if reason == C.DEAL_REASON_SL else pos['tp']
+                self._close(pos, pos['volume'], fill, reason, f"[{'sl' if reason == C.DEAL_REASON_SL else 'tp'}]")
+                break
+
+    def advance(self):
+        """Проводит цену через текущий бар (SL/TP) и переходит к следующему шагу. False — история кончилась."""
+        now = int(self.timeline[self.k])
+        next_time = int(self.timeline[self.k + 1]) if self.k + 1 < len(self.timeline) else now + \
+            timeframe_seconds(self.timeframe)
+        by_symbol = {}
+        for pos in list(self.positions.values()):
+            by_symbol.setdefault(pos['symbol'], []).append(pos)
+        for name, positions in by_symbol.items():
+            sym = self.symbols[name]
+            if not sym.open_now[self.k]:
+                continue
+            if sym.ticks is not None and len(sym.ticks):
+                self._walk_ticks(sym, positions, now * 1000, next_time * 1000)
+            else:
+                self._walk_bar(sym, positions, sym.rates[self._index(sym)])
+        self.equity_curve[self.k] = self.account_info().equity
+        if self.k + 1 >= len(self.timeline):
+            return False
+        self.k += 1
+        return True
+
+
+def install(broker):
+    """Регистрирует брокер как модуль MetaTrader5 — до импорта core/strategies."""
+    module = types.ModuleType("MetaTrader5")
+    module.__dict__.update(CONSTANTS)
+    for name in ("initialize", "shutdown", "last_error", "symbol_select", "symbol_info", "symbols_get",
+                 "symbol_info_tick", "account_info", "copy_rates_from_pos", "copy_rates_from", "copy_rates_range",
+                 "positions_get", "orders_get", "history_deals_get", "order_calc_margin", "order_calc_profit",
+                 "order_send"):
+        setattr(module, name, getattr(broker, name))
+    module.broker = broker
+    sys.modules["MetaTrader5"] = module
+    return module
@@ -0,0 +1,419 @@
+"""
+Нагрузочный стенд: подмена MetaTrader5 на N синтетических символов с задержками и ошибками
+терминала и отчёт о ёмкости — сколько символов помещается в бюджет цикла и куда уходит время с ростом N.
+
+    python -m sim.load [--symbols 10 50 100 250 500 1000] [--strategies VWAPStrategy ...]
+                       [--cycles 3] [--budget 10] [--mode threads] [--workers 4]
+                       [--latency-scale 1.0] [--jitter 0.5] [--requote 0.05] [--no-changes 0.2]
+                       [--missing-ticks 0.01] [--rates-errors 0.0] [--positions 0.3] [--out load.json]
+
+LoadBroker — симулятор брокера (sim.broker) с задержкой каждого вызова: база из LATENCY_MS
+плюс доля на элемент ответа (бар, позицию), логнормальный разброс --jitter. Задержка — sleep,
+как ожидание ответа терминала: процессор в это время свободен для других потоков.
+Ошибки: реквот на order_send (--requote), TRADE_RETCODE_NO_CHANGES на SL/TP (--no-changes),
+пропавший тик (--missing-ticks), None из copy_rates_* (--rates-errors).
+
+Рынок: USD- и JPY-пары с разным уровнем цены и волатильностью, внутридневной сезонностью
+(Лондон/Нью-Йорк активнее, на ролловере шире спред), кластеризацией волатильности и толстыми
+хвостами; для баров замера — тики внутри бара. Доля --positions символов начинает с открытой
+позицией одной из стратегий — сопровождение и трейлинг тоже под нагрузкой.
+
+Каждый размер N замеряется в отдельном процессе. Цикл — худший случай: бары всех таймфреймов
+закрылись одновременно (входы всех групп) плюс сопровождение; между циклами рынок проходит бар.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import string
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.settings import STRATEGY_ALLOCATION, MAGIC_NUMBERS, MANAGE_INTERVAL_SEC, EXECUTION_MODE, EXECUTION_WORKERS
+from sim.broker import SimBroker, C, install
+from utils.helpers import RATES_DTYPE
+
+BASE_TIMEFRAME = 5
+STEP = 300
+HISTORY = 3000              # баров M5 до первого цикла (H4 — 62 бара)
+START = 1_700_006_400       # 2023-11-15 00:00 UTC
+TICK_DTYPE = np.dtype([("time_msc", "i8"), ("bid", "f8"), ("ask", "f8")])
+
+# задержка вызова терминала, мс: база и доля на элемент ответа (бар, позицию, сделку)
+LATENCY_MS = {
+    "account_info": 0.10, "symbol_info": 0.08, "symbol_info_tick": 0.05, "symbols_get": 0.5,
+    "symbol_select": 0.05, "copy_rates_from": 0.3, "copy_rates_from_pos": 0.3, "copy_rates_range": 0.3,
+    "positions_get": 0.10, "orders_get": 0.10, "history_deals_get": 0.5,
+    "order_calc_margin": 0.05, "order_calc_profit": 0.05,
+    # торговый запрос — круг до торгового сервера
+    "order_send": 25.0,
+}
+LATENCY_PER_ITEM_MS = {
+    "copy_rates_from": 0.002, "copy_rates_from_pos": 0.002, "copy_rates_range": 0.002,
+    "positions_get": 0.003, "symbols_get": 0.01, "history_deals_get": 0.003,
+}
+# семейства символов: валюта котировки, диапазон цены, пункт, базовый спред (пунктов)
+FAMILIES = (("USD", (0.6, 1.8), 1e-5, 8), ("JPY", (80.0, 190.0), 1e-3, 12))
+
+
+def symbol_names(n):
+    """USDJPY (для пересчёта JPY в валюту счёта) и n − 1 синтетических пар: 3 из 4 — к USD, каждая 4-я — к JPY."""
+    letters = string.ascii_uppercase
+    names, i = ["USDJPY"], 0
+    while len(names) < n:
+        code = letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26]
+        i += 1
+        if code not in ("USD", "JPY"):
+            names.append(code + ("JPY" if len(names) % 4 == 0 else "USD"))
+    return names[:n]
+
+
+def _smooth(noise, span):
+    # экспоненциальное сглаживание шума — медленно меняющийся режим волатильности
+    kernel = np.exp(-np.arange(span * 4) / span)
+    return np.convolve(noise, kernel / np.sqrt((kernel ** 2).sum()))[:len(noise)]
+
+
+def make_bars(n, rng, price, point, spread_points, vol):
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    times = START + STEP * np.arange(n)
+    hour = times // 3600 % 24
+    # сессии: Лондон и Нью-Йорк активнее Азии, на ролловере (21–01 UTC) тише и шире спред
+    activity = np.where((hour >= 7) & (hour < 17), 1.5, np.where((hour >= 21) | (hour < 1), 0.5, 1.0))
+    regime = np.exp(0.3 * _smooth(rng.normal(0, 1, n), 48))
+    sigma = vol * activity * regime
+    # толстые хвосты: t-распределение с 4 степенями свободы (дисперсия 2)
+    returns = rng.standard_t(4, n) / np.sqrt(2) * sigma
+    close = price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([price], close[:-1]))
+    wick = np.abs(rng.normal(0, 0.5, (2, n))) * sigma * close
+    rates['time'] = times
+    rates['open'] = open_
+    rates['close'] = close
+    rates['high'] = np.maximum(open_, close) + wick[0]
+    rates['low'] = np.minimum(open_, close) - wick[1]
+    rates['tick_volume'] = np.maximum(rng.poisson(120 * activity * (1 + np.abs(returns) / sigma)), 1)
+    rollover = 1 + 2 * ((hour >= 21) | (hour < 1))
+    rates['spread'] = np.maximum(np.round(spread_points * rollover * rng.uniform(0.7, 1.5, n)), 1)
+    # цены кратны пункту
+    for field in ("open", "high", "low", "close"):
+        rates[field] = np.round(rates[field] / point) * point
+    return rates
+
+
+def make_ticks(bars, rng, point):
+    """Тики внутри баров: путь O→L→H→C (или O→H→L→C) с шумом, первый тик — на открытии."""
+    chunks = []
+    for bar in bars:
+        k = int(np.clip(bar['tick_volume'] // 10, 2, 40))
+        o, h, l, c = float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close'])
+        path = (o, l, h, c) if c >= o else (o, h, l, c)
+        bid = np.interp(np.arange(k), np.linspace(0, k - 1, 4), path)
+        bid = np.clip(bid + rng.normal(0, (h - l) * 0.05 + point, k), l, h)
+        bid[0] = o
+        ticks = np.zeros(k, dtype=TICK_DTYPE)
+        offsets = np.sort(rng.integers(1, STEP * 1000, k))
+        offsets[0] = 0
+        ticks['time_msc'] = int(bar['time']) * 1000 + offsets
+        ticks['bid'] = np.round(bid / point) * point
+        ticks['ask'] = ticks['bid'] + int(bar['spread']) * point
+        chunks.append(ticks)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=TICK_DTYPE)
+
+
+def make_universe(n, bars, tick_bars, seed=0):
+    """(бары, пункты, тики) для n символов; тики — только для последних tick_bars баров."""
+    rng = np.random.default_rng(seed)
+    rates_by_symbol, points, ticks_by_symbol = {}, {}, {}
+    for name in symbol_names(n):
+        quote, (low, high), point, spread = next(family for family in FAMILIES if family[0] == name[3:6])
+        price = 147.0 if name == "USDJPY" else float(rng.uniform(low, high))
+        vol = float(rng.lognormal(np.log(4e-4), 0.4))
+        rates = make_bars(bars, rng, price, point, spread, vol)
+        rates_by_symbol[name] = rates
+        points[name] = point
+        ticks_by_symbol[name] = make_ticks(rates[-tick_bars:], rng, point)
+    return rates_by_symbol, points, ticks_by_symbol
+
+
+class LoadBroker(SimBroker):
+    """Симулятор брокера с задержками и ошибками терминала (пока injecting=True)."""
+
+    def __init__(self, rates_by_symbol, latency_scale=1.0, jitter=0.5, requote=0.0, no_changes=0.0,
+                 missing_ticks=0.0, rates_errors=0.0, seed=0, **options):
+        super().__init__(rates_by_symbol, seed=seed, **options)
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.requote = requote
+        self.no_changes = no_changes
+        self.missing_ticks = missing_ticks
+        self.rates_errors = rates_errors
+        self.injecting = False
+        self.injected = Counter()        # вид ошибки -> сколько раз
+        self.waited = 0.0                # суммарная задержка, сек
+        self._load_rng = np.random.default_rng(seed + 1)
+
+    def _wait(self, name, items=0):
+        if not self.injecting or not self.latency_scale:
+            return
+        delay = (LATENCY_MS.get(name, 0.0) + LATENCY_PER_ITEM_MS.get(name, 0.0) * items) * self.latency_scale
+        if self.jitter:
+            # логнормальный разброс с медианой в базовой задержке
+            delay *= self._load_rng.lognormal(0.0, self.jitter)
+        self.waited += delay / 1000
+        time.sleep(delay / 1000)
+
+    def _chance(self, kind, probability):
+        if self.injecting and probability and self._load_rng.random() < probability:
+            self.injected[kind] += 1
+            return True
+        return False
+
+    def symbol_info_tick(self, symbol):
+        self._wait("symbol_info_tick")
+        if self._chance("missing_tick", self.missing_ticks):
+            self._error = (-1, "no tick")
+            return None
+        return super().symbol_info_tick(symbol)
+
+    def order_send(self, request):
+        self._wait("order_send")
+        sym = self.symbols.get(request.get("symbol"))
+        quote = self._quote(sym) if sym else None
+        action = request.get("action")
+        if action == C.TRADE_ACTION_DEAL and self._chance("requote", self.requote):
+            return self._fail(C.TRADE_RETCODE_REQUOTE, request, "Requote", quote)
+        if action == C.TRADE_ACTION_SLTP and self._chance("no_changes", self.no_changes):
+            return self._fail(C.TRADE_RETCODE_NO_CHANGES, request, "No changes", quote)
+        return super().order_send(request)
+
+
+def _with_latency(name, errors=False):
+    method = getattr(SimBroker, name)
+
+    def call(self, *args, **kwargs):
+        if errors and self._chance("rates_error", self.rates_errors):
+            self._wait(name)
+            self._error = (-1, "terminal: call failed")
+            return None
+        result = method(self, *args, **kwargs)
+        self._wait(name, len(result) if isinstance(result, (tuple, np.ndarray)) else 0)
+        return result
+
+    call.__name__ = name
+    return call
+
+
+for _name in LATENCY_MS:
+    if _name not in ("symbol_info_tick", "order_send"):
+        setattr(LoadBroker, _name, _with_latency(_name, errors=_name.startswith("copy_rates")))
+
+
+def open_positions(broker, strategies, share, seed=0):
+    """Открывает позиции стратегий по доле символов (до замера, без задержек)."""
+    rng = np.random.default_rng(seed + 2)
+    names = list(broker.symbols)
+    for symbol in rng.choice(names, size=int(len(names) * share), replace=False):
+        strategy = strategies[int(rng.integers(len(strategies)))]
+        info = broker.symbol_info(symbol)
+        buy = bool(rng.integers(2))
+        distance = 300 * info.point
+        price = info.ask if buy else info.bid
+        broker.order_send({
+            "action": C.TRADE_ACTION_DEAL, "symbol": symbol, "volume": 0.01,
+            "type": C.ORDER_TYPE_BUY if buy else C.ORDER_TYPE_SELL, "price": price,
+            "sl": price - distance if buy else price + distance, "tp": price + 2 * distance if buy else price - 2 * distance,
+            "deviation": 10, "magic": MAGIC_NUMBERS.get(strategy, 0), "comment": f"{strategy}_entry",
+        })
+
+
+def measure(n, options):
+    """Замер одного размера вселенной (в отдельном процессе): времена циклов и разбивка по этапам и вызовам MT5."""
+    cycles, warmup = options["cycles"], options["warmup"]
+    rates, points, ticks = make_universe(n, HISTORY + warmup + cycles + 2, warmup + cycles + 2, options["seed"])
+    broker = LoadBroker(rates, points=points, ticks_by_symbol=ticks, timeframe=BASE_TIMEFRAME,
+                        balance=1_000_000.0, latency_scale=options["latency_scale"], jitter=options["jitter"],
+                        requote=options["requote"], no_changes=options["no_changes"],
+                        missing_ticks=options["missing_ticks"], rates_errors=options["rates_errors"],
+                        seed=options["seed"])
+    broker.k = HISTORY - 1
+    open_positions(broker, options["strategies"], options["positions"], options["seed"])
+
+    # логгер, журнал сделок и метрики пишут в logs/ рабочего каталога — уводим их во временный
+    workdir = tempfile.mkdtemp(prefix="load_")
+    os.chdir(workdir)
+    install(broker)
+    from core.metrics import metrics, instrument_mt5
+    from core.bot import Bot
+    from core.executor import TraderExecutor
+    from core.journal import journal
+    from backtest.run import STRATEGIES
+    from utils.logger import set_level
+    set_level(logging.CRITICAL)
+    instrument_mt5()
+
+    pairs = [(STRATEGIES[name], symbol) for name in options["strategies"] for symbol in broker.symbols]
+    times = []
+    try:
+        with open(os.devnull, "w") as sink, redirect_stdout(sink):
+            bot = Bot(pairs, log_foreign=False, executor=TraderExecutor(options["mode"], options["workers"]),
+                      clock=broker)
+            bot.start_monitor(thread=False)
+            groups = bot.traders_by_timeframe()
+            broker.injecting = True
+            for cycle in range(warmup + cycles):
+                if cycle == warmup:
+                    stages_before = metrics.totals("trader_stage_seconds", "stage")
+                    calls_before = metrics.totals("mt5_call_seconds", "function")
+                    injected_before, waited_before = Counter(broker.injected), broker.waited
+                    cpu_before = time.process_time()
+                started = time.perf_counter()
+                for timeframe, group in groups.items():
+                    bot.run_entries(group, timeframe)
+                bot.run_management()
+                if bot.monitor:
+                    bot.monitor.poll()
+                if cycle >= warmup:
+                    times.append(time.perf_counter() - started)
+                # рынок проходит бар без задержек — это не время бота
+                broker.injecting = False
+                broker.advance()
+                broker.injecting = True
+            cpu = time.process_time() - cpu_before
+            stages_after = metrics.totals("trader_stage_seconds", "stage")
+            calls_after = metrics.totals("mt5_call_seconds", "function")
+            bot.shutdown()
+    finally:
+        journal.close()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def per_cycle(after, before):
+        return {key: {"calls": (count - before.get(key, (0, 0.0))[0]) / cycles,
+                      "seconds": (total - before.get(key, (0, 0.0))[1]) / cycles}
+                for key, (count, total) in after.items() if count > before.get(key, (0, 0.0))[0]}
+
+    times = np.array(times)
+    return {
+        "symbols": n,
+        "traders": len(pairs),
+        "positions": len(broker.positions),
+        "cycle_p50": float(np.median(times)),
+        "cycle_p95": float(np.percentile(times, 95)),
+        "cycle_max": float(times.max()),
+        "cpu_per_cycle": cpu / cycles,
+        "mt5_wait_per_cycle": (broker.waited - waited_before) / cycles,
+        "stages": per_cycle(stages_after, stages_before),
+        "mt5": per_cycle(calls_after, calls_before),
+        "injected": dict(broker.injected - injected_before),
+    }
+
+
+def capacity(results, budget):
+    """Линейная модель цикл = a + b·N по медианам: (a, b, максимум N в бюджете или None)."""
+    ns = np.array([r["symbols"] for r in results], dtype=float)
+    ts = np.array([r["cycle_p50"] for r in results])
+    if len(ns) < 2:
+        b = ts[0] / ns[0] if len(ns) else 0.0
+        a = 0.0
+    else:
+        b, a = np.polyfit(ns, ts, 1)
+    n_max = int((budget - a) / b) if b > 0 and budget > a else None
+    return float(a), float(b), n_max
+
+
+def print_report(results, budget):
+    print(f"\n{'Символов':>9} {'трейдеров':>10} {'цикл p50, с':>12} {'p95, с':>8} {'CPU, %':>7} {'ожидание MT5, %':>16} "
+          f"{'на символ, мс':>14}")
+    print("-" * 82)
+    for r in results:
+        p50 = r["cycle_p50"]
+        print(f"{r['symbols']:>9} {r['traders']:>10} {p50:>12.3f} {r['cycle_p95']:>8.3f} "
+              f"{r['cpu_per_cycle'] / p50 * 100:>7.0f} {r['mt5_wait_per_cycle'] / p50 * 100:>16.0f} "
+              f"{p50 / r['symbols'] * 1000:>14.2f}")
+
+    # куда уходит время: этапы трейдеров и вызовы MT5, мс на цикл
+    print(f"\nКуда уходит время, мс на цикл (этапы — сумма по трейдерам всех потоков; MT5 — вызовов на цикл в скобках):")
+    header = "".join(f"{r['symbols']:>16}" for r in results)
+    print(f"{'':<28}{header}")
+    stages = sorted({key for r in results for key in r["stages"]},
+                    key=lambda key: -results[-1]["stages"].get(key, {}).get("seconds", 0.0))
+    for stage in stages:
+        cells = "".join(f"{r['stages'].get(stage, {}).get('seconds', 0.0) * 1000:>16,.1f}" for r in results)
+        print(f"{'этап ' + stage:<28}{cells}")
+    functions = sorted({key for r in results for key in r["mt5"]},
+                       key=lambda key: -results[-1]["mt5"].get(key, {}).get("seconds", 0.0))
+    for function in functions:
+        cells = "".join(f"{r['mt5'].get(function, {}).get('seconds', 0.0) * 1000:>9,.1f} "
+                        f"({r['mt5'].get(function, {}).get('calls', 0.0):>4,.0f})" for r in results)
+        print(f"{'MT5 ' + function:<28}{cells}")
+    injected = Counter()
+    for r in results:
+        injected.update(r["injected"])
+    if injected:
+        print(f"\nВнесённые ошибки: {dict(injected)}")
+
+    a, b, n_max = capacity(results, budget)
+    fits = [r["symbols"] for r in results if r["cycle_p95"] <= budget]
+    print(f"\n📐 Модель: цикл ≈ {a:.3f} с + {b * 1000:.2f} мс × символов")
+    print(f"⏱ Бюджет цикла {budget:g} с: замерено в бюджете (p95) до {max(fits) if fits else 0} символов, "
+          f"по модели — до {n_max if n_max is not None else 'не ограничено'}")
+    return a, b, n_max
+
+
+def run(args):
+    options = {
+        "cycles": args.cycles, "warmup": args.warmup, "seed": args.seed, "strategies": args.strategies,
+        "mode": args.mode, "workers": args.workers, "latency_scale": args.latency_scale, "jitter": args.jitter,
+        "requote": args.requote, "no_changes": args.no_changes, "missing_ticks": args.missing_ticks,
+        "rates_errors": args.rates_errors, "positions": args.positions,
+    }
+    print(f"🏋️ Нагрузка: {len(args.strategies)} стратегий, режим {args.mode} ({args.workers} потоков), "
+          f"задержки ×{args.latency_scale}, бюджет {args.budget} с")
+    results = []
+    # каждый размер — в свежем процессе: синглтоны бота (кэши, снимки, метрики) не переносятся
+    context = multiprocessing.get_context("spawn")
+    for n in sorted(args.symbols):
+        with context.Pool(1) as pool:
+            result = pool.apply(measure, (n, options))
+        results.append(result)
+        print(f"  {n:>5} символов: цикл p50 {result['cycle_p50']:.3f} с, p95 {result['cycle_p95']:.3f} с")
+    a, b, n_max = print_report(results, args.budget)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"options": options, "budget": args.budget, "results": results,
+                       "model": {"intercept_sec": a, "per_symbol_sec": b, "max_symbols": n_max}},
+                      file, ensure_ascii=False, indent=2)
+        print(f"💾 Отчёт: {args.out}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[10, 50, 100, 250, 500, 1000])
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGY_ALLOCATION))
+    parser.add_argument("--cycles", type=int, default=3, help="замеряемых циклов на размер")
+    parser.add_argument("--warmup", type=int, default=1, help="циклов прогрева (полная загрузка кэшей)")
+    parser.add_argument("--budget", type=float, default=MANAGE_INTERVAL_SEC, help="бюджет цикла, сек")
+    parser.add_argument("--mode", choices=("sequential", "threads"), default=EXECUTION_MODE)
+    parser.add_argument("--workers", type=int, default=EXECUTION_WORKERS)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="множитель задержек LATENCY_MS (0 — без задержек)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="сигма логнормального разброса задержек")
+    parser.add_argument("--requote", type=float, default=0.05, help="доля реквотов order_send")
+    parser.add_argument("--no-changes", type=float, default=0.2, help="доля TRADE_RETCODE_NO_CHANGES на SL/TP")
+    parser.add_argument("--missing-ticks", type=float, default=0.01, help="доля пустых symbol_info_tick")
+    parser.add_argument("--rates-errors", type=float, default=0.0, help="доля None из copy_rates_*")
+    parser.add_argument("--positions", type=float, default=0.3, help="доля символов с открытой позицией")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON с результатами")
+    run(parser.parse_args())
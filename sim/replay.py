@@ -0,0 +1,197 @@
+"""
+Реплей настоящих трейдеров (core.bot.Bot) на записанных барах через симулятор брокера.
+
+    python -m sim.replay --data data/ [--symbols EURUSDrfd ...] [--strategies VWAPStrategy ...]
+                         [--from 2024-01-01] [--to 2024-06-01] [--spread 10] [--slippage 3]
+                         [--stops-level 10] [--ticks] [--balance 10000] [--out sim_results] [--verbose]
+
+В отличие от backtest.run работает вся боевая логика: H4-фильтр, ATR-лот, MIN_ENTRY_INTERVAL_SEC,
+безубыток и трейлинг, нормализация SL/TP в send_order. Шаг реплея — открытие бара M5:
+по закрытию бара своего таймфрейма трейдеры проверяют входы, затем идёт сопровождение,
+после чего брокер проводит цену через бар. Тики (--ticks, файлы <SYMBOL>_ticks.npy с полями
+time_msc, bid, ask, а без них — журнал store.ticks) уточняют исполнение SL/TP внутри бара.
+
+Логи, журнал сделок и сделки брокера (deals.csv) пишутся в каталог --out, эквити — в equity.npy.
+В конце журнал сверяется с историей брокера (reconcile): каждая закрытая позиция должна
+стать сделкой отчёта report.engine, открытая — входом без выхода; расхождение — код выхода 1.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.settings import SYMBOLS, STRATEGY_ALLOCATION, MAGIC_NUMBERS, RISK_LEDGER_PATH, JOURNAL_PATH
+from backtest.data import find_rates, estimate_point
+from sim.broker import SimBroker, install
+from store.ticks import tick_store
+
+BASE_TIMEFRAME = 5   # M5 — самый мелкий таймфрейм стратегий
+
+
+def load_broker(data_dir, symbols, date_from=None, date_to=None, ticks=False, **options):
+    rates_by_symbol, points, ticks_by_symbol = {}, {}, {}
+    start = int(date_from.timestamp()) if date_from else None
+    end = int(date_to.timestamp()) if date_to else None
+    for symbol in symbols:
+        rates = find_rates(data_dir, symbol, BASE_TIMEFRAME)
+        if rates is None or not len(rates):
+            print(f"⚠️ {symbol}: нет баров M5 в {data_dir}")
+            continue
+        if start is not None:
+            rates = rates[rates['time'] >= start]
+        if end is not None:
+            rates = rates[rates['time'] < end]
+        if not len(rates):
+            continue
+        rates_by_symbol[symbol] = rates
+        points[symbol] = estimate_point(rates)
+        path = os.path.join(data_dir, f"{symbol}_ticks.npy")
+        if ticks and os.path.isfile(path):
+            ticks_by_symbol[symbol] = np.load(path)
+        elif ticks:
+            end_msc = (int(rates['time'][-1]) + BASE_TIMEFRAME * 60) * 1000
+            recorded = tick_store.read(symbol, int(rates['time'][0]) * 1000, end_msc)
+            if len(recorded):
+                ticks_by_symbol[symbol] = recorded
+    if not rates_by_symbol:
+        return None
+    return SimBroker(rates_by_symbol, timeframe=BASE_TIMEFRAME, points=points, ticks_by_symbol=ticks_by_symbol,
+                     **options)
+
+
+def write_deals(path, deals):
+    with open(path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["ticket", "time", "symbol", "magic", "position", "side", "entry", "reason",
+                         "volume", "price", "profit", "commission", "comment"])
+        for deal in deals:
+            writer.writerow([deal.ticket, datetime.utcfromtimestamp(deal.time).isoformat(), deal.symbol, deal.magic,
+                             deal.position_id, "buy" if deal.type == 0 else "sell",
+                             "in" if deal.entry == 0 else "out", deal.reason, deal.volume, round(deal.price, 6),
+                             round(deal.profit, 2), round(deal.commission, 2), deal.comment])
+
+
+def run(broker, strategies, out_dir, verbose=False):
+    # логгер и трейдеры пишут в logs/ относительно рабочего каталога — уводим их из боевых логов
+    os.makedirs(out_dir, exist_ok=True)
+    out_dir = os.path.abspath(out_dir)
+    os.chdir(out_dir)
+    # курсор книги риска и журнал от прошлого прогона в этом каталоге — из другой истории
+    for path in (RISK_LEDGER_PATH, JOURNAL_PATH, JOURNAL_PATH + "-wal", JOURNAL_PATH + "-shm"):
+        if os.path.isfile(path):
+            os.remove(path)
+    install(broker)
+
+    # модули бота импортируются только после подмены MetaTrader5
+    import logging
+    from contextlib import redirect_stdout
+    from core.bot import Bot
+    from core.executor import TraderExecutor
+    from backtest.run import STRATEGIES
+    from utils.logger import set_level
+
+    pairs = [(STRATEGIES[name], symbol) for name in strategies for symbol in broker.symbols]
+    if not verbose:
+        set_level(logging.ERROR)
+    sink = sys.stdout if verbose else open(os.devnull, "w")
+
+    started = time.perf_counter()
+    with redirect_stdout(sink):
+        bot = Bot(pairs, executor=TraderExecutor("sequential", 1), clock=broker)
+        # монитор позиций в реплее — проход на каждом шаге, без своего потока
+        bot.start_monitor(thread=False)
+        groups = bot.traders_by_timeframe()
+        try:
+            while True:
+                for timeframe, group in groups.items():
+                    if broker.bar_closed(timeframe):
+                        bot.run_entries(group, timeframe)
+                bot.run_management()
+                if bot.monitor:
+                    bot.monitor.poll()
+                if not broker.advance():
+                    break
+        finally:
+            bot.shutdown()
+    elapsed = time.perf_counter() - started
+    if sink is not sys.stdout:
+        sink.close()
+
+    bars = int(sum(sym.open_now.sum() for sym in broker.symbols.values()))
+    write_deals(os.path.join(out_dir, "deals.csv"), broker.deals)
+    np.save(os.path.join(out_dir, "equity.npy"),
+            np.rec.fromarrays([broker.timeline, broker.equity_curve], names="time,equity"))
+
+    account = broker.account_info()
+    print(f"\n{'Стратегия':<24} {'Сделок':>7} {'PnL':>12}")
+    print("-" * 45)
+    for name in strategies:
+        magic = MAGIC_NUMBERS.get(name, 0)
+        closed = [d for d in broker.deals if d.magic == magic and d.entry == 1]
+        pnl = sum(d.profit + d.commission for d in closed)
+        print(f"{name:<24} {len(closed):>7} {pnl:>12.2f}")
+    if broker.rejections:
+        print(f"⚠️ Ответы брокера кроме DONE (retcode: кол-во): {broker.rejections}")
+    print(f"💰 Баланс {account.balance:.2f}, эквити {account.equity:.2f}, открыто позиций {len(broker.positions)}")
+    print(f"⏱ {bars} баров ({len(pairs)} пар, {broker.steps} шагов) за {elapsed:.2f} сек "
+          f"({bars / max(elapsed, 1e-9):,.0f} баров/сек)")
+    return broker
+
+
+def reconcile(broker, strategies):
+    """Сверка журнала (report.engine) с историей брокера по стратегиям. True — всё сошлось."""
+    from core.journal import journal
+    from report.engine import ReportEngine
+
+    journal.flush()
+    engine = ReportEngine(JOURNAL_PATH)
+    engine.rebuild()
+    trades, opened = engine.trades(), engine.open_positions()
+    mismatched = []
+    for name in strategies:
+        magic = MAGIC_NUMBERS.get(name, 0)
+        closed = {d.position_id for d in broker.deals if d.magic == magic and d.entry == 1}
+        still_open = sum(pos['magic'] == magic for pos in broker.positions.values())
+        got = ((trades['strategy'] == name).sum(), (opened['strategy'] == name).sum())
+        if got != (len(closed), still_open):
+            mismatched.append(f"{name}: отчёт {got[0]}/{got[1]}, брокер {len(closed)}/{still_open}")
+    if mismatched:
+        print(f"❌ Журнал не сходится с историей брокера (закрытых/открытых): {'; '.join(mismatched)}")
+    else:
+        print(f"🧾 Журнал сходится с историей брокера: сделок {len(trades)}, входов без выхода {len(opened)}")
+    return not mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="каталог с файлами <SYMBOL>_M5.npy/.csv")
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGY_ALLOCATION))
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--spread", type=int, default=None, help="фиксированный спред, пунктов (по умолчанию — из баров)")
+    parser.add_argument("--slippage", type=int, default=0, help="максимальное проскальзывание, пунктов")
+    parser.add_argument("--stops-level", type=int, default=10, help="trade_stops_level брокера, пунктов")
+    parser.add_argument("--commission", type=float, default=0.0, help="комиссия за лот")
+    parser.add_argument("--balance", type=float, default=10000.0)
+    parser.add_argument("--leverage", type=int, default=100)
+    parser.add_argument("--ticks", action="store_true", help="исполнять SL/TP по тикам (<SYMBOL>_ticks.npy или журнал store.ticks)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="sim_results")
+    parser.add_argument("--verbose", action="store_true", help="вывод трейдеров и логгера как в боевом режиме")
+    args = parser.parse_args()
+    broker = load_broker(os.path.abspath(args.data), args.symbols, args.date_from, args.date_to, ticks=args.ticks,
+                         spread_points=args.spread, slippage_points=args.slippage, stops_level=args.stops_level,
+                         commission_per_lot=args.commission, balance=args.balance, leverage=args.leverage,
+                         seed=args.seed)
+    if broker is None:
+        sys.exit("❌ Нет данных для реплея")
+    run(broker, args.strategies, args.out, verbose=args.verbose)
+    sys.exit(0 if reconcile(broker, args.strategies) else 1)
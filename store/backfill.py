@@ -0,0 +1,188 @@
+"""
+Загрузка истории баров из терминала в хранилище store.bars.
+
+    python -m store.backfill --symbols EURUSDrfd GBPUSDrfd --timeframes M1 M5 H4 --from 2020-01-01
+                             [--to 2024-01-01] [--workers 4] [--root bars]
+    python -m store.backfill --timeframes M5          # только дописать новые бары
+    python -m store.backfill --list
+
+История режется на куски по BACKFILL_CHUNK_BARS баров и загружается пулом процессов,
+у каждого своё подключение к терминалу. Кусок сохраняется в <root>/<SYMBOL>/<TF>.parts/
+сразу после загрузки, поэтому прерванная загрузка продолжается с места остановки:
+куски, уже лежащие на диске или покрытые основным файлом, не запрашиваются повторно.
+Когда все куски пары готовы, они вливаются в основной файл (дозаписью, если они новее
+сохранённого, иначе — слиянием). Без --from загружается только хвост от последнего
+сохранённого бара до текущего момента. Текущий (незакрытый) бар не сохраняется.
+"""
+import argparse
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import multiprocessing as mp
+import numpy as np
+from config.settings import SYMBOLS, BAR_STORE_DIR, BACKFILL_WORKERS, BACKFILL_CHUNK_BARS
+from store.bars import BarStore, EXTENSION
+from utils.helpers import RATES_DTYPE, timeframe_name, timeframe_seconds, parse_timeframe
+
+_mt5 = None
+
+
+def _init_worker():
+    global _mt5
+    import MetaTrader5 as mt5
+    if not mt5.initialize():
+        raise RuntimeError(f"MT5 initialize: {mt5.last_error()}")
+    _mt5 = mt5
+
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def fetch_chunk(symbol, timeframe, start, end, path):
+    """Бары [start, end) через copy_rates_range -> файл куска. Возвращает число баров."""
+    rates = _mt5.copy_rates_range(symbol, timeframe, _utc(start), _utc(end - 1))
+    if rates is None:
+        raise RuntimeError(f"{symbol} {timeframe_name(timeframe)}: copy_rates_range: {_mt5.last_error()}")
+    tick = _mt5.symbol_info_tick(symbol)
+    if tick is not None:
+        # незакрытый бар попал бы в хранилище недописанным
+        rates = rates[rates['time'] + timeframe_seconds(timeframe) <= tick.time]
+    rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rates.tofile(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return len(rates)
+
+
+def parts_dir(store, symbol, timeframe):
+    return store.path(symbol, timeframe)[:-len(EXTENSION)] + ".parts"
+
+
+def plan(store, symbol, timeframe, start, end):
+    """Куски [from, to) пары, которых ещё нет ни в основном файле, ни среди готовых кусков."""
+    period = timeframe_seconds(timeframe)
+    span = store.time_range(symbol, timeframe)
+    if start is None:
+        if span is None:
+            return []
+        start = span[1] + period
+    chunk = BACKFILL_CHUNK_BARS * period
+    folder = parts_dir(store, symbol, timeframe)
+    chunks = []
+    # границы кусков выровнены по chunk — при повторном запуске имена совпадают
+    a = start - start % chunk
+    while a < end:
+        b = a + chunk
+        lo, hi = max(a, start), min(b, end)
+        covered = span is not None and span[0] <= lo and hi <= span[1] + period
+        path = os.path.join(folder, f"{lo}_{hi}{EXTENSION}")
+        if not covered and not os.path.isfile(path):
+            chunks.append((lo, hi, path))
+        a = b
+    return chunks
+
+
+def finalize(store, symbol, timeframe):
+    """Вливает готовые куски пары в основной файл и удаляет их."""
+    folder = parts_dir(store, symbol, timeframe)
+    paths = sorted(glob.glob(os.path.join(folder, "*" + EXTENSION)),
+                   key=lambda path: int(os.path.basename(path).split("_")[0]))
+    if not paths:
+        return 0
+    chunks = [np.fromfile(path, dtype=RATES_DTYPE) for path in paths]
+    span = store.time_range(symbol, timeframe)
+    newer = all(not len(chunk) or span is None or chunk['time'][0] > span[1] for chunk in chunks)
+    before = len(store.bars(symbol, timeframe))
+    if newer:
+        for chunk in chunks:
+            store.append(symbol, timeframe, chunk)
+    else:
+        store.merge(symbol, timeframe, chunks)
+    shutil.rmtree(folder)
+    return len(store.bars(symbol, timeframe)) - before
+
+
+def backfill(symbols, timeframes, start=None, end=None, workers=BACKFILL_WORKERS, root=BAR_STORE_DIR):
+    store = BarStore(root)
+    # конец по умолчанию — с запасом на смещение времени сервера; будущих баров терминал не вернёт
+    end = end or int(time.time()) + 86400
+    pending, jobs = {}, []
+    for symbol in symbols:
+        for timeframe in timeframes:
+            if start is None and store.time_range(symbol, timeframe) is None:
+                print(f"⚠️ {symbol} {timeframe_name(timeframe)}: в хранилище пусто — укажите --from")
+                continue
+            chunks = plan(store, symbol, timeframe, start, end)
+            pending[(symbol, timeframe)] = len(chunks)
+            jobs += [(symbol, timeframe, *chunk) for chunk in chunks]
+    print(f"📥 {len(jobs)} кусков для {len(pending)} пар (символ, таймфрейм), процессов {workers}")
+
+    started = time.perf_counter()
+    failed = set()
+    loaded = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker) as pool:
+            futures = [(job[:2], pool.submit(fetch_chunk, *job)) for job in jobs]
+            for done, (key, future) in enumerate(futures, 1):
+                try:
+                    loaded += future.result()
+                except Exception as error:
+                    # готовые куски остаются на диске — повторный запуск догрузит остальные
+                    failed.add(key)
+                    print(f"❌ {error}")
+                if done % max(1, len(futures) // 20) == 0:
+                    print(f"   … {done}/{len(futures)} кусков, {loaded} баров, "
+                          f"{time.perf_counter() - started:.1f} сек")
+
+    for symbol, timeframe in pending:
+        name = f"{symbol} {timeframe_name(timeframe)}"
+        if (symbol, timeframe) in failed:
+            print(f"⚠️ {name}: загружено не всё, перезапустите для продолжения")
+            continue
+        added = finalize(store, symbol, timeframe)
+        span = store.time_range(symbol, timeframe)
+        if span:
+            print(f"✅ {name}: +{added} баров, всего {len(store.bars(symbol, timeframe))} "
+                  f"({_utc(span[0]):%Y-%m-%d} — {_utc(span[1]):%Y-%m-%d %H:%M})")
+    elapsed = time.perf_counter() - started
+    print(f"⏱ {loaded} баров за {elapsed:.1f} сек ({loaded / max(elapsed, 1e-9):,.0f} баров/сек)")
+    return not failed
+
+
+def list_store(root=BAR_STORE_DIR):
+    store = BarStore(root)
+    print(f"{'Символ':<12} {'TF':<4} {'Баров':>10} {'С':<17} {'По':<17} {'МБ':>8}")
+    for symbol in store.symbols():
+        for timeframe in store.timeframes(symbol):
+            span = store.time_range(symbol, timeframe)
+            if span is None:
+                continue
+            size = os.path.getsize(store.current(symbol, timeframe)) / 2 ** 20
+            print(f"{symbol:<12} {timeframe_name(timeframe):<4} {len(store.bars(symbol, timeframe)):>10} "
+                  f"{_utc(span[0]):%Y-%m-%d %H:%M} {_utc(span[1]):%Y-%m-%d %H:%M} {size:>8.1f}")
+
+
+def _date(text):
+    return int(datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--timeframes", nargs="+", default=["M5"], type=parse_timeframe)
+    parser.add_argument("--from", dest="start", type=_date, default=None,
+                        help="начало истории (без него — только новые бары)")
+    parser.add_argument("--to", dest="end", type=_date, default=None)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--root", default=BAR_STORE_DIR)
+    parser.add_argument("--list", action="store_true", help="показать содержимое хранилища")
+    args = parser.parse_args()
+    if args.list:
+        list_store(args.root)
+    elif not backfill(args.symbols, args.timeframes, args.start, args.end, args.workers, args.root):
+        raise SystemExit(1)
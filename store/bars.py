@@ -0,0 +1,177 @@
+"""
+Локальное хранилище баров: один файл на (символ, таймфрейм) — <root>/<SYMBOL>/<TF>.bars.
+
+Файл — подряд записанные бары в dtype copy_rates_* (utils.helpers.RATES_DTYPE) без заголовка,
+отсортированные по времени. Чтение — через np.memmap: диапазон возвращается срезом
+без копирования, годы M1 не загружаются в память целиком. Запись — только дозаписью
+в конец (append) или новым поколением файла (merge, для истории старше уже сохранённой):
+<TF>.1.bars, <TF>.2.bars, … — читается последнее. Заменять файл на месте нельзя: на Windows
+rename поверх файла, отображённого читателем, падает. Старые поколения удаляются, когда
+их больше никто не держит. Писатель один (store.backfill), читателей сколько угодно.
+"""
+import os
+import numpy as np
+from config.settings import BAR_STORE_DIR
+from utils.helpers import RATES_DTYPE, timeframe_name, parse_timeframe
+
+EXTENSION = ".bars"
+
+
+def _generation(filename, name):
+    """Номер поколения файла <name>[.<N>].bars или None, если файл не этого таймфрейма."""
+    if not filename.endswith(EXTENSION):
+        return None
+    stem = filename[:-len(EXTENSION)]
+    if stem == name:
+        return 0
+    base, _, number = stem.rpartition(".")
+    return int(number) if base == name and number.isdigit() else None
+
+
+def _timestamp(value):
+    return None if value is None else int(value.timestamp()) if hasattr(value, "timestamp") else int(value)
+
+
+class BarStore:
+    def __init__(self, root=BAR_STORE_DIR):
+        self.root = root
+        self._maps = {}     # путь -> ((размер, mtime) файла, memmap)
+
+    def path(self, symbol, timeframe):
+        """Имя файла первого поколения (от него же считаются каталоги кусков store.backfill)."""
+        return os.path.join(self.root, symbol, timeframe_name(timeframe) + EXTENSION)
+
+    def _generations(self, symbol, timeframe):
+        """[(номер, путь)] поколений файла пары по возрастанию."""
+        folder = os.path.join(self.root, symbol)
+        name = timeframe_name(timeframe)
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return []
+        found = ((_generation(filename, name), filename) for filename in names)
+        return sorted((number, os.path.join(folder, filename)) for number, filename in found if number is not None)
+
+    def current(self, symbol, timeframe):
+        """Путь к последнему поколению файла пары или None, если данных нет."""
+        generations = self._generations(symbol, timeframe)
+        return generations[-1][1] if generations else None
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def timeframes(self, symbol):
+        folder = os.path.join(self.root, symbol)
+        if not os.path.isdir(folder):
+            return []
+        names = {name[:-len(EXTENSION)].split(".")[0] for name in os.listdir(folder) if name.endswith(EXTENSION)}
+        return sorted(map(parse_timeframe, names), key=lambda tf: (tf & 0xC000, tf & 0x3FFF))
+
+    # ── чтение ────────────────────────────────────────────────────────
+    def bars(self, symbol, timeframe):
+        """Все бары файла (memmap только для чтения; пустой массив, если файла нет)."""
+        # поколение могли удалить между listdir и stat — тогда уже есть следующее
+        for _ in range(2):
+            path = self.current(symbol, timeframe)
+            try:
+                stat = os.stat(path) if path else None
+                break
+            except OSError:
+                stat = None
+        if stat is None:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        count = stat.st_size // RATES_DTYPE.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        version = (stat.st_size, stat.st_mtime_ns)
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != version:
+            # файл дописан или заменён — отображаем заново
+            cached = self._maps[path] = (version, np.memmap(path, dtype=RATES_DTYPE, mode="r", shape=(count,)))
+        # view без подкласса memmap: срезы дешевле, память та же
+        return cached[1].view(np.ndarray)
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        """Бары с time в [start, end) — срез без копирования. start/end — datetime или секунды."""
+        bars = self.bars(symbol, timeframe)
+        start, end = _timestamp(start), _timestamp(end)
+        first = np.searchsorted(bars['time'], start) if start is not None else 0
+        last = np.searchsorted(bars['time'], end) if end is not None else len(bars)
+        return bars[first:last]
+
+    def tail(self, symbol, timeframe, count):
+        """Последние count баров (как copy_rates_from_pos(symbol, tf, 0, count) без текущего бара)."""
+        bars = self.bars(symbol, timeframe)
+        return bars[max(len(bars) - count, 0):]
+
+    def time_range(self, symbol, timeframe):
+        """(первое, последнее) время баров или None, если данных нет."""
+        bars = self.bars(symbol, timeframe)
+        return (int(bars['time'][0]), int(bars['time'][-1])) if len(bars) else None
+
+    # ── запись ────────────────────────────────────────────────────────
+    def _release(self, path):
+        self._maps.pop(path, None)
+
+    def append(self, symbol, timeframe, rates):
+        """Дозапись баров новее последнего сохранённого; возвращает число записанных."""
+        rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+        span = self.time_range(symbol, timeframe)
+        if span is not None:
+            rates = rates[rates['time'] > span[1]]
+        if not len(rates):
+            return 0
+        rates = np.sort(rates, order="time")
+        # дозапись в конец открытого читателями файла допустима и на Windows
+        path = self.current(symbol, timeframe) or self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._truncate_partial(path)
+        with open(path, "ab") as file:
+            file.write(rates.tobytes())
+        return len(rates)
+
+    def merge(self, symbol, timeframe, chunks):
+        """
+        Объединение сохранённых баров с новыми кусками (любого периода): сортировка,
+        дубликаты по времени — в пользу новых данных. Результат — новое поколение файла:
+        читатели, отобразившие прежнее, дочитывают его, следующий bars() откроет новое.
+        """
+        parts = [np.asarray(chunk).astype(RATES_DTYPE, copy=False) for chunk in chunks if len(chunk)]
+        if not parts:
+            return 0
+        merged = np.concatenate(parts + [self.bars(symbol, timeframe)])
+        # np.unique оставляет первое вхождение — новые куски стоят впереди сохранённых
+        _, first = np.unique(merged['time'], return_index=True)
+        merged = merged[first]
+        generations = self._generations(symbol, timeframe)
+        number = generations[-1][0] + 1 if generations else 0
+        path = self.path(symbol, timeframe)
+        if number:
+            path = f"{path[:-len(EXTENSION)]}.{number}{EXTENSION}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # временный файл под новым именем никем не отображён — rename проходит и на Windows
+        temp = path + ".tmp"
+        merged.tofile(temp)
+        os.replace(temp, path)
+        for _, old in generations:
+            self._release(old)
+            try:
+                os.remove(old)
+            except OSError:
+                # отображён другим процессом (Windows) — удалится при следующем merge
+                pass
+        return len(merged)
+
+    @staticmethod
+    def _truncate_partial(path):
+        # хвост от прерванной записи (неполный бар) отрезаем, чтобы не сдвинуть все следующие записи
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        extra = size % RATES_DTYPE.itemsize
+        if extra:
+            with open(path, "r+b") as file:
+                file.truncate(size - extra)
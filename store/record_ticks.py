@@ -0,0 +1,156 @@
+"""
+Запись тиков всех символов в журнал store.ticks.
+
+    python -m store.record_ticks [--symbols EURUSDrfd ...] [--root ticks]
+
+Каждые TICK_POLL_SEC новые тики символа забираются одним copy_ticks_from от последнего
+записанного (терминал принимает время с точностью до секунды — уже записанные тики этой
+секунды отбрасываются по time_msc и счётчику). Накопленное сбрасывается блоком раз
+в TICK_FLUSH_SEC, поэтому на диск уходит один блок в несколько секунд на символ,
+а CPU тратится только на векторное преобразование массивов терминала.
+При перезапуске запись продолжается с последнего тика в журнале.
+"""
+import argparse
+import signal
+import time
+from datetime import datetime, timezone
+import numpy as np
+import MetaTrader5 as mt5
+from config.settings import SYMBOLS, TICK_STORE_DIR, TICK_POLL_SEC, TICK_FLUSH_SEC
+from core.mt5_wrapper import initialize_mt5, shutdown_mt5
+from store.ticks import TickStore, TickWriter, TICK_DTYPE, day_of
+from utils.logger import file_logger
+
+# за один запрос — не больше стольких тиков (догрузка после простоя идёт несколькими запросами)
+_BATCH = 100000
+
+
+def convert(raw):
+    """Массив copy_ticks_* -> TICK_DTYPE."""
+    ticks = np.empty(len(raw), dtype=TICK_DTYPE)
+    for name in TICK_DTYPE.names:
+        ticks[name] = raw[name]
+    return ticks
+
+
+class SymbolRecorder:
+    def __init__(self, store, symbol):
+        self.store = store
+        self.symbol = symbol
+        self.writer = None
+        self.day = None
+        self.buffer = []
+        self.last_msc = None      # время последнего принятого тика
+        self.same_msc = 0         # сколько тиков с этим time_msc уже принято
+        self.total = 0
+        self._resume()
+
+    def _resume(self):
+        days = self.store.days(self.symbol)
+        if not days:
+            return
+        self._open(days[-1])
+        if self.writer.last_time is not None:
+            tail = self.store.read(self.symbol, self.writer.last_time, self.writer.last_time + 1)
+            self.last_msc, self.same_msc = self.writer.last_time, len(tail)
+
+    def _open(self, day):
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = TickWriter(self.store.path(self.symbol, day))
+        self.day = day
+
+    def poll(self):
+        """Новые тики из терминала в буфер; возвращает их число."""
+        if self.last_msc is not None:
+            start = self.last_msc // 1000
+        else:
+            # первый запуск — с последнего тика терминала: время сервера, а не часы этой машины
+            tick = mt5.symbol_info_tick(self.symbol)
+            if tick is None or not tick.time_msc:
+                return 0
+            start = tick.time_msc // 1000
+        received = 0
+        while True:
+            raw = mt5.copy_ticks_from(self.symbol, datetime.fromtimestamp(start, tz=timezone.utc), _BATCH,
+                                      mt5.COPY_TICKS_ALL)
+            if raw is None or not len(raw):
+                return received
+            ticks = convert(raw)
+            if self.last_msc is not None:
+                # отбрасываем уже принятое: всё раньше last_msc и первые same_msc тиков с ним
+                older = np.searchsorted(ticks['time_msc'], self.last_msc)
+                equal = np.searchsorted(ticks['time_msc'], self.last_msc, side="right") - older
+                ticks = ticks[older + min(equal, self.same_msc):]
+            if len(ticks):
+                last = int(ticks['time_msc'][-1])
+                same = int((ticks['time_msc'] == last).sum())
+                self.same_msc = same + (self.same_msc if last == self.last_msc else 0)
+                self.last_msc = last
+                self.buffer.append(ticks)
+                received += len(ticks)
+            if len(raw) < _BATCH:
+                return received
+            start = self.last_msc // 1000
+
+    def flush(self):
+        if not self.buffer:
+            return
+        ticks = np.concatenate(self.buffer)
+        self.buffer = []
+        # граница суток UTC — новый файл
+        days = ticks['time_msc'] // 86_400_000
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for chunk in np.split(ticks, bounds):
+            day = day_of(int(chunk['time_msc'][0]))
+            if day != self.day:
+                self._open(day)
+            self.writer.write(chunk)
+            self.total += len(chunk)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def record(symbols, root=TICK_STORE_DIR):
+    store = TickStore(root)
+    recorders = [SymbolRecorder(store, symbol) for symbol in symbols]
+    stopping = []
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    print(f"🎙 Запись тиков: {len(recorders)} символов в {root}/, опрос {TICK_POLL_SEC} сек, "
+          f"сброс {TICK_FLUSH_SEC} сек. Ctrl+C — остановка.")
+    last_flush = last_report = time.monotonic()
+    received = 0
+    try:
+        while not stopping:
+            started = time.monotonic()
+            for recorder in recorders:
+                received += recorder.poll()
+            if started - last_flush >= TICK_FLUSH_SEC:
+                for recorder in recorders:
+                    recorder.flush()
+                last_flush = started
+            if started - last_report >= 60:
+                file_logger.info(f"🎙 тиков за минуту: {received}, всего записано "
+                                 f"{sum(recorder.total for recorder in recorders)}")
+                received = 0
+                last_report = started
+            time.sleep(max(0.0, TICK_POLL_SEC - (time.monotonic() - started)))
+    finally:
+        for recorder in recorders:
+            recorder.close()
+        print(f"⏹ Запись остановлена, записано {sum(recorder.total for recorder in recorders)} тиков")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--root", default=TICK_STORE_DIR)
+    args = parser.parse_args()
+    if initialize_mt5():
+        try:
+            record(args.symbols, args.root)
+        finally:
+            shutdown_mt5()
@@ -0,0 +1,262 @@
+"""
+Журнал тиков: дописываемый бинарный файл на символ и сутки — <root>/<SYMBOL>/<YYYYMMDD>.ticks.
+
+Файл — заголовок и последовательность блоков. Блок данных — тики одного сброса
+(TICK_DTYPE подряд), блок индекса — каждые TICK_INDEX_EVERY блоков данных, со списком
+(смещение, первый и последний time_msc, число тиков) и ссылкой на предыдущий индекс.
+Каждый блок заканчивается футером (размер блока, тип), поэтому читатель идёт с конца:
+через несколько блоков данных до последнего индекса, дальше — по цепочке индексов.
+Тики не разбираются, пока не нужны: read() находит блоки по времени и возвращает
+срез NumPy прямо из mmap.
+
+    python -m store.ticks --symbol EURUSDrfd --from 2024-01-02 --to 2024-01-03   # сводка по спреду
+"""
+import argparse
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from config.settings import TICK_STORE_DIR, TICK_INDEX_EVERY
+
+TICK_DTYPE = np.dtype([
+    ('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume_real', '<f8'), ('flags', '<u4'),
+])
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('first', '<i8'), ('last', '<i8'), ('count', '<u4')])
+
+FILE_MAGIC = b"TICKLOG1"
+DATA_TAG, INDEX_TAG = b"TDAT", b"TIDX"
+DATA_HEADER = struct.Struct("<4sIqq")     # тег, число тиков, первый и последний time_msc
+INDEX_HEADER = struct.Struct("<4sIq")     # тег, число записей, смещение предыдущего индекса (-1 — нет)
+FOOTER = struct.Struct("<I4s")            # полный размер блока, тег
+EXTENSION = ".ticks"
+
+
+def day_of(time_msc):
+    return datetime.fromtimestamp(time_msc // 1000, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def to_msc(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp() * 1000)
+    return int(value)
+
+
+class TickFile:
+    """Чтение одного файла журнала без разбора всех тиков."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.blocks = np.zeros(0, dtype=INDEX_DTYPE)
+        self.end = len(FILE_MAGIC)        # конец последнего целого блока
+        self.last_index = -1              # смещение последнего блока индекса
+        self.indexed = 0                  # сколько блоков данных покрыто индексами
+        if size >= len(FILE_MAGIC):
+            if self._map[:len(FILE_MAGIC)] != FILE_MAGIC:
+                raise ValueError(f"{path}: не журнал тиков")
+            self._locate(size)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def _footer(self, pos):
+        if pos - FOOTER.size < len(FILE_MAGIC):
+            return None
+        size, tag = FOOTER.unpack_from(self._map, pos - FOOTER.size)
+        if tag not in (DATA_TAG, INDEX_TAG) or size > pos - len(FILE_MAGIC) or size < FOOTER.size:
+            return None
+        return size, tag
+
+    def _index_entries(self, offset):
+        entries = []
+        while offset >= 0:
+            tag, count, previous = INDEX_HEADER.unpack_from(self._map, offset)
+            entries.append(np.frombuffer(self._map, dtype=INDEX_DTYPE, count=count,
+                                         offset=offset + INDEX_HEADER.size))
+            offset = previous
+        return entries[::-1]
+
+    def _locate(self, size):
+        """Все блоки данных файла: цепочка индексов + хвост блоков после последнего индекса."""
+        pos = size
+        tail = []
+        entries = []
+        while pos > len(FILE_MAGIC):
+            footer = self._footer(pos)
+            if footer is None:
+                # недописанный хвост (запись прервана) — медленный путь: проход по заголовкам с начала
+                return self._scan(size)
+            block_size, tag = footer
+            start = pos - block_size
+            if tag == INDEX_TAG:
+                entries = self._index_entries(start)
+                self.last_index = start
+                self.indexed = sum(len(part) for part in entries)
+                break
+            _, count, first, last = DATA_HEADER.unpack_from(self._map, start)
+            tail.append((start, first, last, count))
+            pos = start
+        self.blocks = np.concatenate(entries + [np.array(tail[::-1], dtype=INDEX_DTYPE)])
+        self.end = size
+
+    def _scan(self, size):
+        blocks = []
+        pos = len(FILE_MAGIC)
+        while pos + DATA_HEADER.size <= size:
+            tag = self._map[pos:pos + 4]
+            if tag == DATA_TAG:
+                _, count, first, last = DATA_HEADER.unpack_from(self._map, pos)
+                block_size = DATA_HEADER.size + count * TICK_DTYPE.itemsize + FOOTER.size
+            elif tag == INDEX_TAG:
+                _, count, _ = INDEX_HEADER.unpack_from(self._map, pos)
+                block_size = INDEX_HEADER.size + count * INDEX_DTYPE.itemsize + FOOTER.size
+            else:
+                break
+            if pos + block_size > size or self._footer(pos + block_size) != (block_size, tag):
+                break
+            if tag == DATA_TAG:
+                blocks.append((pos, first, last, count))
+            else:
+                self.last_index, self.indexed = pos, len(blocks)
+            pos += block_size
+        self.blocks = np.array(blocks, dtype=INDEX_DTYPE)
+        self.end = pos
+
+    def read(self, start=None, end=None):
+        """Тики с time_msc в [start, end) — копия только затронутых блоков."""
+        start, end = to_msc(start), to_msc(end)
+        blocks = self.blocks
+        if start is not None:
+            blocks = blocks[blocks['last'] >= start]
+        if end is not None:
+            blocks = blocks[blocks['first'] < end]
+        if not len(blocks):
+            return np.zeros(0, dtype=TICK_DTYPE)
+        parts = [np.frombuffer(self._map, dtype=TICK_DTYPE, count=int(block['count']),
+                               offset=int(block['offset']) + DATA_HEADER.size) for block in blocks]
+        ticks = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        lo = np.searchsorted(ticks['time_msc'], start) if start is not None else 0
+        hi = np.searchsorted(ticks['time_msc'], end) if end is not None else len(ticks)
+        return ticks[lo:hi]
+
+
+class TickWriter:
+    """Дозапись блоков в файл журнала; после сбоя недописанный хвост отрезается при открытии."""
+
+    def __init__(self, path, index_every=TICK_INDEX_EVERY):
+        self.path = path
+        self.index_every = index_every
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.isfile(path) or os.path.getsize(path) < len(FILE_MAGIC):
+            with open(path, "wb") as file:
+                file.write(FILE_MAGIC)
+        reader = TickFile(path)
+        blocks, end, self.last_index = reader.blocks, reader.end, reader.last_index
+        # блоки после последнего индекса попадут в следующий индекс
+        self.pending = [tuple(block) for block in blocks[reader.indexed:].tolist()]
+        self.last_time = int(blocks['last'][-1]) if len(blocks) else None
+        reader.close()
+        self.file = open(path, "r+b")
+        self.file.truncate(end)
+        self.file.seek(end)
+
+    def write(self, ticks):
+        """Один блок данных из тиков (по возрастанию time_msc)."""
+        if not len(ticks):
+            return
+        ticks = np.ascontiguousarray(ticks, dtype=TICK_DTYPE)
+        offset = self.file.tell()
+        first, last = int(ticks['time_msc'][0]), int(ticks['time_msc'][-1])
+        size = DATA_HEADER.size + ticks.nbytes + FOOTER.size
+        self.file.write(DATA_HEADER.pack(DATA_TAG, len(ticks), first, last))
+        self.file.write(ticks.tobytes())
+        self.file.write(FOOTER.pack(size, DATA_TAG))
+        self.file.flush()
+        self.pending.append((offset, first, last, len(ticks)))
+        self.last_time = last
+        if len(self.pending) >= self.index_every:
+            self.write_index()
+
+    def write_index(self):
+        if not self.pending:
+            return
+        offset = self.file.tell()
+        entries = np.array(self.pending, dtype=INDEX_DTYPE)
+        size = INDEX_HEADER.size + entries.nbytes + FOOTER.size
+        self.file.write(INDEX_HEADER.pack(INDEX_TAG, len(entries), self.last_index))
+        self.file.write(entries.tobytes())
+        self.file.write(FOOTER.pack(size, INDEX_TAG))
+        self.file.flush()
+        self.last_index = offset
+        self.pending = []
+
+    def close(self):
+        self.write_index()
+        self.file.close()
+
+
+class TickStore:
+    """Журналы тиков всех символов; чтение диапазона через границы суток."""
+
+    def __init__(self, root=TICK_STORE_DIR):
+        self.root = root
+
+    def path(self, symbol, day):
+        return os.path.join(self.root, symbol, day + EXTENSION)
+
+    def days(self, symbol):
+        folder = os.path.join(self.root, symbol)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name[:-len(EXTENSION)] for name in os.listdir(folder) if name.endswith(EXTENSION))
+
+    def read(self, symbol, start=None, end=None):
+        """Тики символа в [start, end) (datetime в UTC или мс эпохи)."""
+        start, end = to_msc(start), to_msc(end)
+        days = self.days(symbol)
+        if start is not None:
+            days = [day for day in days if day >= day_of(start)]
+        if end is not None:
+            days = [day for day in days if day <= day_of(end - 1)]
+        parts = []
+        for day in days:
+            reader = TickFile(self.path(symbol, day))
+            # copy: срез ссылается на mmap, который закрывается вместе с файлом
+            parts.append(reader.read(start, end).copy())
+            reader.close()
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=TICK_DTYPE)
+
+
+tick_store = TickStore()
+
+
+def _spread_summary(symbol, ticks, point):
+    spread = (ticks['ask'] - ticks['bid']) / point
+    hours = (ticks['time_msc'] // 3_600_000) % 24
+    print(f"{symbol}: {len(ticks)} тиков, спред средний {spread.mean():.1f}, медиана {np.median(spread):.1f}, "
+          f"макс {spread.max():.0f} пунктов")
+    for hour in range(24):
+        mask = hours == hour
+        if mask.any():
+            print(f"  {hour:02d}:00  тиков {mask.sum():>8}  спред средний {spread[mask].mean():6.1f}  "
+                  f"макс {spread[mask].max():6.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbol", required=True)
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--point", type=float, default=1e-5)
+    parser.add_argument("--root", default=TICK_STORE_DIR)
+    args = parser.parse_args()
+    ticks = TickStore(args.root).read(args.symbol, args.start, args.end or args.start + timedelta(days=1))
+    if not len(ticks):
+        raise SystemExit(f"{args.symbol}: тиков за период нет")
+    _spread_summary(args.symbol, ticks, args.point)
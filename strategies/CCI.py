@@ -1,7 +1,11 @@
-import pandas as pd
 import numpy as np
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
 from core.strategy_base import StrategyBase
+from core.bar_cache import bar_cache
+from utils import indicators
 
 class CCIDivergenceStrategy(StrategyBase):
     def __init__(self, symbol, lot, period=14, divergence_bars=2):
@@ -17,59 +21,75 @@ class CCIDivergenceStrategy(StrategyBase):
     def get_rates(self):
         # берём таймфрейм из метода стратегии
         timeframe = self.get_timeframe()
-        # запрашиваем 100 баров нужного TF
-        rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, 100)
+        # запрашиваем 100 баров нужного TF (через общий кэш)
+        rates = bar_cache.get_rates(self.symbol, timeframe, 100)
         # если не получилось или недостаточно данных — возвращаем None
         return rates if rates is not None and len(rates) >= self.period + 2 else None
 
     def _calculate_indicators(self, df):
         # Typical price
-        df['tp'] = (df['high'] + df['low'] + df['close']) / 3.0
-        # Moving average of typical price
-        df['tp_ma'] = df['tp'].rolling(window=self.period).mean()
-        # Mean deviation
-        df['mean_dev'] = df['tp'].rolling(window=self.period).apply(
-            lambda x: np.mean(np.abs(x - x.mean())), raw=True
-        )
+        df['tp'] = indicators.typical_price(df)
+        # Moving average of typical price and mean deviation (sliding window, без Python-лямбды)
+        df['tp_ma'], df['mean_dev'] = indicators.mean_deviation(df['tp'], self.period)
         # CCI
         df['cci'] = (df['tp'] - df['tp_ma']) / (0.015 * df['mean_dev'])
         return df
 
-    def _is_bearish_divergence(self, df):
+    def _is_bearish_divergence(self, rates, cci):
         # price makes higher high, CCI makes lower high over divergence_bars
         idx = -self.divergence_bars - 1
-        price_prev = df['high'].iloc[idx]
-        price_curr = df['high'].iloc[-1]
-        cci_prev = df['cci'].iloc[idx]
-        cci_curr = df['cci'].iloc[-1]
+        price_prev = rates[idx]['high']
+        price_curr = rates[-1]['high']
+        cci_prev = cci[idx]
+        cci_curr = cci[-1]
         return price_curr > price_prev and cci_curr < cci_prev
 
-    def _is_bullish_divergence(self, df):
+    def _is_bullish_divergence(self, rates, cci):
         # price makes lower low, CCI makes higher low over divergence_bars
         idx = -self.divergence_bars - 1
-        price_prev = df['low'].iloc[idx]
-        price_curr = df['low'].iloc[-1]
-        cci_prev = df['cci'].iloc[idx]
-        cci_curr = df['cci'].iloc[-1]
+        price_prev = rates[idx]['low']
+        price_curr = rates[-1]['low']
+        cci_prev = cci[idx]
+        cci_curr = cci[-1]
         return price_curr < price_prev and cci_curr > cci_prev
 
     def check_entry_signal(self, rates):
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
-        if np.isnan(df['cci'].iloc[-1]):
+        # потоковый CCI: пересчитывается только формирующийся бар
+        cci = self.indicator(rates, "cci", period=self.period)
+        if np.isnan(cci[-1]):
             return None
 
-        if self._is_bullish_divergence(df):
+        if self._is_bullish_divergence(rates, cci):
             return "buy"
-        if self._is_bearish_divergence(df):
+        if self._is_bearish_divergence(rates, cci):
             return "sell"
         return None
 
+    def vector_signals(self, rates):
+        entries, exits, _ = self._signals(rates)
+        return entries, exits
+
+    def universe_signals(self, rates, point):
+        entries, _, divergence = self._signals(rates)
+        # сильнее расхождение CCI за divergence_bars — выше в очереди
+        return entries[..., -1], divergence[..., -1]
+
+    def _signals(self, rates):
+        cci = indicators.cci(rates, self.period)
+        k = self.divergence_bars
+        cci_prev = indicators.shift(cci, k)
+        buy = (rates['low'] < indicators.shift(rates['low'], k)) & (cci > cci_prev)
+        sell = (rates['high'] > indicators.shift(rates['high'], k)) & (cci < cci_prev) & ~buy
+        entries = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+        entries[np.isnan(cci)] = 0
+        entries[..., :self.period + 1] = 0
+        exits = indicators.shift(cci) * cci < 0
+        return entries, exits, np.abs(cci - cci_prev)
+
     def check_exit_signal(self, rates):
         # exit when CCI crosses zero
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
-        cci_prev = df['cci'].iloc[-2]
-        cci_curr = df['cci'].iloc[-1]
+        cci = self.indicator(rates, "cci", period=self.period)
+        cci_prev = cci[-2]
+        cci_curr = cci[-1]
         # crossing zero
         return cci_prev * cci_curr < 0
\ No newline at end of file
@@ -1,6 +1,13 @@
+import numpy as np
 import pandas as pd
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
 from core.strategy_base import StrategyBase
+from core.bar_cache import bar_cache
+from core.market_state import market_state
+from utils import indicators
 
 class VWAPStrategy(StrategyBase):
     """
@@ -13,9 +20,24 @@ class VWAPStrategy(StrategyBase):
         super().__init__(symbol, lot)
         self.deviation_points = deviation_points
         self.ma_period = 2
-        # point size for this symbol
-        info = mt5.symbol_info(symbol)
-        self.point = info.point if info else 0.0
+        # окно VWAP в барах (get_rates берёт на два бара больше)
+        self.vwap_window = 100
+        # point символа — из снимка рынка при первой проверке, конструктор терминал не вызывает;
+        # бэктест задаёт его явно
+        self._point = None
+
+    @property
+    def point(self):
+        if self._point is None:
+            info = market_state.symbol_info(self.symbol)
+            if info is None:
+                return 0.0
+            self._point = info.point
+        return self._point
+
+    @point.setter
+    def point(self, value):
+        self._point = value
 
     def get_timeframe(self):
         # Use 5-minute bars
@@ -24,43 +46,60 @@ class VWAPStrategy(StrategyBase):
     def get_rates(self):
         # берём таймфрейм из метода стратегии
         timeframe = self.get_timeframe()
-        # запрашиваем 100 баров нужного TF
-        rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, 100)
+        # запрашиваем vwap_window баров нужного TF (через общий кэш) и ещё два: формирующийся бар
+        # (на входе отбрасывается) и бар, чтобы VWAP предыдущего бара в векторном проходе
+        # тоже считался по полному окну
+        rates = bar_cache.get_rates(self.symbol, timeframe, self.vwap_window + 2)
         # если не получилось или недостаточно данных — возвращаем None
         return rates if rates is not None and len(rates) >= self.ma_period + 2 else None
 
     def _calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        # Typical price
-        df['tp'] = (df['high'] + df['low'] + df['close']) / 3.0
-        # Cumulative volume and volume-price
-        df['cum_vol'] = df['tick_volume'].cumsum()
-        df['cum_vp'] = (df['tp'] * df['tick_volume']).cumsum()
-        # VWAP
-        df['vwap'] = df['cum_vp'] / df['cum_vol']
+        # Cumulative VWAP по typical price и tick_volume
+        df['vwap'] = indicators.vwap(df)
         return df
 
     def check_entry_signal(self, rates) -> str:
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
         # need at least two bars to detect a return
-        if len(df) < 2:
+        if len(rates) < 2:
             return None
 
+        # потоковый VWAP по окну той же длины, что и get_rates
+        vwap = self.indicator(rates, "vwap", window=self.vwap_window)
+
         # threshold in price units
         threshold = self.deviation_points * self.point
-        prev = df.iloc[-2]
-        curr = df.iloc[-1]
+        prev_close, prev_vwap = rates[-2]['close'], vwap[-2]
+        curr_close, curr_vwap = rates[-1]['close'], vwap[-1]
 
         # SELL: price was above VWAP + threshold and has now crossed back below it
-        if prev['close'] > prev['vwap'] + threshold and curr['close'] < curr['vwap'] + threshold:
+        if prev_close > prev_vwap + threshold and curr_close < curr_vwap + threshold:
             return "sell"
 
         # BUY: price was below VWAP - threshold and has now crossed back above it
-        if prev['close'] < prev['vwap'] - threshold and curr['close'] > curr['vwap'] - threshold:
+        if prev_close < prev_vwap - threshold and curr_close > curr_vwap - threshold:
             return "buy"
 
         return None
 
+    def vector_signals(self, rates):
+        entries, _ = self._signals(rates, self.point)
+        return entries, np.zeros(len(rates), dtype=bool)
+
+    def universe_signals(self, rates, point):
+        entries, deviation = self._signals(rates, point)
+        # дальше цена отходила от VWAP (доля цены) — выше в очереди
+        return entries[..., -1], deviation[..., -1]
+
+    def _signals(self, rates, point):
+        vwap = indicators.vwap(rates, window=self.vwap_window)
+        threshold = self.deviation_points * point
+        close, close_prev, vwap_prev = rates['close'], indicators.shift(rates['close']), indicators.shift(vwap)
+        sell = (close_prev > vwap_prev + threshold) & (close < vwap + threshold)
+        buy = (close_prev < vwap_prev - threshold) & (close > vwap - threshold) & ~sell
+        entries = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+        entries[..., :self.ma_period + 1] = 0
+        return entries, np.abs(close_prev - vwap_prev) / vwap_prev
+
     def check_exit_signal(self, rates) -> bool:
         # rely on broker SL/TP for exits
         return False
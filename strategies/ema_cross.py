@@ -1,6 +1,15 @@
-import pandas as pd
-import MetaTrader5 as mt5
+import numpy as np
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
 from core.strategy_base import StrategyBase
+from core.bar_cache import bar_cache
+from utils import indicators
+from core.market_state import market_state
+from utils.logger import get_logger
+
+signal_log = get_logger("signal")
 
 class EMARSIVolumeStrategy(StrategyBase):
     def __init__(self, symbol, lot, ema_fast=10, ema_slow=50, rsi_period=14, rsi_overbought=70, rsi_oversold=30, volume_threshold=1.5):
@@ -17,45 +26,42 @@ class EMARSIVolumeStrategy(StrategyBase):
 
     def get_rates(self):
         timeframe = self.get_timeframe()
-        rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, 200)
+        rates = bar_cache.get_rates(self.symbol, timeframe, 200)
         if rates is None or len(rates) < max(self.ema_slow, self.rsi_period, 20) + 1:
             return None
         return rates
 
     def _calculate_indicators(self, df):
-        df['ema_fast'] = df['close'].ewm(span=self.ema_fast, adjust=False).mean()
-        df['ema_slow'] = df['close'].ewm(span=self.ema_slow, adjust=False).mean()
+        df['ema_fast'] = indicators.ema(df, self.ema_fast)
+        df['ema_slow'] = indicators.ema(df, self.ema_slow)
         df['rsi'] = self._calculate_rsi(df['close'], self.rsi_period)
-        df['volume_avg'] = df['tick_volume'].rolling(window=20).mean()
+        df['volume_avg'] = indicators.sma(df, 20, field='tick_volume')
         return df
 
     def _calculate_rsi(self, series, period):
-        delta = series.diff()
-        gain = delta.where(delta > 0, 0.0)
-        loss = -delta.where(delta < 0, 0.0)
-        avg_gain = gain.rolling(window=period).mean()
-        avg_loss = loss.rolling(window=period).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
+        # RSI на простых средних приростов/падений
+        return indicators.rsi(series, period, field=None)
 
     def check_entry_signal(self, rates):
-        df = pd.DataFrame(rates)
-        if len(df) < max(self.ema_slow, self.rsi_period, 20):
+        if len(rates) < max(self.ema_slow, self.rsi_period, 20):
             return None
 
-        df = self._calculate_indicators(df)
-        last = df.iloc[-1]
+        # потоковые индикаторы: пересчитывается только формирующийся бар
+        ema_fast = self.indicator(rates, "ema", span=self.ema_fast)
+        ema_slow = self.indicator(rates, "ema", span=self.ema_slow)
+        rsi = self.indicator(rates, "rsi", period=self.rsi_period)
+        volume_avg = self.indicator(rates, "sma", period=20, field="tick_volume")
+        tick_volume = rates[-1]['tick_volume']
 
         # Минимальный объем для сигнала
-        if last['volume_avg'] == 0 or last['tick_volume'] == 0:
+        if volume_avg[-1] == 0 or tick_volume == 0:
             return None
 
-        ema_cross_up = last['ema_fast'] > last['ema_slow'] and df['ema_fast'].iloc[-2] <= df['ema_slow'].iloc[-2]
-        ema_cross_down = last['ema_fast'] < last['ema_slow'] and df['ema_fast'].iloc[-2] >= df['ema_slow'].iloc[-2]
-        volume_ok = last['tick_volume'] > last['volume_avg'] * self.volume_threshold
-        rsi_buy_zone = last['rsi'] < self.rsi_oversold + 10
-        rsi_sell_zone = last['rsi'] > self.rsi_overbought - 10
+        ema_cross_up = ema_fast[-1] > ema_slow[-1] and ema_fast[-2] <= ema_slow[-2]
+        ema_cross_down = ema_fast[-1] < ema_slow[-1] and ema_fast[-2] >= ema_slow[-2]
+        volume_ok = tick_volume > volume_avg[-1] * self.volume_threshold
+        rsi_buy_zone = rsi[-1] < self.rsi_oversold + 10
+        rsi_sell_zone = rsi[-1] > self.rsi_overbought - 10
 
         if ema_cross_up and volume_ok and rsi_buy_zone:
             return "buy"
@@ -63,21 +69,52 @@ class EMARSIVolumeStrategy(StrategyBase):
         if ema_cross_down and volume_ok and rsi_sell_zone:
          return "sell"
 
-        print(f"[{self.symbol}] no signal | ema_fast: {last['ema_fast']:.5f}, ema_slow: {last['ema_slow']:.5f}, rsi: {last['rsi']:.2f}, volume: {last['tick_volume']}, avg_volume: {last['volume_avg']:.2f}")
+        # горячий путь: форматирование — лениво в потоке логгера, повторы прореживаются
+        signal_log.debug("%s: no signal | ema_fast: %.5f, ema_slow: %.5f, rsi: %.2f, volume: %d, avg_volume: %.2f",
+                         self.symbol, ema_fast[-1], ema_slow[-1], rsi[-1], tick_volume, volume_avg[-1],
+                         extra={"sample": f"no_signal:{self.symbol}"})
         return None
 
+    def vector_signals(self, rates):
+        entries, exits, _ = self._signals(rates)
+        return entries, exits
+
+    def universe_signals(self, rates, point):
+        entries, _, volume_ratio = self._signals(rates)
+        # сильнее всплеск объёма относительно среднего — выше в очереди
+        return entries[..., -1], volume_ratio[..., -1]
+
+    def _signals(self, rates):
+        ema_fast = indicators.ema(rates, self.ema_fast)
+        ema_slow = indicators.ema(rates, self.ema_slow)
+        rsi = indicators.rsi(rates, self.rsi_period)
+        volume_avg = indicators.sma(rates, 20, field='tick_volume')
+        tick_volume = rates['tick_volume'].astype(np.float64)
+        fast_prev, slow_prev = indicators.shift(ema_fast), indicators.shift(ema_slow)
+
+        volume_ok = (volume_avg != 0) & (tick_volume != 0) & (tick_volume > volume_avg * self.volume_threshold)
+        buy = (ema_fast > ema_slow) & (fast_prev <= slow_prev) & volume_ok & (rsi < self.rsi_oversold + 10)
+        sell = (ema_fast < ema_slow) & (fast_prev >= slow_prev) & volume_ok & (rsi > self.rsi_overbought - 10)
+        entries = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+        entries[..., :max(self.ema_slow, self.rsi_period, 20) - 1] = 0
+        exits = np.abs(ema_fast - ema_slow) < rates['close'] * 0.001
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_ratio = tick_volume / volume_avg
+        return entries, exits, volume_ratio
+
     def check_exit_signal(self, rates):
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
-        return abs(df['ema_fast'].iloc[-1] - df['ema_slow'].iloc[-1]) < df['close'].iloc[-1] * 0.001
+        ema_fast = self.indicator(rates, "ema", span=self.ema_fast)
+        ema_slow = self.indicator(rates, "ema", span=self.ema_slow)
+        return abs(ema_fast[-1] - ema_slow[-1]) < rates[-1]['close'] * 0.001
 
     def open_trade(self, action):
-        symbol_info = mt5.symbol_info(self.symbol)
+        symbol_info = market_state.symbol_info(self.symbol)
         if symbol_info is None:
             print(f"Symbol {self.symbol} not found")
             return False
 
-        price = mt5.symbol_info_tick(self.symbol).ask if action == "buy" else mt5.symbol_info_tick(self.symbol).bid
+        tick = market_state.tick(self.symbol, fresh=True)
+        price = tick.ask if action == "buy" else tick.bid
         deviation = 20
         request = {
             "action": mt5.TRADE_ACTION_DEAL,
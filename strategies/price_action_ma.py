@@ -1,6 +1,11 @@
-import pandas as pd
-import MetaTrader5 as mt5
+import numpy as np
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
 from core.strategy_base import StrategyBase
+from core.bar_cache import bar_cache
+from utils import indicators
 
 class PriceActionMAStrategy(StrategyBase):
     def __init__(self, symbol, lot, ma_period=20):
@@ -16,98 +21,115 @@ class PriceActionMAStrategy(StrategyBase):
     def get_rates(self):
         # берём таймфрейм из метода стратегии
         timeframe = self.get_timeframe()
-        # запрашиваем 100 баров нужного TF
-        rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, 100)
+        # запрашиваем 100 баров нужного TF (через общий кэш)
+        rates = bar_cache.get_rates(self.symbol, timeframe, 100)
         # если не получилось или недостаточно данных — возвращаем None
         return rates if rates is not None and len(rates) >= self.ma_period + 2 else None
 
     def _calculate_indicators(self, df):
         # Скользящая средняя
-        df['ma'] = df['close'].rolling(window=self.ma_period).mean()
+        df['ma'] = indicators.sma(df, self.ma_period)
 
         # True Range (TR) в векторном виде
-        prev_close = df['close'].shift(1)
-        hl = df['high'] - df['low']
-        hc = (df['high'] - prev_close).abs()
-        lc = (df['low'] - prev_close).abs()
-        # объединяем и берём максимум по каждой строке
-        df['tr'] = pd.concat([hl, hc, lc], axis=1).max(axis=1)
+        df['tr'] = indicators.true_range(df)
 
         # ADX
         df['adx'] = self._calculate_adx(df)
 
-        # (опционально) можно убрать колонку tr, если она больше не нужна:
-        # df.drop(columns=['tr'], inplace=True)
-
         return df
 
-    def _is_bullish_engulfing(self, df):
+    def _is_bullish_engulfing(self, rates):
+        prev, last = rates[-2], rates[-1]
         return (
-            df['close'].iloc[-2] < df['open'].iloc[-2] and
-            df['close'].iloc[-1] > df['open'].iloc[-1] and
-            df['open'].iloc[-1] <= df['close'].iloc[-2] and
-            df['close'].iloc[-1] >= df['open'].iloc[-2]
+            prev['close'] < prev['open'] and
+            last['close'] > last['open'] and
+            last['open'] <= prev['close'] and
+            last['close'] >= prev['open']
         )
 
-    def _is_bearish_engulfing(self, df):
+    def _is_bearish_engulfing(self, rates):
+        prev, last = rates[-2], rates[-1]
         return (
-            df['close'].iloc[-2] > df['open'].iloc[-2] and
-            df['close'].iloc[-1] < df['open'].iloc[-1] and
-            df['open'].iloc[-1] >= df['close'].iloc[-2] and
-            df['close'].iloc[-1] <= df['open'].iloc[-2]
+            prev['close'] > prev['open'] and
+            last['close'] < last['open'] and
+            last['open'] >= prev['close'] and
+            last['close'] <= prev['open']
         )
 
     def _calculate_adx(self, df, period=14):
-        df['high_diff'] = df['high'] - df['high'].shift(1)
-        df['low_diff'] = df['low'].shift(1) - df['low']
-        df['plus_dm'] = df['high_diff'].where((df['high_diff'] > df['low_diff']) & (df['high_diff'] > 0), 0)
-        df['minus_dm'] = df['low_diff'].where((df['low_diff'] > df['high_diff']) & (df['low_diff'] > 0), 0)
-        tr = df[['high', 'low', 'close']].copy()
-        tr['hl'] = df['high'] - df['low']
-        tr['hc'] = abs(df['high'] - df['close'].shift(1))
-        tr['lc'] = abs(df['low'] - df['close'].shift(1))
-        df['tr'] = tr[['hl', 'hc', 'lc']].max(axis=1)
-        atr = df['tr'].rolling(window=period).mean()
-        plus_di = 100 * (df['plus_dm'].rolling(window=period).sum() / atr)
-        minus_di = 100 * (df['minus_dm'].rolling(window=period).sum() / atr)
-        dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
-        adx = dx.rolling(window=period).mean()
+        plus_di, minus_di, adx = indicators.adx(df, period)
         return adx
 
     def check_entry_signal(self, rates):
         if len(rates) < self.ma_period + 2:
             return None
 
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
+        # потоковые индикаторы: пересчитывается только формирующийся бар
+        ma = self.indicator(rates, "sma", period=self.ma_period)
+        adx = self.indicator(rates, "adx", period=14)
+        close = rates[-1]['close']
 
         # Фильтр: тренд должен быть достаточно сильным
-        if df['adx'].iloc[-1] < 20:
+        if adx[-1] < 20:
             return None
 
-        if self._is_bullish_engulfing(df) and df['close'].iloc[-1] > df['ma'].iloc[-1]:
+        if self._is_bullish_engulfing(rates) and close > ma[-1]:
             return "buy"
-        elif self._is_bearish_engulfing(df) and df['close'].iloc[-1] < df['ma'].iloc[-1]:
+        elif self._is_bearish_engulfing(rates) and close < ma[-1]:
             return "sell"
         return None
 
+    def _engulfing_arrays(self, rates):
+        # векторные версии _is_bullish_engulfing / _is_bearish_engulfing для каждого бара
+        o, c = rates['open'], rates['close']
+        po, pc = indicators.shift(o), indicators.shift(c)
+        bullish = (pc < po) & (c > o) & (o <= pc) & (c >= po)
+        bearish = (pc > po) & (c < o) & (o >= pc) & (c <= po)
+        return bullish, bearish
+
+    def vector_signals(self, rates):
+        entries, exits, _ = self._signals(rates)
+        return entries, exits
+
+    def universe_signals(self, rates, point):
+        entries, _, adx = self._signals(rates)
+        # сильнее тренд (ADX) — выше в очереди
+        return entries[..., -1], adx[..., -1]
+
+    def _signals(self, rates):
+        ma = indicators.sma(rates, self.ma_period)
+        adx = self._calculate_adx(rates)
+        close, close_prev, ma_prev = rates['close'], indicators.shift(rates['close']), indicators.shift(ma)
+        bullish, bearish = self._engulfing_arrays(rates)
+
+        # как в check_entry_signal: фильтр отсекает только adx < 20 (nan фильтр пропускает)
+        trend_ok = ~(adx < 20)
+        buy = trend_ok & bullish & (close > ma)
+        sell = trend_ok & bearish & (close < ma) & ~buy
+        entries = np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+        entries[..., :self.ma_period + 1] = 0
+
+        crossed = ((close_prev > ma_prev) & (close < ma)) | ((close_prev < ma_prev) & (close > ma))
+        exits = crossed & ~bullish & ~bearish
+        exits[..., :self.ma_period - 1] = False
+        return entries, exits, adx
+
     def check_exit_signal(self, rates):
         if len(rates) < self.ma_period:
             return False
 
-        df = pd.DataFrame(rates)
-        df = self._calculate_indicators(df)
+        ma = self.indicator(rates, "sma", period=self.ma_period)
 
-        close_now = df['close'].iloc[-1]
-        ma_now = df['ma'].iloc[-1]
-        close_prev = df['close'].iloc[-2]
-        ma_prev = df['ma'].iloc[-2]
+        close_now = rates[-1]['close']
+        ma_now = ma[-1]
+        close_prev = rates[-2]['close']
+        ma_prev = ma[-2]
 
         crossed_down = close_prev > ma_prev and close_now < ma_now
         crossed_up = close_prev < ma_prev and close_now > ma_now
 
         if crossed_down or crossed_up:
-            if not self._is_bullish_engulfing(df) and not self._is_bearish_engulfing(df):
+            if not self._is_bullish_engulfing(rates) and not self._is_bearish_engulfing(rates):
                 return True
 
         return False
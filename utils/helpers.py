@@ -1,4 +1,6 @@
 #helpers.py
+import numpy as np
+
 def check_stoplevels(symbols):
     import MetaTrader5 as mt5
 
@@ -16,4 +18,44 @@ def check_stoplevels(symbols):
 
         print(f"{symbol:<12} {info.trade_stops_level:<22} {info.point:<22}")
 
-    mt5.shutdown()
\ No newline at end of file
+    mt5.shutdown()
+
+
+# Коды таймфреймов MT5: минуты — как есть, часы — 0x4000 | N, недели — 0x8000 | N, месяцы — 0xC000 | N
+_TF_UNIT_SECONDS = {0x0000: 60, 0x4000: 3600, 0x8000: 7 * 86400}
+
+
+def timeframe_seconds(timeframe):
+    """Длительность бара в секундах (для MN1 — 30 дней, только для оценок)."""
+    unit = timeframe & 0xC000
+    count = timeframe & 0x3FFF
+    if unit == 0xC000:
+        return count * 30 * 86400
+    return count * _TF_UNIT_SECONDS[unit]
+
+
+def timeframe_name(timeframe):
+    """Имя таймфрейма как в терминале: M5, H4, D1, W1, MN1."""
+    unit = timeframe & 0xC000
+    count = timeframe & 0x3FFF
+    if unit == 0x4000:
+        return "D1" if count == 24 else f"H{count}"
+    return {0x0000: "M", 0x8000: "W", 0xC000: "MN"}[unit] + str(count)
+
+
+def parse_timeframe(name):
+    """Обратное к timeframe_name: "H4" -> 0x4004."""
+    name = name.upper()
+    if name == "D1":
+        return 0x4000 | 24
+    for prefix, unit in (("MN", 0xC000), ("M", 0x0000), ("H", 0x4000), ("W", 0x8000)):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return unit | int(name[len(prefix):])
+    raise ValueError(f"неизвестный таймфрейм: {name}")
+
+
+# dtype массивов mt5.copy_rates_* — общий формат баров для офлайн-инструментов
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
@@ -0,0 +1,187 @@
+"""
+Векторные NumPy-ядра индикаторов.
+
+Ядра принимают структурированный массив copy_rates_* (или DataFrame) и имя поля,
+либо массив значений. Результат — float64-массив той же формы, в начале
+которого стоят nan, пока окно не заполнено (как rolling(window) в pandas).
+Скользящие суммы считаются через sliding_window_view — без копирования окна.
+Бары идут по последней оси: двумерный массив (символы × бары, core.universe)
+считается за один проход, каждая строка — как отдельный одномерный.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _column(data, field):
+    """Столбец `field` структурированного массива/DataFrame или сам одномерный массив."""
+    names = getattr(getattr(data, 'dtype', None), 'names', None)
+    if field is not None and (names or hasattr(data, 'columns')):
+        data = data[field]
+    return np.asarray(data, dtype=np.float64)
+
+
+def rolling_sum(values, period):
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if period <= values.shape[-1]:
+        out[..., period - 1:] = sliding_window_view(values, period, axis=-1).sum(axis=-1)
+    return out
+
+
+def shift(values, n=1):
+    """Значение n баров назад (как Series.shift(n)); первые n — nan."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    bars = values.shape[-1]
+    if n < bars:
+        out[..., n:] = values[..., :bars - n]
+    return out
+
+
+def sma(data, period, field='close'):
+    return rolling_sum(_column(data, field), period) / period
+
+
+def _ewm(values, alpha, start=0):
+    """
+    Рекурсия e[t] = (1 - alpha) * e[t-1] + alpha * x[t] с e[start] = x[start].
+    Считается блоками через накопленные степени (1 - alpha), чтобы не уходить в переполнение.
+    """
+    out = np.full(values.shape, np.nan)
+    bars = values.shape[-1]
+    if start >= bars:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[..., start:] = values[..., start:]
+        return out
+    block = max(1, int(-30 * np.log(10) / np.log(decay)))  # decay**block >= 1e-30
+    prev = values[..., start:start + 1]
+    out[..., start] = prev[..., 0]
+    i = start + 1
+    while i < bars:
+        x = values[..., i:i + block]
+        n = x.shape[-1]
+        powers = decay ** np.arange(1, n + 1)
+        # e[i+k] = decay^(k+1) * (prev + alpha * Σ_{j<=k} x[j] / decay^(j+1))
+        out[..., i:i + n] = powers * (prev + alpha * np.cumsum(x / powers, axis=-1))
+        prev = out[..., i + n - 1:i + n]
+        i += n
+    return out
+
+
+def ema(data, span, field='close'):
+    """EMA как pandas ewm(span=span, adjust=False)."""
+    return _ewm(_column(data, field), 2.0 / (span + 1.0))
+
+
+def gains_losses(data, field='close'):
+    """Прирост и падение между барами; для первого бара оба равны 0 (как в pandas-версии RSI)."""
+    values = _column(data, field)
+    delta = np.diff(values, axis=-1, prepend=values[..., :1])
+    return np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+
+
+def rsi(data, period, field='close', method='sma'):
+    """
+    RSI. method='sma' — простые скользящие средние (как EMARSIVolumeStrategy),
+    method='wilder' — сглаживание Уайлдера, затравка — среднее первых `period` изменений.
+    """
+    gain, loss = gains_losses(data, field)
+    if method == 'wilder':
+        avg_gain = np.full(gain.shape, np.nan)
+        avg_loss = np.full(loss.shape, np.nan)
+        if gain.shape[-1] > period:
+            gain[..., period] = gain[..., 1:period + 1].mean(axis=-1)
+            loss[..., period] = loss[..., 1:period + 1].mean(axis=-1)
+            avg_gain = _ewm(gain, 1.0 / period, start=period)
+            avg_loss = _ewm(loss, 1.0 / period, start=period)
+    else:
+        avg_gain = rolling_sum(gain, period)
+        avg_loss = rolling_sum(loss, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def true_range(rates):
+    """True Range; для первого бара — high - low."""
+    high = _column(rates, 'high')
+    low = _column(rates, 'low')
+    close = _column(rates, 'close')
+    tr = high - low
+    if tr.shape[-1] > 1:
+        prev_close = close[..., :-1]
+        np.maximum(tr[..., 1:], np.abs(high[..., 1:] - prev_close), out=tr[..., 1:])
+        np.maximum(tr[..., 1:], np.abs(low[..., 1:] - prev_close), out=tr[..., 1:])
+    return tr
+
+
+def atr(rates, period=14):
+    """ATR как простое среднее True Range."""
+    return rolling_sum(true_range(rates), period) / period
+
+
+def directional_movement(rates):
+    """+DM и -DM; для первого бара оба равны 0."""
+    high = _column(rates, 'high')
+    low = _column(rates, 'low')
+    high_diff = np.diff(high, axis=-1, prepend=high[..., :1])
+    low_diff = -np.diff(low, axis=-1, prepend=low[..., :1])
+    plus_dm = np.where((high_diff > low_diff) & (high_diff > 0), high_diff, 0.0)
+    minus_dm = np.where((low_diff > high_diff) & (low_diff > 0), low_diff, 0.0)
+    return plus_dm, minus_dm
+
+
+def adx(rates, period=14):
+    """
+    +DI, -DI и ADX по формулам PriceActionMAStrategy: сумма DM за период делится
+    на средний TR, ADX — простое среднее DX. Возвращает (plus_di, minus_di, adx).
+    """
+    plus_dm, minus_dm = directional_movement(rates)
+    atr_values = atr(rates, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100.0 * rolling_sum(plus_dm, period) / atr_values
+        minus_di = 100.0 * rolling_sum(minus_dm, period) / atr_values
+        dx = 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    return plus_di, minus_di, rolling_sum(dx, period) / period
+
+
+def typical_price(rates):
+    return (_column(rates, 'high') + _column(rates, 'low') + _column(rates, 'close')) / 3.0
+
+
+def mean_deviation(values, period):
+    """
+    Скользящее среднее абсолютное отклонение от среднего окна. Возвращает (mean, mean_dev);
+    на постоянном окне среднее равно самому значению, а отклонение — ровно 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mean = np.full(values.shape, np.nan)
+    dev = np.full(values.shape, np.nan)
+    if period <= values.shape[-1]:
+        windows = sliding_window_view(values, period, axis=-1)
+        m = windows.sum(axis=-1) / period
+        flat = windows.min(axis=-1) == windows.max(axis=-1)
+        m[flat] = values[..., period - 1:][flat]
+        mean[..., period - 1:] = m
+        dev[..., period - 1:] = np.abs(windows - m[..., None]).mean(axis=-1)
+    return mean, dev
+
+
+def cci(rates, period=14):
+    tp = typical_price(rates)
+    mean, dev = mean_deviation(tp, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (tp - mean) / (0.015 * dev)
+
+
+def vwap(rates, window=None):
+    """VWAP по typical price и tick_volume: накопительный от первого бара или за скользящее окно."""
+    tp = typical_price(rates)
+    volume = _column(rates, 'tick_volume')
+    vp_sum, vol_sum = np.cumsum(tp * volume, axis=-1), np.cumsum(volume, axis=-1)
+    if window is not None and window < vp_sum.shape[-1]:
+        vp_sum[..., window:] -= vp_sum[..., :-window].copy()
+        vol_sum[..., window:] -= vol_sum[..., :-window].copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return vp_sum / vol_sum
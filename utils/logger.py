@@ -1,32 +1,211 @@
+"""
+Логирование без блокировки торгового цикла.
+
+Вызов логгера только кладёт запись в очередь — форматирование и запись в файлы/консоль
+делает фоновый поток (QueueListener). Сообщение форматируется лениво, в фоновом потоке:
+в горячем пути пишите log.debug("%s: ...", symbol), а не f-строку, — при выключенном
+уровне вызов стоит одну проверку isEnabledFor.
+
+Приёмники: текстовый файл logs/trading_bot.log (как раньше), консоль и JSON lines
+logs/trading_bot.jsonl (по объекту на строку, с полями extra). Уровни задаются по
+категориям — get_logger("signal") — в LOG_LEVELS. Повторяющиеся сообщения
+(«нет сигнала» на каждом цикле) прореживаются: extra={"sample": ключ} пропускает
+не больше одного сообщения с этим ключом за LOG_SAMPLE_SEC.
+
+Воркер супервизора вызывает use_worker_files(N) и пишет в trading_bot_worker<N>.log/.jsonl:
+ротировать один файл из нескольких процессов нельзя (на Windows rename открытого файла
+падает, на Linux процессы продолжают писать в уже переименованный). Записи, потерянные
+при переполнении очереди, считаются (dropped_records) — итог пишется в лог при выходе
+и экспортируется метрикой log_records_dropped_total.
+"""
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from config.settings import LOG_LEVEL, LOG_LEVELS, LOG_CONSOLE, LOG_JSON, LOG_QUEUE_SIZE, LOG_SAMPLE_SEC
 
 # Убедимся, что папка для логов существует
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "trading_bot.log")
+JSON_LOG_FILE = os.path.join(LOG_DIR, "trading_bot.jsonl")
+
+ROOT_NAME = "file_logger"
+# атрибуты LogRecord, которые не относятся к extra
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — один JSON-объект: время, уровень, категория, сообщение и поля extra."""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "category": record.name[len(ROOT_NAME) + 1:] or "main",
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Не больше одной записи с ключом extra["sample"] за interval сек; пропущенные считаются."""
+
+    def __init__(self, interval=LOG_SAMPLE_SEC):
+        super().__init__()
+        self.interval = interval
+        self._last = {}          # ключ -> (время последней выведенной записи, сколько отброшено после неё)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        now = record.created
+        with self._lock:
+            last, dropped = self._last.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._last[key] = (last, dropped + 1)
+                return False
+            self._last[key] = (now, 0)
+        if dropped:
+            record.dropped = dropped
+            record.msg = f"{record.msg} (ещё {dropped} за {self.interval:.0f} сек)"
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Кладёт запись в очередь как есть (без форматирования); при переполнении запись теряется."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # форматирование — в потоке QueueListener; исключение переводим в текст сразу,
+        # traceback держит кадры стека живыми
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
 
 # Формат сообщений
 formatter = logging.Formatter("%(asctime)s - %(levelname)-8s - %(message)s")
 
-# Файловый хендлер с ротацией
-file_handler = RotatingFileHandler(
-    LOG_FILE, maxBytes=5*1024*1024, backupCount=3, encoding="utf-8"
-)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
 
-# Консольный хендлер
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
+def _build_handlers(suffix=""):
+    """Файловые хендлеры с ротацией (+ консоль). delay — файл открывается при первой записи:
+    воркер, сразу переключившийся на свои файлы, общий не открывает вовсе."""
+    text_handler = RotatingFileHandler(
+        _with_suffix(LOG_FILE, suffix), maxBytes=5*1024*1024, backupCount=3, encoding="utf-8", delay=True
+    )
+    text_handler.setFormatter(formatter)
+    result = [text_handler]
+
+    # Консольный хендлер
+    if LOG_CONSOLE:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        result.append(console_handler)
+
+    # Структурированный журнал
+    if LOG_JSON:
+        json_handler = RotatingFileHandler(
+            _with_suffix(JSON_LOG_FILE, suffix), maxBytes=20*1024*1024, backupCount=3, encoding="utf-8", delay=True
+        )
+        json_handler.setFormatter(JsonFormatter())
+        result.append(json_handler)
+    return result
 
-# Единый логгер для файла и консоли
-file_logger = logging.getLogger("file_logger")
-file_logger.setLevel(logging.INFO)
-file_logger.addHandler(file_handler)
-file_logger.addHandler(console_handler)
+
+def _with_suffix(path, suffix):
+    root, ext = os.path.splitext(path)
+    return f"{root}{suffix}{ext}"
+
+
+handlers = _build_handlers()
+file_handler = handlers[0]
+
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = _NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(SampleFilter())
+listener = QueueListener(log_queue, *handlers, respect_handler_level=False)
+listener.start()
+
+# Единый логгер для файла и консоли; категории — дочерние логгеры
+file_logger = logging.getLogger(ROOT_NAME)
+file_logger.setLevel(LOG_LEVEL)
+file_logger.addHandler(queue_handler)
+file_logger.propagate = False
 
 # Alias console_logger for compatibility
-console_logger = file_logger
\ No newline at end of file
+console_logger = file_logger
+
+
+def get_logger(category):
+    """Логгер категории (trader, signal, orders, …) с уровнем из LOG_LEVELS."""
+    logger = file_logger.getChild(category)
+    if category in LOG_LEVELS:
+        logger.setLevel(LOG_LEVELS[category])
+    return logger
+
+
+def set_level(level):
+    """Один уровень для всех категорий (реплей, отладка из консоли)."""
+    file_logger.setLevel(level)
+    for name, logger in logging.root.manager.loggerDict.items():
+        if name.startswith(ROOT_NAME + ".") and isinstance(logger, logging.Logger):
+            logger.setLevel(logging.NOTSET)
+
+
+def use_worker_files(worker_id):
+    """Писать в trading_bot_worker<N>.log/.jsonl — у каждого воркера супервизора свои файлы и своя ротация."""
+    global handlers, file_handler
+    listener.stop()
+    for handler in handlers:
+        handler.close()
+    handlers = _build_handlers(f"_worker{worker_id}")
+    file_handler = handlers[0]
+    listener.handlers = tuple(handlers)
+    listener.start()
+
+
+def dropped_records():
+    """Сколько записей потеряно из-за переполнения очереди (LOG_QUEUE_SIZE) с запуска процесса."""
+    return _NonBlockingQueueHandler.dropped
+
+
+def _shutdown():
+    # при выходе — дописать всё, что осталось в очереди, и итог потерь (мимо очереди: поток уже остановлен)
+    listener.stop()
+    dropped = dropped_records()
+    if dropped:
+        record = file_logger.makeRecord(ROOT_NAME, logging.WARNING, __file__, 0,
+                                        "⚠️ Очередь логов переполнялась: потеряно %d записей (LOG_QUEUE_SIZE=%d)",
+                                        (dropped, LOG_QUEUE_SIZE), None)
+        for handler in handlers:
+            handler.handle(record)
+
+
+atexit.register(_shutdown)
+
+
+def flush(timeout=5.0):
+    """Дождаться, пока фоновый поток допишет очередь (перед остановкой, в тестовых прогонах)."""
+    deadline = time.monotonic() + timeout
+    while not log_queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
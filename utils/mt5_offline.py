@@ -0,0 +1,42 @@
+"""
+Константы MetaTrader5 для офлайн-инструментов на машине без пакета MetaTrader5 (бэктест,
+оптимизатор, проверка индикаторов). Модули цепочки их импорта подключают его так:
+
+    try:
+        import MetaTrader5 as mt5
+    except ImportError:
+        from utils import mt5_offline as mt5   # офлайн: только константы
+
+Здесь только значения констант, как в терминале. Любой вызов терминала (copy_rates_*,
+symbol_info, order_send...) — AttributeError с понятной причиной: офлайн-пути их не вызывают.
+"""
+
+# таймфреймы: минуты — как есть, часы — 0x4000 | N, недели — 0x8000 | N, месяцы — 0xC000 | N
+TIMEFRAME_M1 = 1
+TIMEFRAME_M2 = 2
+TIMEFRAME_M3 = 3
+TIMEFRAME_M4 = 4
+TIMEFRAME_M5 = 5
+TIMEFRAME_M6 = 6
+TIMEFRAME_M10 = 10
+TIMEFRAME_M12 = 12
+TIMEFRAME_M15 = 15
+TIMEFRAME_M20 = 20
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 0x4000 | 1
+TIMEFRAME_H2 = 0x4000 | 2
+TIMEFRAME_H3 = 0x4000 | 3
+TIMEFRAME_H4 = 0x4000 | 4
+TIMEFRAME_H6 = 0x4000 | 6
+TIMEFRAME_H8 = 0x4000 | 8
+TIMEFRAME_H12 = 0x4000 | 12
+TIMEFRAME_D1 = 0x4000 | 24
+TIMEFRAME_W1 = 0x8000 | 1
+TIMEFRAME_MN1 = 0xC000 | 1
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+
+
+def __getattr__(name):
+    raise AttributeError(f"mt5.{name} недоступен: пакет MetaTrader5 не установлен (офлайн-режим)")
@@ -1,14 +1,34 @@
 import math
-import MetaTrader5 as mt5
-if not mt5.initialize():
-    raise RuntimeError("Не удалось инициализировать MT5")
+from collections import namedtuple
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    from utils import mt5_offline as mt5   # бэктест без терминала: только константы
+from core.market_state import market_state
+from config.settings import MIN_LOT, MAX_LOT, SIZING_REPRICE_THRESHOLD
 
-def calculate_raw_lot(risk_rub: float, sl_price: float, price: float, contract_size: float, point: float) -> float:
+_initialized = False
+
+
+def _terminal():
+    """MT5 инициализируется при первом расчёте маржи, а не при импорте: бэктест работает без терминала."""
+    global _initialized
+    if not _initialized:
+        if not mt5.initialize():
+            raise RuntimeError("Не удалось инициализировать MT5")
+        _initialized = True
+    return mt5
+
+def calculate_raw_lot(risk_rub: float, sl_price: float, price: float, contract_size: float, point: float,
+                      pip_value: float = None) -> float:
     """
     Calculate the raw lot size based on risk amount (in account currency) and stop loss distance.
+    pip_value — value of one point for 1 lot in account currency (MarginCache.pip_value);
+    without it, point * contract_size (quote currency).
     """
     sl_points = abs(price - sl_price) / point
-    pip_value = point * contract_size
+    if not pip_value:
+        pip_value = point * contract_size
     sl_distance = sl_points * pip_value
     if sl_distance <= 0:
         return 0.0
@@ -23,22 +43,159 @@ def adjust_lot(raw_lot: float, step: float, min_lot: float, max_lot: float) -> f
     lot = min(max_lot, lot)
     return lot
 
-def max_affordable_lot(symbol: str, lot: float, price: float) -> float:
+class MarginCache:
     """
-    Iteratively reduce lot size until required margin fits within free margin.
+    Кэш маржи и стоимости пункта на 1 лот по (symbol, order_type). Обе величины
+    пересчитываются вместе (order_calc_margin и order_calc_profit), только когда цена
+    ушла от цены последнего расчёта больше чем на `threshold` (доля).
     """
-    account = mt5.account_info()
+
+    def __init__(self, threshold=SIZING_REPRICE_THRESHOLD):
+        self.threshold = threshold
+        self._margin = {}   # (symbol, order_type) -> (margin_per_lot, pip_value, price)
+        self.calc_calls = 0
+
+    def _entry(self, symbol, order_type, price, point=None):
+        key = (symbol, order_type)
+        cached = self._margin.get(key)
+        if cached is not None:
+            ref_price = cached[2]
+            if ref_price > 0 and abs(price / ref_price - 1.0) <= self.threshold:
+                return cached
+        terminal = _terminal()
+        margin = terminal.order_calc_margin(order_type, symbol, 1.0, price)
+        self.calc_calls += 1
+        if margin is None or margin <= 0:
+            self._margin.pop(key, None)
+            return None
+        if point is None:
+            info = market_state.symbol_info(symbol)
+            point = info.point if info is not None else 0.0
+        # стоимость пункта в валюте счёта: прибыль 1 лота на движении цены в один пункт
+        pip_value = None
+        if point > 0:
+            close = price + point if order_type == mt5.ORDER_TYPE_BUY else price - point
+            pip_value = terminal.order_calc_profit(order_type, symbol, 1.0, price, close)
+            self.calc_calls += 1
+        entry = self._margin[key] = (margin, abs(pip_value) if pip_value else None, price)
+        return entry
+
+    def margin_per_lot(self, symbol, order_type, price):
+        entry = self._entry(symbol, order_type, price)
+        return entry[0] if entry is not None else None
+
+    def pip_value(self, symbol_info, order_type, price):
+        # стоимость одного пункта на 1 лот в валюте счёта; без ответа терминала — в валюте котировки
+        entry = self._entry(symbol_info.name, order_type, price, symbol_info.point)
+        if entry is not None and entry[1]:
+            return entry[1]
+        return symbol_info.point * symbol_info.trade_contract_size
+
+    def invalidate(self, symbol=None):
+        for key in list(self._margin):
+            if symbol is None or key[0] == symbol:
+                del self._margin[key]
+
+
+margin_cache = MarginCache()
+
+SizingDecision = namedtuple("SizingDecision", [
+    "lot",              # итоговый лот (0.0 — входить нельзя)
+    "risk_lot",         # лот по риску, приведённый к шагу и лимитам брокера
+    "affordable_lot",   # максимум по свободной марже
+    "margin_cap_lot",   # максимум по лимиту маржи на сделку (None — без лимита)
+    "volume_min", "volume_max", "volume_step",
+    "margin_per_lot",
+    "pip_value",
+    "reason",           # почему лот ограничен/обнулён
+])
+
+
+def _floor_steps(value: float, step: float) -> float:
+    # floor до шага объёма с допуском на ошибку округления
+    return math.floor(value / step + 1e-9) * step
+
+
+def _fits_margin(symbol: str, order_type: int, lot: float, price: float, margin_free: float) -> bool:
+    margin_cache.calc_calls += 1
+    margin = _terminal().order_calc_margin(order_type, symbol, lot, price)
+    return margin is not None and margin <= margin_free
+
+
+def solve_affordable_lot(symbol: str, order_type: int, price: float, margin_free: float,
+                         step: float, lot_limit: float, verify: bool = True) -> float:
+    """
+    Максимальный лот (кратный step, не больше lot_limit), маржа которого помещается
+    в margin_free. Решается в замкнутом виде по марже на 1 лот; если терминал не
+    подтверждает результат (нелинейная маржа), — бинарный поиск по шагам.
+    """
+    margin = margin_cache.margin_per_lot(symbol, order_type, price)
+    if margin is None or step <= 0:
+        return 0.0
+    lot = min(_floor_steps(margin_free / margin, step), _floor_steps(lot_limit, step))
+    if lot < step:
+        return 0.0
+    if not verify or _fits_margin(symbol, order_type, lot, price, margin_free):
+        return lot
+    # бинарный поиск по числу шагов: O(log n) вызовов order_calc_margin
+    lo, hi = 0, int(round(lot / step)) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _fits_margin(symbol, order_type, mid * step, price, margin_free):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo * step
+
+
+def max_affordable_lot(symbol: str, lot: float, price: float, order_type: int = mt5.ORDER_TYPE_BUY) -> float:
+    """
+    Largest lot not above `lot` whose required margin fits within free margin.
+    """
+    account = market_state.account()
     if account is None:
         return 0.0
-    margin_free = account.margin_free
-    info = mt5.symbol_info(symbol)
+    info = market_state.symbol_info(symbol)
     if info is None:
         return 0.0
-    step = info.volume_step
-    current_lot = lot
-    while current_lot >= step:
-        margin_req = mt5.order_calc_margin(mt5.ORDER_TYPE_BUY, symbol, current_lot, price)
-        if margin_req <= margin_free:
-            return current_lot
-        current_lot -= step
-    return 0.0
\ No newline at end of file
+    return solve_affordable_lot(symbol, order_type, price, account.margin_free, info.volume_step, lot)
+
+
+def size_position(symbol_info, order_type: int, price: float, sl_price: float, risk_amount: float,
+                  margin_free: float, max_margin: float = None,
+                  min_lot: float = MIN_LOT, max_lot: float = MAX_LOT, verify: bool = True) -> SizingDecision:
+    """
+    Полный расчёт объёма: лот по риску (с шагом и лимитами брокера, не меньше min_lot),
+    ограничение свободной маржой и лимитом маржи на сделку, верхний предел max_lot.
+    verify=False — без проверки лота по свободной марже через order_calc_margin (только по марже на 1 лот).
+    """
+    symbol = symbol_info.name
+    step = symbol_info.volume_step
+    pip_value = margin_cache.pip_value(symbol_info, order_type, price)
+    # риск в валюте счёта — и стоимость пункта в ней же (кроссы, котировка не в валюте счёта)
+    raw_lot = calculate_raw_lot(risk_amount, sl_price, price, symbol_info.trade_contract_size, symbol_info.point,
+                                pip_value)
+    risk_lot = adjust_lot(raw_lot, step, symbol_info.volume_min, symbol_info.volume_max)
+    lot = min(max(min_lot, risk_lot), max_lot)
+
+    margin = margin_cache.margin_per_lot(symbol, order_type, price)
+    if margin is None:
+        return SizingDecision(0.0, risk_lot, 0.0, None, symbol_info.volume_min, symbol_info.volume_max,
+                              step, None, pip_value, "margin_unavailable")
+
+    margin_cap_lot = None
+    reason = "risk"
+    if max_margin is not None:
+        margin_cap_lot = _floor_steps(max_margin / margin, step)
+        if margin_cap_lot < lot:
+            lot, reason = margin_cap_lot, "margin_cap"
+
+    affordable_lot = solve_affordable_lot(symbol, order_type, price, margin_free, step, lot, verify)
+    if affordable_lot < lot:
+        lot, reason = affordable_lot, "free_margin"
+
+    if lot < symbol_info.volume_min or lot <= 0:
+        return SizingDecision(0.0, risk_lot, affordable_lot, margin_cap_lot, symbol_info.volume_min,
+                              symbol_info.volume_max, step, margin, pip_value, reason)
+    return SizingDecision(lot, risk_lot, affordable_lot, margin_cap_lot, symbol_info.volume_min,
+                          symbol_info.volume_max, step, margin, pip_value, reason)